@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+Checks the closest points found by the body tree of src/collisions.py
+against a brute-force search over all the triangles, and compares the time
+per frame of refitting the tree (with the closest triangles of the previous
+frame as hints) with rebuilding it every frame and with brute force.
+
+The meshes are those saved by run_model.py (OBJ files or mesh sequences),
+or random deformations of the body and garment meshes of assets/meshes.
+
+Usage: python benchmarks/benchmark_collisions.py [--path results/tshirt/01_01]
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(".")
+
+from src import collisions
+from src import io
+
+
+def brute_force(points, vertices, faces, chunk_size=64):
+    '''Distance of each point to its closest triangle, testing all of them'''
+    a, b, c = [vertices[faces[:, i]].astype(np.float64) for i in range(3)]
+    distances = np.empty(len(points))
+
+    for start in range(0, len(points), chunk_size):
+        p = points[start:start + chunk_size].astype(np.float64)
+        num_points = len(p)
+
+        pp = np.repeat(p, len(faces), axis=0)
+        tile = lambda x: np.tile(x, (num_points, 1))
+        barycentric = collisions.closest_points_on_triangles(pp, tile(a), tile(b), tile(c))
+        closest = barycentric[:, :1] * tile(a) + barycentric[:, 1:2] * tile(b) + barycentric[:, 2:] * tile(c)
+
+        squared = ((pp - closest) ** 2).sum(-1).reshape(num_points, len(faces))
+        distances[start:start + num_points] = np.sqrt(squared.min(axis=1))
+
+    return distances
+
+
+def synthetic_sequence(num_frames, rng):
+    '''Garment and body meshes moving with a smooth random deformation'''
+    v_body, _ = io.load_obj("assets/meshes/body.obj")
+    v_garment, _ = io.load_obj("assets/meshes/tshirt.obj")
+
+    frequencies = rng.normal(size=(3, 3))
+    v_garment_seq, v_body_seq = [], []
+    for t in np.linspace(0, 1, num_frames):
+        offset = lambda v: 0.02 * np.sin(v @ frequencies + 2 * np.pi * t)
+        v_body_seq.append(v_body + offset(v_body))
+        v_garment_seq.append(v_garment + offset(v_garment))
+
+    return np.array(v_garment_seq), np.array(v_body_seq)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the collision queries")
+    parser.add_argument("--path", type=str, default=None, help="directory with the meshes saved by run_model.py")
+    parser.add_argument("--garment", type=str, default=None, help="garment of the sequence in --path (by default, the first one)")
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--check_points", type=int, default=500, help="points checked with brute force per frame")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    _, f_body = io.load_obj("assets/meshes/body.obj")
+
+    if args.path:
+        v_garments, _, v_body, f_body = io.load_meshes(args.path)
+        v_garment = v_garments[args.garment or next(iter(v_garments))]
+        v_garment, v_body = v_garment[:args.frames], v_body[:args.frames]
+    else:
+        v_garment, v_body = synthetic_sequence(args.frames, rng)
+
+    # Closest points
+    bvh = collisions.BodyBVH(f_body, v_body[0])
+    max_error = 0
+    for frame in [0, len(v_body) // 2, len(v_body) - 1]:
+        bvh.refit(v_body[frame])
+        points = v_garment[frame][rng.choice(v_garment.shape[1], args.check_points, replace=False)]
+
+        for frame_hint in [None, rng.integers(0, len(f_body), len(points))]:
+            _, _, distances = bvh.closest_points(points, frame_hint)
+            error = np.abs(distances - brute_force(points, v_body[frame], f_body)).max()
+            max_error = max(max_error, error)
+
+    assert max_error < 1e-9, "The tree and brute force differ (max error %g)" % max_error
+    print("Closest points match brute force (max error %.2e)" % max_error)
+
+    # Signs of points moved 5mm in and out of the body along its normals
+    triangles = rng.choice(len(f_body), args.check_points, replace=False)
+    a, b, c = [bvh.vertices[f_body[triangles, i]] for i in range(3)]
+    normals = np.cross(b - a, c - a)
+    normals /= np.linalg.norm(normals, axis=-1, keepdims=True)
+    centers = (a + b + c) / 3
+
+    for offset in [0.005, -0.005]:
+        distances, _ = bvh.signed_distances(centers + offset * normals)
+        correct = np.mean(np.sign(distances) == np.sign(offset))
+        assert correct > 0.98, "Wrong sign for %.1f%% of the points" % (100 - 100 * correct)
+        print("Correct sign for %.1f%% of the points %s the body" % (100 * correct, "outside" if offset > 0 else "inside"))
+
+    # Time per frame
+    def refit():
+        analyzer = collisions.CollisionAnalyzer(f_body)
+        analyzer.update(v_garment, v_body)
+        return analyzer
+
+    def rebuild():
+        for garment, body in zip(v_garment, v_body):
+            collisions.BodyBVH(f_body, body).signed_distances(garment)
+
+    num_frames = len(v_body)
+    start = time.perf_counter()
+    analyzer = refit()
+    time_refit = (time.perf_counter() - start) / num_frames
+
+    start = time.perf_counter()
+    rebuild()
+    time_rebuild = (time.perf_counter() - start) / num_frames
+
+    start = time.perf_counter()
+    brute_force(v_garment[0][:args.check_points], v_body[0], f_body)
+    time_brute_force = (time.perf_counter() - start) * v_garment.shape[1] / args.check_points
+
+    print()
+    print("%d garment vertices, %d body triangles" % (v_garment.shape[1], len(f_body)))
+    print("%-30s %10.1fms" % ("refit + previous frame hints", 1000 * time_refit))
+    print("%-30s %10.1fms" % ("rebuild without hints", 1000 * time_rebuild))
+    print("%-30s %10.1fms" % ("brute force (estimated)", 1000 * time_brute_force))
+
+    print()
+    print(analyzer.summary())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Checks that the sequences of a packed motion store are identical to the
+ones loaded from the motion files, and compares the time to load a corpus
+from the files and from the store.
+
+By default the corpus is made of random AMASS-like files (120fps, 156 pose
+parameters), or of the files given by --motions.
+
+Usage: python benchmarks/benchmark_motion_store.py [--motions assets/CMU] [--sequences 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(".")
+
+from src import io
+from src import motion_store
+
+
+def make_corpus(directory, num_sequences, rng):
+    '''Random motion files with the format of AMASS'''
+    paths = []
+
+    for i in range(num_sequences):
+        num_frames = int(rng.integers(600, 2400))
+        path = os.path.join(directory, "%02d" % (i // 20), "%02d_%02d_poses.npz" % (i // 20, i % 20))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        np.savez(
+            path,
+            poses=0.3 * rng.normal(size=(num_frames, 156)),
+            trans=np.cumsum(0.01 * rng.normal(size=(num_frames, 3)), axis=0),
+            betas=rng.normal(size=16),
+            mocap_framerate=120.0,
+            gender="female"
+        )
+        paths.append(path)
+
+    return paths
+
+
+def load_all(paths):
+    '''Loads every sequence and reads all of its values'''
+    total = 0.0
+    for path in paths:
+        motion = io.load_motion(path)
+        total += float(motion["pose"].sum()) + float(motion["translation"].sum())
+
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the packed motion store")
+    parser.add_argument("--motions", type=str, default=None, help="motion files (see io.find_motions)")
+    parser.add_argument("--sequences", type=int, default=200, help="number of random sequences")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.motions:
+            paths = io.find_motions(args.motions)
+        else:
+            paths = make_corpus(directory, args.sequences, np.random.default_rng(0))
+
+        store_path = os.path.join(directory, "corpus" + motion_store.EXTENSION)
+
+        start = time.perf_counter()
+        motion_store.pack_motions(paths, store_path, args.workers, verbose=False, root=args.motions or directory)
+        time_pack = time.perf_counter() - start
+
+        store_paths = io.find_motions(store_path)
+        assert len(store_paths) == len(paths)
+
+        for path, store_sequence in zip(paths, store_paths):
+            motion, packed = io.load_motion(path), io.load_motion(store_sequence)
+            for key in ["pose", "shape", "translation"]:
+                assert np.array_equal(motion[key], packed[key]), "%s differs for %s" % (key, path)
+
+        print("%d sequences identical in the store (%.1f MB)" % (
+            len(paths), os.path.getsize(store_path) / 1024 ** 2
+        ))
+
+        start = time.perf_counter()
+        load_all(paths)
+        time_files = time.perf_counter() - start
+
+        start = time.perf_counter()
+        load_all(store_paths)
+        time_store = time.perf_counter() - start
+
+    print()
+    print("%-30s %10.1fms" % ("pack (parallel)", 1000 * time_pack))
+    print("%-30s %10.1fms" % ("load from files", 1000 * time_files))
+    print("%-30s %10.1fms %9.1fx" % ("load from store", 1000 * time_store, time_files / time_store))
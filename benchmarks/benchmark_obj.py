@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Compares the bulk OBJ reader/writer of src/obj.py with the previous line by
+line implementation.
+
+Usage: python benchmarks/benchmark_obj.py [--mesh assets/meshes/dress.obj]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+sys.path.append(".")
+
+from src.obj import read_obj, write_obj
+
+
+def read_obj_reference(filename):
+    vertices = []
+    faces = []
+
+    with open(filename, 'r') as fp:
+        for line in fp:
+            line_split = line.split()
+
+            if not line_split:
+                continue
+
+            elif line_split[0] == 'v':
+                vertices.append([line_split[1], line_split[2], line_split[3]])
+
+            elif line_split[0] == 'f':
+                vertex_indices = [s.split("/")[0] for s in line_split[1:]]
+                faces.append(vertex_indices)
+
+    vertices = np.array(vertices, dtype=np.float32)
+    faces = np.array(faces, dtype=np.int32) - 1
+
+    return vertices, faces
+
+
+def write_obj_reference(filename, vertices, faces):
+    with open(filename, 'w') as fp:
+        for v in vertices:
+            fp.write('v %f %f %f\n' % (v[0], v[1], v[2]))
+
+        for f in (faces + 1):
+            fp.write('f %d %d %d\n' % (f[0], f[1], f[2]))
+
+
+def benchmark(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the OBJ reader and writer")
+    parser.add_argument("--mesh", type=str, default="assets/meshes/dress.obj")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    vertices, faces = read_obj(args.mesh)
+    vertices_ref, faces_ref = read_obj_reference(args.mesh)
+    assert np.array_equal(vertices, vertices_ref) and np.array_equal(faces, faces_ref)
+
+    print("Mesh: %s (%d vertices, %d faces)" % (args.mesh, len(vertices), len(faces)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "mesh.obj")
+        path_ref = os.path.join(tmp, "mesh_ref.obj")
+
+        write_obj(path, vertices, faces)
+        write_obj_reference(path_ref, vertices, faces)
+        with open(path) as fp, open(path_ref) as fp_ref:
+            assert fp.read() == fp_ref.read(), "Written files differ"
+
+        results = [
+            ("read", lambda: read_obj_reference(args.mesh), lambda: read_obj(args.mesh)),
+            ("write", lambda: write_obj_reference(path_ref, vertices, faces),
+                      lambda: write_obj(path, vertices, faces)),
+        ]
+
+        print("%-8s %12s %12s %10s" % ("", "reference", "bulk", "speedup"))
+        for name, reference, bulk in results:
+            time_reference = benchmark(reference, args.repeat)
+            time_bulk = benchmark(bulk, args.repeat)
+            print("%-8s %10.1fms %10.1fms %9.1fx" % (
+                name, 1000 * time_reference, 1000 * time_bulk, time_reference / time_bulk
+            ))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Compares the level-parallel forward kinematics of skinning.PoseSkeleton with
+the previous implementation, which composed the joints one by one, for
+several batch sizes (eagerly and traced with tf.function).
+
+Usage: python benchmarks/benchmark_pose_skeleton.py [--batch_sizes 1 16 256 4096]
+"""
+import argparse
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.append(".")
+
+import tensorflow as tf
+
+from src import skinning
+
+
+# Kinematic tree of SMPL
+SMPL_PARENTS = np.array([
+    -1, 0, 0, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 9, 9, 12, 13, 14, 16, 17, 18, 19, 20, 21
+])
+
+
+def pose_skeleton_reference(joint_rotations, joint_positions, parents):
+    batch_size = tf.shape(joint_rotations)[0]
+    num_joints = len(parents)
+
+    def make_affine(rotation, translation, name=None):
+        rotation_homo = tf.pad(rotation, [[0, 0], [0, 1], [0, 0]])
+        translation_homo = tf.concat([translation, tf.ones([batch_size, 1, 1])], 1)
+        affine_transform = tf.concat([rotation_homo, translation_homo], 2)
+        return affine_transform
+
+    joint_positions = tf.expand_dims(joint_positions, axis=-1)
+    root_rotation = joint_rotations[:, 0, :, :]
+    root_transform = make_affine(root_rotation, joint_positions[:, 0])
+
+    transforms = [root_transform]
+    for joint, parent in enumerate(parents[1:], start=1):
+        position = joint_positions[:, joint] - joint_positions[:, parent]
+        transform_local = make_affine(joint_rotations[:, joint], position)
+        transform_global = tf.matmul(transforms[parent], transform_local)
+        transforms.append(transform_global)
+    transforms = tf.stack(transforms, axis=1)
+
+    joint_positions_posed = transforms[:, :, :3, 3]
+
+    zeros = tf.zeros([batch_size, num_joints, 1, 1])
+    joint_rest_positions = tf.concat([joint_positions, zeros], axis=2)
+    init_bone = tf.matmul(transforms, joint_rest_positions)
+    init_bone = tf.pad(init_bone, [[0, 0], [0, 0], [0, 0], [3, 0]])
+    joint_transforms = transforms - init_bone
+
+    return joint_transforms, joint_positions_posed
+
+
+def random_rotations(rng, shape):
+    q, r = np.linalg.qr(rng.normal(size=shape + (3, 3)))
+    return (q * np.sign(np.diagonal(r, axis1=-2, axis2=-1))[..., np.newaxis, :]).astype(np.float32)
+
+
+def benchmark(function, repeat):
+    function()  # Warm up (and trace)
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark forward kinematics")
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 4, 16, 64, 256, 1024, 4096])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pose_skeleton = skinning.PoseSkeleton()
+
+    def loop(joint_rotations, joint_positions):
+        return pose_skeleton_reference(joint_rotations, joint_positions, SMPL_PARENTS)
+
+    def levels(joint_rotations, joint_positions):
+        return pose_skeleton(joint_rotations, joint_positions, SMPL_PARENTS)
+
+    methods = {
+        "loop": loop,
+        "levels": levels,
+        "loop (graph)": tf.function(loop),
+        "levels (graph)": tf.function(levels)
+    }
+
+    print("%-8s" % "batch" + "".join("%16s" % name for name in methods))
+
+    for batch_size in args.batch_sizes:
+        joint_rotations = tf.constant(random_rotations(rng, (batch_size, len(SMPL_PARENTS))))
+        joint_positions = tf.constant(rng.normal(size=(batch_size, len(SMPL_PARENTS), 3)), tf.float32)
+
+        for x, y in zip(levels(joint_rotations, joint_positions), loop(joint_rotations, joint_positions)):
+            assert np.allclose(x, y, atol=1e-5), "Outputs differ"
+
+        times = []
+        for name, function in methods.items():
+            seconds = benchmark(
+                lambda: function(joint_rotations, joint_positions), args.repeat
+            )
+            times.append("%14.2fms" % (1000 * seconds))
+
+        print("%-8d" % batch_size + "".join("%16s" % t for t in times))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Accuracy report of the reduced precisions of load_model (see
+src/precision.py): runs a reference sequence with each precision and
+compares the garment vertices with the float32 baseline (mean, 99th
+percentile and max error per vertex, in mm), and the time of run_model.
+int8 runs with the TFLite runtime (the only one that supports it), so its
+time includes the speedup of TFLite over Keras (see benchmark_tflite.py).
+
+The reference sequence is a motion file, or a random motion of
+benchmarks/synthetic.py. Use --output to save the report as JSON, with the
+mean error of each garment vertex (e.g., to find the regions that are most
+affected).
+
+Usage: python benchmarks/benchmark_precision.py --models trained_models/tshirt trained_models/dress [--motion assets/CMU/07/07_02_poses.npz]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(".")
+
+from src import model
+from src import precision
+from src import tflite
+from src.io import load_motion
+from src.model import load_model, run_model
+
+import synthetic
+
+
+def subsample(motion, num_frames):
+    return {
+        "pose": motion["pose"][:num_frames],
+        "shape": motion["shape"],
+        "translation": motion["translation"][:num_frames],
+    }
+
+
+def load_precision(model_path, name):
+    '''
+    Loads the model with a precision: int8 with the TFLite runtime (the
+    networks are converted first if their TFLite models do not exist), the
+    rest with Keras
+    '''
+    if name in precision.KERAS_PRECISIONS:
+        return load_model(model_path, lazy=False, precision=name)
+
+    paths = model.network_paths(model_path)
+    if any(
+        not os.path.exists(tflite.model_path(path, name if key in precision.NETWORKS else "float32"))
+        for key, path in paths.items()
+    ):
+        tflite.convert_model(model_path, precision=name)
+
+    return load_model(model_path, lazy=False, precision=name, runtime="tflite")
+
+
+def timed_run(model_dict, motion):
+    '''Runs the model once to warm up and once timed'''
+    run_model(model_dict, subsample(motion, 2))
+
+    start = time.perf_counter()
+    v_garment, _ = run_model(model_dict, dict(motion))
+
+    return v_garment, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy and speed of the reduced precisions")
+    parser.add_argument("--models", type=str, nargs="+", default=["trained_models/tshirt"], help="garment models")
+    parser.add_argument("--motion", type=str, default=None, help="reference sequence (by default, a random motion)")
+    parser.add_argument("--frames", type=int, default=30, help="maximum number of frames of the sequence")
+    parser.add_argument("--precisions", type=str, nargs="+", default=precision.PRECISIONS[1:], choices=precision.PRECISIONS)
+    parser.add_argument("--output", type=str, default=None, help="save the report to this JSON file")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    tf.keras.utils.disable_interactive_logging()
+
+    if args.motion:
+        motion = subsample(load_motion(args.motion), args.frames)
+    else:
+        motion = synthetic.make_motion(np.random.default_rng(0), args.frames)
+
+    print("Native CPU support: " + ", ".join(
+        "%s %s" % (name, "yes" if precision.cpu_supports(name) else "no")
+        for name in args.precisions
+    ))
+
+    report = {}
+    for model_path in args.models:
+        garment = os.path.basename(os.path.normpath(model_path))
+        baseline, time_baseline = timed_run(load_model(model_path, lazy=False), motion)
+
+        print()
+        print("%s: %d frames, %d vertices, float32 %.1fms" % (
+            garment, baseline.shape[0], baseline.shape[1], 1000 * time_baseline
+        ))
+        print("%-10s %12s %12s %12s %12s %10s" % ("precision", "mean (mm)", "p99 (mm)", "max (mm)", "time (ms)", "speedup"))
+
+        report[garment] = {"frames": len(baseline), "float32": {"seconds": time_baseline}}
+        for name in args.precisions:
+            v_garment, seconds = timed_run(load_precision(model_path, name), motion)
+            errors = 1000 * np.linalg.norm(v_garment - baseline, axis=-1)
+
+            result = {
+                "seconds": seconds,
+                "speedup": time_baseline / seconds,
+                "mean_error_mm": float(errors.mean()),
+                "p99_error_mm": float(np.percentile(errors, 99)),
+                "max_error_mm": float(errors.max()),
+                "per_vertex_mean_error_mm": errors.mean(axis=0).tolist(),
+            }
+            report[garment][name] = result
+
+            print("%-10s %12.3f %12.3f %12.3f %12.1f %9.2fx" % (
+                name, result["mean_error_mm"], result["p99_error_mm"], result["max_error_mm"],
+                1000 * seconds, result["speedup"]
+            ))
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp)
+
+        print()
+        print("Saved:", args.output)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+Checks the z-buffer of the preview rasterizer (rendering/preview.py)
+against a brute-force reference that tests every pixel against every
+triangle, and measures the frames per second of the previews for each
+shading, resolution and number of worker processes.
+
+The meshes are those saved by run_model.py (OBJ files or mesh sequences),
+or the body and garment meshes of assets/meshes turning around the
+vertical axis.
+
+Usage: python benchmarks/benchmark_preview.py [--path results/tshirt/01_01] [--workers 1 4]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(".")
+
+from rendering import preview
+from src import io
+
+
+def turntable_sequence(num_frames):
+    '''Garment and body meshes turning around the vertical axis'''
+    v_body, f_body = io.load_obj("assets/meshes/body.obj")
+    v_garment, f_garment = io.load_obj("assets/meshes/tshirt.obj")
+
+    angles = np.linspace(0, 2 * np.pi, num_frames, endpoint=False)
+    rotations = np.zeros((num_frames, 3, 3), dtype=np.float32)
+    rotations[:, 0, 0] = rotations[:, 2, 2] = np.cos(angles)
+    rotations[:, 0, 2] = np.sin(angles)
+    rotations[:, 2, 0] = -np.sin(angles)
+    rotations[:, 1, 1] = 1
+
+    rotate = lambda v: np.einsum("fij,vj->fvi", rotations, v)
+
+    return rotate(v_garment), f_garment, rotate(v_body), f_body
+
+
+def brute_force_faces(pixels, depth, faces, resolution, chunk_size=256):
+    '''Face visible in each pixel, testing all the triangles for each pixel'''
+    width, height = resolution
+    x, y = np.meshgrid(np.arange(width) + 0.5, np.arange(height) + 0.5)
+    p = np.stack([x.ravel(), y.ravel()], axis=-1)
+
+    a, b, c = pixels[faces[:, 0]], pixels[faces[:, 1]], pixels[faces[:, 2]]
+    ab, ac = b - a, c - a
+    area = ab[:, 0] * ac[:, 1] - ac[:, 0] * ab[:, 1]
+    valid = np.abs(area) > 1e-12
+
+    face_buffer = np.full(len(p), -1)
+    for start in range(0, len(p), chunk_size):
+        q = p[start:start + chunk_size, None, :] - a[None]
+        w1 = (q[..., 0] * ac[:, 1] - ac[:, 0] * q[..., 1]) / area
+        w2 = (ab[:, 0] * q[..., 1] - q[..., 0] * ab[:, 1]) / area
+        w0 = 1 - w1 - w2
+
+        inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0) & valid
+        z = w0 * depth[faces[:, 0]] + w1 * depth[faces[:, 1]] + w2 * depth[faces[:, 2]]
+        z = np.where(inside, z, np.inf)
+
+        nearest = z.argmin(axis=1)
+        face_buffer[start:start + chunk_size] = np.where(np.isfinite(z.min(axis=1)), nearest, -1)
+
+    return face_buffer.reshape(height, width)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the preview renderer")
+    parser.add_argument("--path", type=str, default=None, help="directory with the meshes of a sequence")
+    parser.add_argument("--garment", type=str, default=None, help="garment of the sequence in --path (by default, the first one)")
+    parser.add_argument("--frames", type=int, default=120, help="frames of the sequence")
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[160, 320, 640], help="widths of the frames (4:3)")
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count()}), help="numbers of worker processes")
+    args = parser.parse_args()
+
+    if args.path:
+        v_garments, f_garments, v_body, f_body = io.load_meshes(args.path)
+        garment = args.garment or next(iter(v_garments))
+        v_garment, f_garment = v_garments[garment], f_garments[garment]
+        v_garment, v_body = v_garment[:args.frames], v_body[:args.frames]
+    else:
+        v_garment, f_garment, v_body, f_body = turntable_sequence(args.frames)
+
+    # Z-buffer
+    resolution = (64, 48)
+    vertices = np.concatenate([v_body[0], v_garment[0]])
+    faces = np.concatenate([f_body, f_garment + len(v_body[0])])
+    camera = preview.fit_cameras([v_body[:1], v_garment[:1]], resolution)[0]
+    pixels, depth = camera.project(vertices)
+
+    face_buffer, _ = preview.rasterize(pixels, depth, faces, resolution)
+    reference = brute_force_faces(pixels, depth, faces, resolution)
+
+    # Pixels on shared edges may be assigned to either triangle, so compare
+    # the coverage and the depth of the visible surface
+    coverage = ((face_buffer >= 0) == (reference >= 0)).mean()
+    covered = (face_buffer >= 0) & (reference >= 0)
+    surface_depth = lambda buffer: depth[faces[buffer[covered]]].mean(axis=-1)
+    depth_difference = np.abs(surface_depth(face_buffer) - surface_depth(reference)).max() if covered.any() else 0.0
+    print("Z-buffer (%dx%d): coverage agreement %.2f%%, max depth difference %.2e m" % (
+        resolution + (100 * coverage, depth_difference)
+    ))
+
+    # Speed
+    print()
+    print("%-10s %12s %8s %12s" % ("shading", "resolution", "workers", "frames/s"))
+    for num_workers in args.workers:
+        pool = multiprocessing.Pool(num_workers) if num_workers > 1 else None
+
+        try:
+            for shading in preview.SHADINGS:
+                for width in args.resolutions:
+                    resolution = (width, width * 3 // 4)
+                    render = lambda: preview.render_sequence(
+                        v_garment, f_garment, v_body, f_body, resolution=resolution,
+                        shading=shading, pool=pool
+                    )
+
+                    render()
+                    start = time.perf_counter()
+                    images = render()
+                    seconds = time.perf_counter() - start
+
+                    print("%-10s %12s %8d %12.1f" % (
+                        shading, "%dx%d" % resolution, num_workers, len(images) / seconds
+                    ))
+
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
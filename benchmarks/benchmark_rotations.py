@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Checks that the rotation kernels of src/rotations.py give the same results
+as scipy's Rotation, and compares their speed.
+
+Usage: python benchmarks/benchmark_rotations.py [--frames 1000] [--joints 24]
+"""
+import argparse
+import itertools
+import sys
+import timeit
+
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+sys.path.append(".")
+
+from src import rotations
+
+
+def random_axis_angle(rng, shape):
+    axis = rng.normal(size=shape + (3,))
+    axis /= np.linalg.norm(axis, axis=-1, keepdims=True)
+    angle = rng.uniform(0, np.pi, size=shape + (1,))
+
+    # Include small angles and angles close to pi
+    angle.reshape(-1)[:10] = np.logspace(-12, -2, 10)
+    angle.reshape(-1)[10:20] = np.pi - np.logspace(-12, -2, 10)
+
+    return axis * angle
+
+
+def check(name, x, y, atol):
+    error = np.abs(np.asarray(x) - np.asarray(y)).max()
+    assert error <= atol, "%s differs from scipy (max error %g)" % (name, error)
+    print("%-24s max error %.2e" % (name, error))
+
+
+def check_equivalence(rng):
+    axis_angle = random_axis_angle(rng, (1000,))
+    scipy_rotation = R.from_rotvec(axis_angle)
+    matrix = rotations.axis_angle_to_matrix(axis_angle)
+
+    check("axis_angle_to_matrix", matrix, scipy_rotation.as_matrix(), 1e-12)
+    check("matrix_to_axis_angle", rotations.matrix_to_axis_angle(matrix), axis_angle, 1e-7)
+    check("matrix_to_quaternion", rotations.matrix_to_quaternion(matrix),
+          R.from_matrix(matrix).as_quat() * np.sign(R.from_matrix(matrix).as_quat()[:, 3:]), 1e-12)
+
+    # Away from gimbal lock for the Euler angles
+    axis_angle = random_axis_angle(rng, (1000,))[20:] * 0.5
+    matrix = rotations.axis_angle_to_matrix(axis_angle)
+
+    for axes in itertools.permutations("xyz"):
+        for seq in ["".join(axes), "".join(axes).upper()]:
+            angles = rotations.matrix_to_euler(matrix, seq)
+            check("matrix_to_euler " + seq, angles, R.from_matrix(matrix).as_euler(seq), 1e-9)
+            check("euler_to_matrix " + seq, rotations.euler_to_matrix(angles, seq),
+                  R.from_euler(seq, angles).as_matrix(), 1e-12)
+
+    for seq in ["z", "zx", "ZX"]:
+        angles = rng.uniform(-180, 180, size=(10, len(seq)))
+        check("euler_to_matrix " + seq, rotations.euler_to_matrix(angles, seq, degrees=True),
+              R.from_euler(seq, angles, degrees=True).as_matrix(), 1e-12)
+
+    rotation = R.from_euler("zx", [-90, 270], degrees=True)
+    axis_angle = random_axis_angle(rng, (1000,)) * 0.9
+    check("compose_axis_angle",
+          rotations.compose_axis_angle(rotation.as_matrix(), axis_angle),
+          (rotation * R.from_rotvec(axis_angle)).as_rotvec(), 1e-9)
+
+
+def benchmark(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the rotation kernels")
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--joints", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    check_equivalence(rng)
+
+    axis_angle = random_axis_angle(rng, (args.frames, args.joints))
+    matrix = rotations.axis_angle_to_matrix(axis_angle)
+    flat = axis_angle.reshape(-1, 3)
+    rotation = R.from_euler("z", -15, degrees=True)
+
+    results = [
+        ("axis-angle to matrix",
+            lambda: R.from_rotvec(flat).as_matrix(),
+            lambda: rotations.axis_angle_to_matrix(axis_angle)),
+        ("matrix to axis-angle",
+            lambda: R.from_matrix(matrix.reshape(-1, 3, 3)).as_rotvec(),
+            lambda: rotations.matrix_to_axis_angle(matrix)),
+        ("matrix to euler zxy",
+            lambda: R.from_matrix(matrix.reshape(-1, 3, 3)).as_euler("zxy"),
+            lambda: rotations.matrix_to_euler(matrix, "zxy")),
+        ("compose axis-angle",
+            lambda: (rotation * R.from_rotvec(flat)).as_rotvec(),
+            lambda: rotations.compose_axis_angle(rotation.as_matrix(), axis_angle)),
+    ]
+
+    print()
+    print("%d frames x %d joints" % (args.frames, args.joints))
+    print("%-24s %12s %12s %10s" % ("", "scipy", "kernels", "speedup"))
+    for name, reference, kernel in results:
+        time_reference = benchmark(reference, args.repeat)
+        time_kernel = benchmark(kernel, args.repeat)
+        print("%-24s %10.2fms %10.2fms %9.1fx" % (
+            name, 1000 * time_reference, 1000 * time_kernel, time_reference / time_kernel
+        ))
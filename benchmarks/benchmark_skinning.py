@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Compares the linear blend skinning of src/skinning.py (fused and top-k) with
+the previous implementation based on per-vertex 4x4 matrices, and checks the
+error of top-k skinning against skinning.top_k_error_bound.
+
+The body is the synthetic SMPL model of benchmarks/synthetic.py, or the
+SMPL model given by --smpl_path. run_benchmarks.py runs the same cases as
+its "skinning" benchmark.
+
+Usage: python benchmarks/benchmark_skinning.py [--frames 256] [--top_k 1 2 4 8] [--smpl_path assets/SMPL/...]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+sys.path.append(".")
+
+import tensorflow as tf
+
+from src import skinning
+from src.smpl import SMPL
+
+import synthetic
+
+
+def lbs_reference(vertices, joint_rotations, skinning_weights):
+    skinning_weights = tf.convert_to_tensor(skinning_weights, tf.float32)
+
+    batch_size = tf.shape(vertices)[0]
+    num_joints = skinning_weights.shape[-1]
+    num_vertices = vertices.shape[-2]
+
+    W = skinning_weights
+    if len(skinning_weights.shape.as_list()) < len(vertices.shape.as_list()):
+        W = tf.tile(tf.convert_to_tensor(skinning_weights), [batch_size, 1])
+        W = tf.reshape(W, [batch_size, skinning_weights.shape[-2], num_joints])
+
+    A = tf.reshape(joint_rotations, (-1, num_joints, 16))
+    T = tf.matmul(W, A)
+    T = tf.reshape(T, (-1, num_vertices, 4, 4))
+
+    ones = tf.ones([batch_size, num_vertices, 1])
+    vertices_homo = tf.concat([vertices, ones], axis=2)
+    skinned_homo = tf.matmul(T, tf.expand_dims(vertices_homo, -1))
+
+    return skinned_homo[:, :, :3, 0]
+
+
+def benchmark(function, repeat):
+    function()  # Warm up
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def skinning_cases(body, num_frames, top_ks, repeat, rng):
+    '''
+    Times the 4x4 reference and LBS (fused and with each top_k) for the body
+    posed with random poses, with shared weights (as the body) and one set
+    of weights per frame (as the garments). Asserts that the error of top-k
+    skinning is within skinning.top_k_error_bound.
+
+    Yields:
+        case: dictionary with the weights, method, seconds, speedup over
+            the reference, max error and max bound (in m)
+    '''
+    shape = rng.normal(size=body.num_shapes).astype(np.float32)
+    pose = (0.3 * rng.normal(size=(num_frames, 3 * body.num_joints))).astype(np.float32)
+    _, smpl_dict = body(shape, pose)
+
+    vertices = tf.broadcast_to(smpl_dict["vertices_posed"], (num_frames, body.num_vertices, 3))
+    joint_transforms = smpl_dict["joint_transforms"]
+
+    weights = {
+        "shared": body.skinning_weights,
+        "batched": tf.tile(body.skinning_weights[tf.newaxis], [num_frames, 1, 1])
+    }
+
+    for name, W in weights.items():
+        reference = lbs_reference(vertices, joint_transforms, W)
+        time_reference = benchmark(lambda: lbs_reference(vertices, joint_transforms, W), repeat)
+        yield {
+            "weights": name, "method": "4x4", "seconds": time_reference, "speedup": 1.0,
+            "max_error": 0.0, "max_bound": 0.0
+        }
+
+        for top_k in [None] + list(top_ks):
+            lbs = skinning.LBS(top_k)
+            output = lbs(vertices, joint_transforms, W)
+            error = np.linalg.norm(output - reference, axis=-1)
+
+            seconds = benchmark(lambda: lbs(vertices, joint_transforms, W), repeat)
+            method = "fused" if top_k is None else "top-%d" % top_k
+
+            bound = np.zeros_like(error)
+            if top_k is not None:
+                bound = skinning.top_k_error_bound(vertices, joint_transforms, W, top_k).numpy()
+
+            # Tolerance for the rounding errors of float32
+            assert (error <= bound + 1e-5).all(), "Error bound exceeded with " + method
+
+            yield {
+                "weights": name, "method": method, "seconds": seconds,
+                "speedup": time_reference / seconds,
+                "max_error": float(error.max()), "max_bound": float(bound.max())
+            }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark linear blend skinning")
+    parser.add_argument("--frames", type=int, default=256)
+    parser.add_argument("--top_k", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--smpl_path", type=str, default=None, help="SMPL model (by default, the synthetic one)")
+    parser.add_argument("--models_dir", type=str, default=os.path.join(tempfile.gettempdir(), "synthetic_models"),
+                        help="directory with the synthetic models (created if they do not exist)")
+    args = parser.parse_args()
+
+    smpl_path = args.smpl_path or synthetic.build(args.models_dir)
+    body = SMPL(smpl_path)
+
+    print("%d frames, %d vertices, %d joints (%s)" % (args.frames, body.num_vertices, body.num_joints, smpl_path))
+    print("%-8s %-10s %10s %10s %12s %12s" % ("weights", "method", "time", "speedup", "max error", "max bound"))
+
+    for case in skinning_cases(body, args.frames, args.top_k, args.repeat, np.random.default_rng(0)):
+        print("%-8s %-10s %8.1fms %9.1fx %12.2e %12.2e" % (
+            case["weights"], case["method"], 1000 * case["seconds"], case["speedup"],
+            case["max_error"], case["max_bound"]
+        ))
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+Compares the Keras and TFLite runtimes of load_model (see src/tflite.py):
+the latency and throughput of each network and of run_model, the time to
+load the model, and the maximum difference between their outputs (the
+equivalence check fails if it exceeds --tolerance for float32 models).
+
+The networks are converted first if their TFLite models do not exist (see
+convert_tflite.py). The sequence is a motion file, or a random motion of
+benchmarks/synthetic.py.
+
+Usage: python benchmarks/benchmark_tflite.py [--model trained_models/tshirt] [--threads 1 4] [--motion assets/CMU/07/07_02_poses.npz]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(".")
+
+from src import model
+from src import precision as precisions
+from src import tflite
+from src.io import load_motion
+
+import synthetic
+
+
+def subsample(motion, num_frames):
+    return {
+        "pose": motion["pose"][:num_frames],
+        "shape": motion["shape"],
+        "translation": motion["translation"][:num_frames],
+    }
+
+
+def network_inputs(model_dict, motion, num_rows, rng):
+    '''Inputs of each network (num_rows rows for the diffused body)'''
+    features = model.compute_features(model_dict, dict(motion))
+    pose_feature = rng.normal(size=(num_rows, synthetic.NUM_POSE_FEATURES)).astype(np.float32)
+    shape = np.tile(motion["shape"], (num_rows, 1))
+    v = rng.normal(scale=0.3, size=(num_rows, 3)).astype(np.float32)
+    v_encoded = model_dict["garment/gru"].predict(model.regressor_inputs(motion["shape"], features))[0]
+
+    return {
+        "body/pose_encoder": motion["pose"][:, 3:],
+        "garment/gru": model.regressor_inputs(motion["shape"], features),
+        "garment/decoder": v_encoded,
+        "body/skinning_weights": v,
+        "body/pose_blendshape": [v, pose_feature],
+        "body/shape_blendshape": [v, shape],
+    }
+
+
+def num_rows(x):
+    '''Rows of the inputs of a network (frames for the recurrent regressor)'''
+    if isinstance(x, dict):
+        return next(iter(x.values())).shape[1]
+
+    return len(x[0] if isinstance(x, list) else x)
+
+
+def timed(function, repeat=3):
+    '''Best time of repeat calls, after a warm-up call'''
+    output = function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return output, min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the Keras and TFLite runtimes")
+    parser.add_argument("--model", type=str, default="trained_models/tshirt")
+    parser.add_argument("--motion", type=str, default=None, help="sequence (by default, a random motion)")
+    parser.add_argument("--frames", type=int, default=30, help="maximum number of frames of the sequence")
+    parser.add_argument("--rows", type=int, default=100000, help="rows evaluated by the diffused body networks")
+    parser.add_argument("--threads", type=int, nargs="+", default=sorted({1, os.cpu_count()}), help="threads of the TFLite interpreter")
+    parser.add_argument("--precision", type=str, default="float32", choices=tflite.PRECISIONS)
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="maximum difference of the float32 outputs (m)")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    tf.keras.utils.disable_interactive_logging()
+
+    paths = model.network_paths(args.model)
+    missing = [
+        key for key, path in paths.items()
+        if not os.path.exists(tflite.model_path(path))
+        or (key in precisions.NETWORKS and not os.path.exists(tflite.model_path(path, args.precision)))
+    ]
+    if missing:
+        tflite.convert_model(args.model, precision=args.precision)
+
+    if args.motion:
+        motion = subsample(load_motion(args.motion), args.frames)
+    else:
+        motion = synthetic.make_motion(np.random.default_rng(0), args.frames)
+
+    runtimes = [("keras", None)] + [("tflite", threads) for threads in args.threads]
+    def runtime_name(runtime, threads):
+        return runtime if threads is None else "%s (%d threads)" % (runtime, threads)
+
+    # Loading (int8 is only supported by TFLite: Keras runs in float32)
+    model_dicts, load_times = {}, {}
+    for runtime, threads in runtimes:
+        precision = args.precision
+        if runtime == "keras" and precision not in precisions.KERAS_PRECISIONS:
+            precision = "float32"
+
+        start = time.perf_counter()
+        model_dicts[runtime, threads] = model.load_model(
+            args.model, lazy=False, precision=precision, runtime=runtime, num_threads=threads
+        )
+        load_times[runtime, threads] = time.perf_counter() - start
+
+    keras_dict = model_dicts["keras", None]
+    inputs = network_inputs(keras_dict, motion, args.rows, np.random.default_rng(0))
+
+    # Networks
+    print("%-24s %-22s %12s %14s %12s" % ("network", "runtime", "time (ms)", "rows/s", "max diff"))
+    for key, x in inputs.items():
+        outputs = {}
+        for runtime, threads in runtimes:
+            network = model_dicts[runtime, threads][key]
+            outputs[runtime, threads], seconds = timed(lambda: network.predict(x))
+            difference = np.abs(outputs[runtime, threads] - outputs["keras", None]).max()
+
+            print("%-24s %-22s %12.1f %14.0f %12.2e" % (
+                key, runtime_name(runtime, threads), 1000 * seconds, num_rows(x) / seconds, difference
+            ))
+
+    # Pipeline
+    print()
+    print("%-22s %12s %12s %12s %14s %14s" % (
+        "run_model", "load (s)", "time (ms)", "frames/s", "garment diff", "body diff"
+    ))
+
+    failed = False
+    v_garment_keras, v_body_keras = None, None
+    for runtime, threads in runtimes:
+        model_dict = model_dicts[runtime, threads]
+        (v_garment, v_body), seconds = timed(lambda: model.run_model(model_dict, dict(motion)), repeat=1)
+
+        if v_garment_keras is None:
+            v_garment_keras, v_body_keras = v_garment, v_body
+
+        garment_difference = np.abs(v_garment - v_garment_keras).max()
+        body_difference = np.abs(v_body - v_body_keras).max()
+        failed |= max(garment_difference, body_difference) > args.tolerance
+
+        print("%-22s %12.2f %12.1f %12.1f %14.2e %14.2e" % (
+            runtime_name(runtime, threads), load_times[runtime, threads], 1000 * seconds,
+            len(v_garment) / seconds, garment_difference, body_difference
+        ))
+
+    print()
+    if args.precision != "float32":
+        print("Equivalence check skipped for %s (approximate)" % args.precision)
+    elif failed:
+        print("Equivalence check FAILED (tolerance %g)" % args.tolerance)
+        sys.exit(1)
+    else:
+        print("Equivalence check passed (tolerance %g)" % args.tolerance)
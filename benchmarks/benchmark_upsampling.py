@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Compares two ways of producing garment animations at a higher frame rate
+than the 30fps of the recurrent regressor:
+
+    latent: the latent garment codes and the body motion are interpolated
+        before decoding and skinning (run_model with output_fps)
+    vertex: the output vertices at 30fps are interpolated linearly
+
+The reference for each frame is the model evaluated at 30fps on the motion
+subsampled with that frame's phase (e.g., frames 1, 5, 9... of a 120fps
+capture), so every frame is a real prediction of the model. Errors are
+reported for the interpolated frames only (mean and max vertex error, and
+error of the vertex accelerations, which shows jitter).
+
+The motion is an AMASS file captured at a multiple of the output frame
+rate, or a smooth random motion.
+
+Usage: python benchmarks/benchmark_upsampling.py [--motion assets/CMU/07/07_02_poses.npz] [--fps 120]
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(".")
+
+from src import interpolation
+from src.io import load_motion
+from src.model import FPS, load_model, run_model
+
+
+def subsample(motion, frames):
+    return {
+        "pose": motion["pose"][frames],
+        "shape": motion["shape"],
+        "translation": motion["translation"][frames],
+    }
+
+
+def synthetic_motion(num_frames, rng):
+    '''Joint angles and translation moving with smooth random oscillations'''
+    t = np.linspace(0, num_frames / 120, num_frames)[:, None]
+    frequencies = rng.uniform(0.2, 2, size=(1, 72))
+    phases = rng.uniform(0, 2 * np.pi, size=(1, 72))
+
+    pose = 0.4 * np.sin(2 * np.pi * frequencies * t + phases)
+    pose[:, :3] *= 2
+    translation = 0.5 * np.sin(2 * np.pi * 0.3 * t + rng.uniform(0, 2 * np.pi, size=(1, 3)))
+
+    return {
+        "pose": pose.astype(np.float32),
+        "shape": rng.normal(size=10).astype(np.float32),
+        "translation": (translation - translation[0]).astype(np.float32),
+    }
+
+
+def errors(vertices, reference, frames):
+    '''Vertex and acceleration errors (in mm) in the given frames'''
+    distances = np.linalg.norm(vertices - reference, axis=-1)[frames]
+
+    acceleration = np.diff(vertices, n=2, axis=0)
+    acceleration_reference = np.diff(reference, n=2, axis=0)
+    acceleration_error = np.linalg.norm(acceleration - acceleration_reference, axis=-1)
+
+    return {
+        "mean": 1000 * distances.mean(),
+        "max": 1000 * distances.max(),
+        "acceleration": 1000 * acceleration_error.mean(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark latent-space temporal upsampling")
+    parser.add_argument("--motion", type=str, default=None, help="AMASS motion file (by default, a synthetic motion)")
+    parser.add_argument("--model", type=str, default="trained_models/tshirt")
+    parser.add_argument("--fps", type=int, default=120, help="output frame rate (a multiple of 30 that divides the capture rate)")
+    parser.add_argument("--frames", type=int, default=120, help="maximum number of frames at 30fps")
+    args = parser.parse_args()
+
+    if args.fps % FPS:
+        parser.error("--fps must be a multiple of %d" % FPS)
+
+    factor = args.fps // FPS
+    model_dict = load_model(args.model, lazy=False)
+
+    if args.motion:
+        dense = load_motion(args.motion, fps=args.fps)
+    else:
+        dense = synthetic_motion(args.frames * factor, np.random.default_rng(0))
+    num_frames = min(args.frames, (len(dense["pose"]) - 1) // factor + 1)
+    dense = subsample(dense, slice(0, (num_frames - 1) * factor + 1))
+    motion = subsample(dense, slice(None, None, factor))
+
+    # Warm up (the first predictions build the Keras functions)
+    run_model(model_dict, subsample(motion, slice(0, 2)))
+
+    # Reference: one 30fps run per phase
+    start = time.perf_counter()
+    v_garment_reference, v_body_reference = None, None
+    for phase in range(factor):
+        v_garment, v_body = run_model(model_dict, subsample(dense, slice(phase, None, factor)))
+
+        if v_garment_reference is None:
+            v_garment_reference = np.empty((len(dense["pose"]),) + v_garment.shape[1:], dtype=np.float32)
+            v_body_reference = np.empty((len(dense["pose"]),) + v_body.shape[1:], dtype=np.float32)
+
+        v_garment_reference[phase::factor] = v_garment
+        v_body_reference[phase::factor] = v_body
+    time_reference = time.perf_counter() - start
+
+    # Interpolation of the latent codes
+    start = time.perf_counter()
+    v_garment_latent, v_body_latent = run_model(model_dict, dict(motion), output_fps=args.fps)
+    time_latent = time.perf_counter() - start
+
+    # Interpolation of the vertices
+    start = time.perf_counter()
+    v_garment, v_body = run_model(model_dict, dict(motion))
+    times = interpolation.frame_times(num_frames, FPS, args.fps)
+    v_garment_vertex = interpolation.interpolate(v_garment, times)
+    v_body_vertex = interpolation.interpolate(v_body, times)
+    time_vertex = time.perf_counter() - start
+
+    assert len(v_garment_latent) == len(v_garment_vertex) == len(v_garment_reference)
+
+    # Frames between the 30fps frames
+    interpolated = np.arange(len(times)) % factor != 0
+
+    print("%d frames at %dfps (%d at %dfps)" % (len(times), args.fps, num_frames, FPS))
+    print()
+    print("%-10s %-8s %12s %12s %18s" % ("method", "mesh", "mean (mm)", "max (mm)", "acceleration (mm)"))
+    for method, v_garment, v_body in [
+        ("latent", v_garment_latent, v_body_latent),
+        ("vertex", v_garment_vertex, v_body_vertex),
+    ]:
+        for mesh, vertices, reference in [
+            ("garment", v_garment, v_garment_reference),
+            ("body", v_body, v_body_reference),
+        ]:
+            error = errors(vertices, reference, interpolated)
+            print("%-10s %-8s %12.2f %12.2f %18.3f" % (
+                method, mesh, error["mean"], error["max"], error["acceleration"]
+            ))
+
+    print()
+    print("%-30s %10.1fms" % ("reference (%d runs)" % factor, 1000 * time_reference))
+    print("%-30s %10.1fms" % ("latent interpolation", 1000 * time_latent))
+    print("%-30s %10.1fms" % ("vertex interpolation", 1000 * time_vertex))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+"""
+Load generator for the inference server (serve.py): runs groups of
+concurrent client sessions that stream random motions frame by frame, and
+reports the throughput (frames per second of all the clients), the latency
+of the requests and the mean size of the batches of the server.
+
+Usage:
+    python serve.py trained_models/tshirt --port 8000 &
+    python benchmarks/load_generator.py --port 8000 --clients 1 2 4 8
+
+With --serve, the server is started (and stopped) by the load generator.
+"""
+import argparse
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(".")
+
+from src.server import Client
+
+import synthetic
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(model_path, port, extra_args, timeout=600):
+    '''Starts serve.py and waits until it accepts sessions'''
+    process = subprocess.Popen(
+        [sys.executable, "serve.py", model_path, "--port", str(port)] + extra_args,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    start = time.time()
+    while time.time() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError("The server exited with code %d" % process.returncode)
+
+        try:
+            Client(port=port).status()
+            return process
+        except (OSError, RuntimeError):
+            time.sleep(0.5)
+
+    process.kill()
+    raise TimeoutError("The server did not start in %d seconds" % timeout)
+
+
+def server_status(connect):
+    client = connect()
+    try:
+        return client.status()
+    finally:
+        client.close()
+
+
+def run_client(connect, motion, frames_per_request, fps, latencies, errors):
+    '''Streams a motion through a new session'''
+    try:
+        client = connect()
+        client.create_session(motion["shape"])
+
+        period = frames_per_request / fps if fps else 0
+        start = time.perf_counter()
+        for i, first in enumerate(range(0, len(motion["pose"]), frames_per_request)):
+            frames = slice(first, first + frames_per_request)
+
+            # Pace the requests like a live source
+            delay = start + i * period - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            request_start = time.perf_counter()
+            client.step(motion["pose"][frames], motion["translation"][frames])
+            latencies.append(time.perf_counter() - request_start)
+
+        client.close()
+
+    except Exception as e:
+        errors.append(repr(e))
+
+
+def run_load(connect, num_clients, num_frames, frames_per_request, fps, rng):
+    '''Runs num_clients concurrent sessions and returns their statistics'''
+    motions = [synthetic.make_motion(rng, num_frames) for _ in range(num_clients)]
+    latencies, errors = [], []
+
+    before = server_status(connect)
+    threads = [
+        threading.Thread(target=run_client, args=(connect, motion, frames_per_request, fps, latencies, errors))
+        for motion in motions
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    after = server_status(connect)
+    batches = after["batches"] - before["batches"]
+    requests = after["requests"] - before["requests"]
+
+    return {
+        "clients": num_clients,
+        "frames_per_second": num_clients * num_frames / seconds,
+        "latency_p50": np.percentile(latencies, 50) if latencies else np.nan,
+        "latency_p95": np.percentile(latencies, 95) if latencies else np.nan,
+        "latency_p99": np.percentile(latencies, 99) if latencies else np.nan,
+        "mean_batch_size": requests / max(batches, 1),
+        "errors": errors,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator for the inference server")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--socket", type=str, default=None, help="Unix socket of the server")
+    parser.add_argument("--serve", type=str, default=None, help="start a server with this garment model")
+    parser.add_argument("--server_args", type=str, nargs=argparse.REMAINDER, default=[], help="arguments of serve.py (with --serve)")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8], help="numbers of concurrent sessions")
+    parser.add_argument("--frames", type=int, default=60, help="frames per session")
+    parser.add_argument("--frames_per_request", type=int, default=1)
+    parser.add_argument("--fps", type=float, default=0, help="frames per second of each session (0 for as fast as possible)")
+    args = parser.parse_args()
+
+    server = None
+    if args.serve:
+        args.port = free_port()
+        server = start_server(args.serve, args.port, args.server_args)
+
+    def connect():
+        return Client(args.host, args.port, args.socket)
+
+    rng = np.random.default_rng(0)
+
+    try:
+        print("%8s %12s %12s %12s %12s %12s" % (
+            "clients", "frames/s", "p50 (ms)", "p95 (ms)", "p99 (ms)", "batch size"
+        ))
+        for num_clients in args.clients:
+            result = run_load(connect, num_clients, args.frames, args.frames_per_request, args.fps, rng)
+            print("%8d %12.1f %12.1f %12.1f %12.1f %12.2f" % (
+                num_clients, result["frames_per_second"], 1000 * result["latency_p50"],
+                1000 * result["latency_p95"], 1000 * result["latency_p99"], result["mean_batch_size"]
+            ))
+
+            for error in result["errors"]:
+                print("[ERROR]", error)
+
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
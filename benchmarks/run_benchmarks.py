@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+"""
+Measures the latency, frames per second and peak memory of the main stages
+of the pipeline (run_model and its stages, the body model, LBS and OBJ
+export) for several sequence lengths, checks the skinning methods against
+the 4x4 reference (see benchmark_skinning.py), with the synthetic models of
+benchmarks/synthetic.py, and saves the results as JSON.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --output new.json --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(".")
+
+from src import io
+from src import model
+from src.body import load_smpl
+
+import benchmark_skinning
+import synthetic
+
+
+# Benchmarks run by default
+BENCHMARKS = ["run_model", "smpl", "smpl_numpy", "lbs", "skinning", "save_obj"]
+
+# Benchmarks that only use the body (run once, not per garment)
+BODY_BENCHMARKS = ["smpl", "smpl_numpy", "skinning"]
+
+
+class PeakMemory:
+    '''
+    Context manager that samples the resident memory of the process in a
+    background thread and records the peak increase (in bytes) while it
+    is active. Memory reused by the allocators (e.g., TensorFlow's) does 
+    not count as an increase. Without /proc, it reports the increase of the
+    peak resident memory of the process.
+    '''
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak = 0
+
+
+    @staticmethod
+    def rss():
+        try:
+            with open("/proc/self/statm") as fp:
+                return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.rss() - self.start)
+
+
+    def __enter__(self):
+        self.start = self.rss()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+
+    def __exit__(self, *args):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, self.rss() - self.start)
+
+
+def measure(function, repeat):
+    '''
+    Runs function once to warm up (e.g., to trace the graphs), once to 
+    measure its memory and then repeat times to measure its latency.
+
+    Returns:
+        seconds: minimum time of the timed runs
+        memory: dictionary with the peak increase of resident memory and 
+            the peak memory allocated by Python and NumPy (in MB)
+        output: output of the last run
+    '''
+    function()
+
+    tracemalloc.start()
+    with PeakMemory() as peak_memory:
+        function()
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function()
+        times.append(time.perf_counter() - start)
+
+    memory = {
+        "peak_rss_mb": peak_memory.peak / 1024 ** 2,
+        "peak_numpy_mb": peak_traced / 1024 ** 2
+    }
+
+    return min(times), memory, output
+
+
+def run_model_stages(model_dict, motion, memory_budget):
+    '''Same as model.run_model, timing each stage'''
+    stages = {}
+
+    start = time.perf_counter()
+    features = model.compute_features(model_dict, motion)
+    stages["features"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    v_encoded = model_dict["garment/gru"].predict(
+        model.regressor_inputs(motion["shape"], features), verbose=0
+    )[0]
+    stages["regressor"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    blocks = model.iterate_body_and_garment(
+        model_dict, v_encoded, motion["shape"], motion["pose"], motion["translation"],
+        memory_budget
+    )
+    model.collect(blocks, len(v_encoded))
+    stages["body_and_garment"] = time.perf_counter() - start
+
+    return stages
+
+
+def benchmark_case(name, garment, num_frames, args, models, numpy_body, export_dir):
+    rng = np.random.default_rng(0)
+    motion = synthetic.make_motion(rng, num_frames)
+    model_dict = models[garment or next(iter(models))]
+    result = {"benchmark": name, "garment": garment, "frames": num_frames}
+
+    if name == "run_model":
+        memory_budget = args.memory_budget * 1024 ** 2 or None
+        seconds, memory, stages = measure(
+            lambda: run_model_stages(model_dict, dict(motion), memory_budget), args.repeat
+        )
+        result["stages"] = stages
+
+    elif name in ["smpl", "smpl_numpy"]:
+        body = model_dict["smpl"] if name == "smpl" else numpy_body
+        seconds, memory, _ = measure(
+            lambda: body(motion["shape"], motion["pose"], motion["translation"]), args.repeat
+        )
+
+    elif name == "lbs":
+        num_vertices = len(io.load_obj(f"assets/meshes/{garment}.obj")[0])
+        _, smpl_dict = model_dict["smpl"](motion["shape"], motion["pose"])
+        vertices = rng.normal(size=(num_frames, num_vertices, 3)).astype(np.float32)
+        weights = rng.dirichlet(np.ones(len(synthetic.SMPL_PARENTS)), size=(num_frames, num_vertices))
+        weights = weights.astype(np.float32)
+
+        lbs = model_dict["skinning"]
+        seconds, memory, _ = measure(
+            lambda: lbs(vertices, smpl_dict["joint_transforms"], weights), args.repeat
+        )
+
+    elif name == "skinning":
+        # LBS of the body, with the time and error of each skinning method
+        # (checked against the bound of top-k skinning)
+        body = model_dict["smpl"]
+        _, smpl_dict = body(motion["shape"], motion["pose"])
+
+        lbs = model_dict["skinning"]
+        seconds, memory, _ = measure(
+            lambda: lbs(smpl_dict["vertices_posed"], smpl_dict["joint_transforms"], body.skinning_weights),
+            args.repeat
+        )
+
+        result["methods"] = list(benchmark_skinning.skinning_cases(
+            body, num_frames, [1, 2, 4, 8], args.repeat, rng
+        ))
+
+    elif name == "save_obj":
+        vertices, faces = io.load_obj(f"assets/meshes/{garment}.obj")
+
+        def save():
+            for frame in range(num_frames):
+                path = os.path.join(export_dir, f"{frame:04d}_garment.obj")
+                io.save_obj(path, vertices, faces, verbose=False)
+
+        seconds, memory, _ = measure(save, args.repeat)
+
+    else:
+        raise ValueError("Unknown benchmark: " + name)
+
+    result.update({
+        "seconds": seconds,
+        "ms_per_frame": 1000 * seconds / num_frames,
+        "fps": num_frames / seconds,
+        **memory
+    })
+
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(args):
+    import tensorflow as tf
+
+    return {
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": git_commit(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "tensorflow": tf.__version__,
+        "repeat": args.repeat,
+        "memory_budget_mb": args.memory_budget
+    }
+
+
+def result_key(result):
+    return (result["benchmark"], result["garment"], result["frames"])
+
+
+def compare(results, baseline):
+    '''Prints the speedup of each benchmark with respect to the baseline'''
+    baseline = {result_key(result): result for result in baseline["results"]}
+
+    print()
+    print("%-12s %-8s %7s %12s %12s %9s %12s" % (
+        "benchmark", "garment", "frames", "baseline", "current", "speedup", "numpy memory"
+    ))
+
+    for result in results:
+        reference = baseline.get(result_key(result))
+        if reference is None:
+            continue
+
+        print("%-12s %-8s %7d %10.1fms %10.1fms %8.2fx %+10.1fMB" % (
+            result["benchmark"], result["garment"] or "-", result["frames"],
+            1000 * reference["seconds"], 1000 * result["seconds"],
+            reference["seconds"] / result["seconds"],
+            result["peak_numpy_mb"] - reference["peak_numpy_mb"]
+        ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline with synthetic models")
+    parser.add_argument("--benchmarks", type=str, nargs="+", default=BENCHMARKS, choices=BENCHMARKS)
+    parser.add_argument("--garments", type=str, nargs="+", default=synthetic.GARMENTS)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[30, 120])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case (at least 1)")
+    parser.add_argument("--memory_budget", type=int, default=1024, help="in MB, 0 for no limit")
+    parser.add_argument("--models_dir", type=str, default=os.path.join(tempfile.gettempdir(), "synthetic_models"),
+                        help="directory with the synthetic models (created if they do not exist)")
+    parser.add_argument("--output", type=str, default=None, help="JSON file to save the results")
+    parser.add_argument("--compare", type=str, default=None, help="JSON file with previous results")
+    args = parser.parse_args()
+    args.repeat = max(1, args.repeat)
+
+    # Hide the progress bars of keras.Model.predict
+    import tensorflow as tf
+    tf.keras.utils.disable_interactive_logging()
+
+    smpl_path = synthetic.build(args.models_dir, args.garments)
+
+    models = {
+        garment: model.load_model(
+            os.path.join(args.models_dir, garment), smpl_path=smpl_path,
+            diffused_body_path=os.path.join(args.models_dir, "diffused_body")
+        )
+        for garment in args.garments
+    }
+    numpy_body = load_smpl(smpl_path, backend="numpy")
+
+    results = []
+    print("%-12s %-8s %7s %12s %10s %10s %10s" % (
+        "benchmark", "garment", "frames", "time", "fps", "rss", "numpy"
+    ))
+
+    with tempfile.TemporaryDirectory() as export_dir:
+        for name in args.benchmarks:
+            for garment in [None] if name in BODY_BENCHMARKS else args.garments:
+                for num_frames in args.lengths:
+                    result = benchmark_case(
+                        name, garment, num_frames, args, models, numpy_body, export_dir
+                    )
+                    results.append(result)
+
+                    print("%-12s %-8s %7d %10.1fms %10.1f %8.1fMB %8.1fMB" % (
+                        name, garment or "-", num_frames, 1000 * result["seconds"],
+                        result["fps"], result["peak_rss_mb"], result["peak_numpy_mb"]
+                    ))
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump({"meta": metadata(args), "results": results}, fp, indent=2)
+
+        print("Saved:", args.output)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            compare(results, json.load(fp))
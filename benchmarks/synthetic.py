@@ -0,0 +1,152 @@
+"""
+Synthetic stand-ins for the SMPL model and the trained networks, with the
+same shapes and signatures as the real ones, so that the benchmarks can run
+without the licensed or downloaded files. Their outputs are meaningless, but
+the amount of work of each stage is representative.
+
+The widths of the hidden layers of the networks are not known, so they are
+arguments of make_networks.
+"""
+import os
+
+import numpy as np
+
+from src import io
+
+
+# Kinematic tree of SMPL
+SMPL_PARENTS = np.array([
+    -1, 0, 0, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 9, 9, 12, 13, 14, 16, 17, 18, 19, 20, 21
+])
+
+# Garments of the repository (the number of vertices is read from the meshes)
+GARMENTS = ["tshirt", "dress"]
+
+# Sizes of the inputs of the networks
+NUM_SHAPES = 10
+NUM_POSE_FEATURES = 9 * (len(SMPL_PARENTS) - 1)
+
+
+def make_smpl_dict(rng, body_mesh="assets/meshes/body.obj", joints_per_vertex=4):
+    '''
+    Returns the parameters of a synthetic SMPL model (same keys as
+    io.load_smpl_model) with the vertices and faces of the body mesh and
+    joints_per_vertex non-zero skinning weights per vertex, as in SMPL.
+    '''
+    vertices, faces = io.load_obj(body_mesh)
+    num_vertices, num_joints = len(vertices), len(SMPL_PARENTS)
+
+    weights = np.zeros((num_vertices, num_joints))
+    joints = np.argsort(rng.random((num_vertices, num_joints)), axis=1)[:, :joints_per_vertex]
+    np.put_along_axis(weights, joints, rng.dirichlet(np.ones(joints_per_vertex), num_vertices), axis=1)
+
+    # Each joint is the average of a few vertices
+    joint_regressor = np.zeros((num_joints, num_vertices))
+    for joint in range(num_joints):
+        joint_regressor[joint, rng.choice(num_vertices, 20, replace=False)] = 1 / 20
+
+    kintree_table = np.stack([
+        np.where(SMPL_PARENTS < 0, 4294967295, SMPL_PARENTS), np.arange(num_joints)
+    ]).astype(np.int64)
+
+    return {
+        "v_template": vertices.astype(np.float64),
+        "f": faces.astype(np.uint32),
+        "weights": weights,
+        "shapedirs": 0.01 * rng.normal(size=(num_vertices, 3, NUM_SHAPES)),
+        "posedirs": 0.001 * rng.normal(size=(num_vertices, 3, NUM_POSE_FEATURES)),
+        "J_regressor": joint_regressor,
+        "kintree_table": kintree_table
+    }
+
+
+def make_networks(directory, garments=GARMENTS, hidden_size=64, pose_encoded_size=64,
+                  latent_size=25, gru_size=256):
+    '''
+    Saves random Keras networks with the signatures of the diffused body
+    networks (directory/diffused_body) and the networks of each garment
+    (directory/<garment>).
+    '''
+    import tensorflow.keras as keras
+
+    def mlp(inputs, output_size, activation=None):
+        x = keras.layers.Concatenate()(inputs) if len(inputs) > 1 else inputs[0]
+        x = keras.layers.Dense(hidden_size, activation="relu")(x)
+        x = keras.layers.Dense(hidden_size, activation="relu")(x)
+        return keras.layers.Dense(output_size, activation=activation)(x)
+
+    def save(inputs, outputs, path):
+        keras.Model(inputs, outputs).save(os.path.join(directory, path), save_format="tf")
+
+    x = keras.Input((3 * (len(SMPL_PARENTS) - 1),))
+    save(x, mlp([x], pose_encoded_size), "diffused_body/pose_encoder")
+
+    v = keras.Input((3,))
+    save(v, mlp([v], len(SMPL_PARENTS), "softmax"), "diffused_body/skinning_weights")
+
+    v, pose = keras.Input((3,)), keras.Input((NUM_POSE_FEATURES,))
+    save([v, pose], mlp([v, pose], 3), "diffused_body/pose_blendshape")
+
+    v, shape = keras.Input((3,)), keras.Input((NUM_SHAPES,))
+    save([v, shape], mlp([v, shape], 3), "diffused_body/shape_blendshape")
+
+    feature_sizes = {
+        "shape": NUM_SHAPES,
+        "pose_encoded": pose_encoded_size,
+        "pose_encoded_vel": pose_encoded_size,
+        "pose_encoded_acc": pose_encoded_size,
+        "translation_vel": 3,
+        "translation_acc": 3,
+        "euler_angles_vel": 3,
+        "euler_angles_acc": 3
+    }
+
+    for garment in garments:
+        num_vertices = len(io.load_obj(f"assets/meshes/{garment}.obj")[0])
+
+        inputs = {key: keras.Input((None, size), name=key) for key, size in feature_sizes.items()}
+        x = keras.layers.Concatenate()(list(inputs.values()))
+        x = keras.layers.GRU(gru_size, return_sequences=True)(x)
+        x = keras.layers.GRU(gru_size, return_sequences=True)(x)
+        save(inputs, keras.layers.Dense(latent_size)(x), f"{garment}/gru")
+
+        x = keras.Input((latent_size,))
+        y = keras.layers.Reshape((num_vertices, 3))(keras.layers.Dense(3 * num_vertices)(x))
+        save(x, y, f"{garment}/decoder")
+
+
+def make_motion(rng, num_frames):
+    '''Returns a random motion with the format of io.load_motion'''
+    pose = 0.3 * rng.normal(size=(num_frames, 3 * len(SMPL_PARENTS)))
+    pose[:, 66:] = 0
+
+    return {
+        "pose": pose.astype(np.float32),
+        "shape": rng.normal(size=NUM_SHAPES).astype(np.float32),
+        "translation": np.cumsum(0.01 * rng.normal(size=(num_frames, 3)), axis=0).astype(np.float32)
+    }
+
+
+def build(directory, garments=GARMENTS, seed=0, **network_sizes):
+    '''
+    Creates the synthetic models in directory (unless they already exist).
+
+    Returns:
+        smpl_path: path of the synthetic SMPL archive
+    '''
+    smpl_path = os.path.join(directory, "smpl.npz")
+    missing = [
+        garment for garment in garments
+        if not os.path.exists(os.path.join(directory, garment, "decoder"))
+    ]
+
+    if os.path.exists(smpl_path) and not missing:
+        return smpl_path
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    np.savez(smpl_path, **make_smpl_dict(rng))
+    make_networks(directory, garments, **network_sizes)
+
+    return smpl_path
@@ -0,0 +1,75 @@
+import argparse
+import json
+import sys
+
+from src.collisions import *
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the penetration of the garment in the body in exported sequences"
+    )
+
+    parser.add_argument(
+        "paths",
+        type=str,
+        nargs="+",
+        help="directories with the meshes saved by run_model.py (searched recursively)"
+    )
+
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.0,
+        help="garment vertices closer than -tolerance (in meters) to the body surface are penetrating"
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of processes (by default, one per core)"
+    )
+
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="JSON file to save the metrics of all the sequences"
+    )
+
+    args = parser.parse_args()
+
+    directories = sorted(set(sum([find_sequences(path) for path in args.paths], [])))
+    print("[INFO] Found %d sequences" % len(directories))
+
+    print("%-40s %-10s %7s %9s %12s %12s" % ("Sequence", "Garment", "Frames", "Frames>0", "Penetrating", "Max depth"))
+
+    results, failed = [], []
+    for result in analyze_directories(directories, args.tolerance, args.workers):
+        results.append(result)
+
+        if "error" in result:
+            failed.append(result)
+            print("%-40s %s" % (result["path"][-40:], "FAILED"))
+            continue
+
+        for name, garment in result["garments"].items():
+            summary = garment["summary"]
+            print("%-40s %-10s %7d %9d %11.2f%% %10.1fmm" % (
+                result["path"][-40:], name[:10], summary["frames"], summary["frames_with_penetration"],
+                100 * summary["mean_penetrating_fraction"], 1000 * summary["max_depth"]
+            ))
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(sorted(results, key=lambda result: result["path"]), fp, indent=2)
+
+        print("[INFO] Saved:", args.output)
+
+    if failed:
+        for result in failed:
+            print("[ERROR] %s: %s" % (result["path"], result["error"]))
+
+        print("[ERROR] %d of %d sequences failed" % (len(failed), len(results)))
+        sys.exit(1)
@@ -0,0 +1,29 @@
+import argparse
+
+from src.io import convert_smpl_model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert the SMPL pickle to a NumPy archive that loads faster and does not require chumpy"
+    )
+
+    parser.add_argument(
+        "smpl_path",
+        type=str,
+        nargs="?",
+        default="assets/SMPL/basicModel_f_lbs_10_207_0_v1.0.0.pkl",
+        help="path to the SMPL pickle"
+    )
+
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        default=None,
+        help="path of the archive (by default, next to the pickle with .npz extension)"
+    )
+
+    args = parser.parse_args()
+
+    output_path = convert_smpl_model(args.smpl_path, args.output_path)
+    print("Saved:", output_path)
@@ -0,0 +1,36 @@
+import argparse
+
+from src.model import DIFFUSED_BODY_PATH
+from src.tflite import PRECISIONS, convert_model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert the networks of a garment and of the diffused body to TFLite models"
+    )
+
+    parser.add_argument(
+        "model_path",
+        type=str,
+        help="path to the trained model"
+    )
+
+    parser.add_argument(
+        "--diffused_body_path",
+        type=str,
+        default=DIFFUSED_BODY_PATH,
+        help="path to the networks of the diffused body model"
+    )
+
+    parser.add_argument(
+        "--precision",
+        type=str,
+        default="float32",
+        choices=PRECISIONS,
+        help="also convert the decoder and diffused body networks with this precision"
+    )
+
+    args = parser.parse_args()
+
+    paths = convert_model(args.model_path, args.diffused_body_path, args.precision)
+    print("[INFO] Converted %d networks" % len(paths))
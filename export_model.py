@@ -0,0 +1,43 @@
+import argparse
+
+from src.graph import export_saved_model
+from src.model import load_model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export the whole garment deformation pipeline as a single SavedModel"
+    )
+
+    parser.add_argument(
+        "model_path",
+        type=str,
+        help="path to the trained model"
+    )
+
+    parser.add_argument(
+        "export_path",
+        type=str,
+        help="directory to save the SavedModel"
+    )
+
+    parser.add_argument(
+        "--xla",
+        action="store_true",
+        help="compile the graph with XLA"
+    )
+
+    parser.add_argument(
+        "--memory_budget",
+        type=int,
+        default=1024,
+        help="memory budget (in MB) for the intermediate tensors of the exported model, 0 for no limit"
+    )
+
+    args = parser.parse_args()
+
+    export_saved_model(
+        load_model(args.model_path), args.export_path, args.xla,
+        args.memory_budget * 1024 ** 2 or None
+    )
+    print("[INFO] Saved:", args.export_path)
@@ -0,0 +1,54 @@
+import argparse
+import time
+
+from src.io import find_motions
+from src.motion_store import EXTENSION, pack_motions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Preprocess motion files and pack them into a single memory-mapped store"
+    )
+
+    parser.add_argument(
+        "motions",
+        type=str,
+        help="directory, glob pattern or manifest file with the motion files"
+    )
+
+    parser.add_argument(
+        "output_path",
+        type=str,
+        help="path of the store (" + EXTENSION + ")"
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of processes (by default, one per core)"
+    )
+
+    parser.add_argument(
+        "--keep_arms",
+        action="store_true",
+        help="do not separate the arms from the body (see io.load_motion)"
+    )
+
+    args = parser.parse_args()
+
+    if not args.output_path.endswith(EXTENSION):
+        parser.error("The path of the store must end with " + EXTENSION)
+
+    paths = find_motions(args.motions)
+    print("[INFO] Found %d sequences" % len(paths))
+
+    start = time.perf_counter()
+    num_frames = pack_motions(
+        paths, args.output_path, args.workers, separate_arms=not args.keep_arms, root=args.motions
+    )
+
+    print("[INFO] Packed %d sequences (%d frames) in %.1fs" % (
+        len(paths), num_frames, time.perf_counter() - start
+    ))
+    print("[INFO] Saved:", args.output_path)
@@ -0,0 +1,150 @@
+import argparse
+import multiprocessing
+import os
+import time
+
+from rendering.preview import *
+from src.collisions import find_sequences
+from src.io import load_meshes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Render quick previews of exported sequences without Blender"
+    )
+
+    parser.add_argument(
+        "paths",
+        type=str,
+        nargs="+",
+        help="directories with the meshes saved by run_model.py (searched recursively)"
+    )
+
+    parser.add_argument(
+        "--resolution",
+        type=int,
+        nargs=2,
+        default=list(RESOLUTION),
+        help="width and height of the frames"
+    )
+
+    parser.add_argument(
+        "--shading",
+        type=str,
+        default="gouraud",
+        choices=SHADINGS,
+        help="one intensity per face or interpolated from the vertices"
+    )
+
+    parser.add_argument(
+        "--contact_sheet",
+        type=int,
+        default=16,
+        help="frames in the contact sheet of each sequence (contact_sheet.png), 0 for none"
+    )
+
+    parser.add_argument(
+        "--images",
+        action="store_true",
+        help="save every frame as a PNG file"
+    )
+
+    parser.add_argument(
+        "--video",
+        action="store_true",
+        help="encode every frame in preview.mp4 (requires ffmpeg)"
+    )
+
+    parser.add_argument(
+        "--fps",
+        type=int,
+        default=30,
+        help="frame rate of the video"
+    )
+
+    parser.add_argument(
+        "--no_body",
+        action="store_true",
+        help="render only the garment"
+    )
+
+    parser.add_argument(
+        "--fixed_camera",
+        action="store_true",
+        help="do not follow the meshes with the camera"
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of processes rendering frames (by default, one per core)"
+    )
+
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="directory to save the previews (by default, 'preview' inside each sequence)"
+    )
+
+    args = parser.parse_args()
+
+    if args.contact_sheet <= 0 and not args.images and not args.video:
+        parser.error("nothing to save (use --contact_sheet, --images or --video)")
+
+    directories = sorted(set(sum([find_sequences(path) for path in args.paths], [])))
+    print("[INFO] Found %d sequences" % len(directories))
+
+    num_workers = args.workers or os.cpu_count() or 1
+    pool = multiprocessing.Pool(num_workers) if num_workers > 1 else None
+
+    try:
+        for directory in directories:
+            try:
+                v_garments, f_garments, v_body, f_body = load_meshes(directory)
+            except FileNotFoundError as e:
+                print("[WARNING] Skipped %s: %s" % (directory, e))
+                continue
+
+            if args.no_body:
+                v_body, f_body = None, None
+
+            export_dir = os.path.join(directory, "preview")
+            if args.output:
+                export_dir = os.path.join(args.output, os.path.relpath(directory, os.path.commonpath(args.paths)))
+            os.makedirs(export_dir, exist_ok=True)
+
+            # Render all the frames only if they are saved
+            frames = None
+            if not args.images and not args.video:
+                frames = sheet_frames(len(next(iter(v_garments.values()))), args.contact_sheet)
+
+            start = time.perf_counter()
+            images = render_sequence(
+                v_garments, f_garments, v_body, f_body, frames, tuple(args.resolution),
+                shading=args.shading, follow=not args.fixed_camera, pool=pool
+            )
+            seconds = time.perf_counter() - start
+            num_frames = len(images)
+
+            if args.images:
+                for i, image in enumerate(images):
+                    save_png(os.path.join(export_dir, "%04d.png" % i), image)
+
+            if args.video:
+                save_video(os.path.join(export_dir, "preview.mp4"), images, args.fps)
+
+            if args.contact_sheet > 0:
+                if frames is None:
+                    images = images[sheet_frames(len(images), args.contact_sheet)]
+                save_png(os.path.join(export_dir, "contact_sheet.png"), contact_sheet(images))
+
+            print("[INFO] %s: %d frames (%.0f frames/s) -> %s" % (
+                directory, num_frames, num_frames / seconds, export_dir
+            ))
+
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
@@ -0,0 +1,385 @@
+import struct
+import subprocess
+import zlib
+
+import numpy as np
+
+from src.collisions import vertex_normals
+
+
+# Default size (width x height) of the previews, in pixels
+RESOLUTION = (320, 240)
+
+# Vertical field of view of the camera, in degrees
+FOV = 40.0
+
+# Colors (RGB, 0 to 1) of the meshes and of the background
+BODY_COLOR = (0.62, 0.62, 0.66)
+GARMENT_COLOR = (0.95, 0.72, 0.18)
+BACKGROUND_COLOR = (1.0, 1.0, 1.0)
+
+# Directional light (towards the light, in the Y-up space of the meshes) and
+# ambient term. Both sides of the faces are lit, since garments are open
+# surfaces.
+LIGHT_DIRECTION = (0.3, 0.5, 1.0)
+AMBIENT = 0.25
+
+# Shading of the faces: one intensity per face ("flat") or intensities of
+# the vertices interpolated across the faces ("gouraud")
+SHADINGS = ["flat", "gouraud"]
+
+# Fraction of the image left free around the meshes
+MARGIN = 0.1
+
+# Candidate pixels (of the bounding boxes of the triangles) tested at once,
+# which bounds the memory of the rasterizer
+CHUNK_SIZE = 1 << 20
+
+
+class Camera:
+    '''
+    Perspective camera that looks at a target point from the front of the
+    body (i.e., towards -Z, with Y up), distance meters away.
+    '''
+    def __init__(self, target, distance, resolution=RESOLUTION, fov=FOV):
+        self.target = np.asarray(target, dtype=np.float32)
+        self.distance = distance
+        self.resolution = resolution
+        self.focal = 0.5 * resolution[1] / np.tan(np.radians(fov) / 2)
+
+
+    def project(self, vertices):
+        '''
+        Returns:
+            pixels: array of shape num_vertices x 2 with the (sub)pixel
+                coordinates of the vertices (x to the right, y down)
+            depth: array of shape num_vertices with the distance of the
+                vertices to the camera plane
+        '''
+        width, height = self.resolution
+        relative = vertices - self.target
+        depth = self.distance - relative[:, 2]
+
+        pixels = np.empty((len(vertices), 2), dtype=np.float32)
+        pixels[:, 0] = 0.5 * width + self.focal * relative[:, 0] / depth
+        pixels[:, 1] = 0.5 * height - self.focal * relative[:, 1] / depth
+
+        return pixels, depth.astype(np.float32)
+
+
+def fit_cameras(vertices, resolution=RESOLUTION, fov=FOV, follow=True):
+    '''
+    Cameras that keep the meshes in view in all the frames, at the same
+    distance (so the size of the meshes does not change).
+
+    Args:
+        vertices: list of arrays of shape num_frames x num_vertices x 3 (e.g.,
+            the body and the garment)
+        follow: if True, the cameras follow the center of the meshes in each
+            frame. Otherwise, they look at the center of the whole sequence.
+
+    Returns:
+        cameras: list with the Camera of each frame
+    '''
+    lower = np.min([v.min(axis=1) for v in vertices], axis=0)
+    upper = np.max([v.max(axis=1) for v in vertices], axis=0)
+
+    if follow:
+        targets = 0.5 * (lower + upper)
+        extent = (upper - lower).max(axis=0)
+    else:
+        targets = np.broadcast_to(0.5 * (lower.min(axis=0) + upper.max(axis=0)), lower.shape)
+        extent = upper.max(axis=0) - lower.min(axis=0)
+
+    # Distance at which the largest half-width or half-height fits in the image
+    width, height = resolution
+    half_size = max(extent[1], extent[0] * height / width) / (2 * (1 - 2 * MARGIN))
+    distance = half_size / np.tan(np.radians(fov) / 2) + extent[2] / 2
+
+    return [Camera(target, distance, resolution, fov) for target in targets]
+
+
+def face_normals(vertices, faces):
+    a, b, c = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+    normals = np.cross(b - a, c - a)
+
+    return normals / np.maximum(np.linalg.norm(normals, axis=-1, keepdims=True), 1e-12)
+
+
+def light_intensity(normals):
+    '''Lambertian intensity (lit from both sides) of surfaces with the given normals'''
+    light = np.asarray(LIGHT_DIRECTION, dtype=np.float32)
+    light = light / np.linalg.norm(light)
+
+    return AMBIENT + (1 - AMBIENT) * np.abs(normals @ light)
+
+
+def rasterize(pixels, depth, faces, resolution):
+    '''
+    Z-buffer rasterization of triangles. The candidate pixels of each
+    triangle (the pixels of its bounding box) are tested at once with their
+    barycentric coordinates, and the nearest fragment of each pixel is found
+    by sorting the fragments by pixel and depth.
+
+    Args:
+        pixels: array of shape num_vertices x 2 (see Camera.project)
+        depth: array of shape num_vertices
+        faces: array of shape num_faces x 3
+
+    Returns:
+        face_buffer: array of shape height x width with the index of the
+            face visible in each pixel (-1 for the background)
+        barycentric: array of shape height x width x 3 with the barycentric
+            coordinates of the pixels in their faces
+    '''
+    width, height = resolution
+    face_buffer = np.full(width * height, -1, dtype=np.int64)
+    depth_buffer = np.full(width * height, np.inf, dtype=np.float32)
+    barycentric = np.zeros((width * height, 3), dtype=np.float32)
+
+    # Skip triangles behind the camera, outside the image or without area
+    a, b, c = pixels[faces[:, 0]], pixels[faces[:, 1]], pixels[faces[:, 2]]
+    lower = np.minimum(np.minimum(a, b), c)
+    upper = np.maximum(np.maximum(a, b), c)
+    x_min = np.maximum(np.ceil(lower[:, 0] - 0.5), 0).astype(np.int64)
+    x_max = np.minimum(np.floor(upper[:, 0] - 0.5), width - 1).astype(np.int64)
+    y_min = np.maximum(np.ceil(lower[:, 1] - 0.5), 0).astype(np.int64)
+    y_max = np.minimum(np.floor(upper[:, 1] - 0.5), height - 1).astype(np.int64)
+
+    ab, ac = b - a, c - a
+    area = ab[:, 0] * ac[:, 1] - ac[:, 0] * ab[:, 1]
+
+    visible = (x_max >= x_min) & (y_max >= y_min) & (np.abs(area) > 1e-12)
+    if depth.min() <= 0:
+        visible &= (depth[faces] > 0).all(axis=1)
+
+    triangles = np.flatnonzero(visible)
+    face_depth = depth[faces]
+
+    box_width = x_max[triangles] - x_min[triangles] + 1
+    counts = box_width * (y_max[triangles] - y_min[triangles] + 1)
+    ends = np.cumsum(counts)
+
+    start = 0
+    while start < len(triangles):
+        # Triangles whose candidate pixels fit in a chunk (at least one)
+        stop = max(start + 1, np.searchsorted(ends, ends[start] - counts[start] + CHUNK_SIZE, side="right"))
+        chunk = slice(start, stop)
+        start = stop
+
+        # Candidate pixels of each triangle of the chunk
+        chunk_counts = counts[chunk]
+        triangle = np.repeat(np.arange(len(chunk_counts)), chunk_counts)
+        local = np.arange(chunk_counts.sum()) - np.repeat(np.cumsum(chunk_counts) - chunk_counts, chunk_counts)
+
+        face = triangles[chunk][triangle]
+        x = x_min[face] + local % box_width[chunk][triangle]
+        y = y_min[face] + local // box_width[chunk][triangle]
+
+        # Barycentric coordinates of the pixel centers
+        px = x + 0.5 - a[face, 0]
+        py = y + 0.5 - a[face, 1]
+        w1 = (px * ac[face, 1] - ac[face, 0] * py) / area[face]
+        w2 = (ab[face, 0] * py - px * ab[face, 1]) / area[face]
+        w0 = 1 - w1 - w2
+
+        inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0)
+        if not inside.any():
+            continue
+
+        face, x, y = face[inside], x[inside], y[inside]
+        weights = np.stack([w0[inside], w1[inside], w2[inside]], axis=-1).astype(np.float32)
+        z = weights[:, 0] * face_depth[face, 0] + weights[:, 1] * face_depth[face, 1] + weights[:, 2] * face_depth[face, 2]
+
+        # Nearest fragment of each pixel: positive float32 depths sort like
+        # their bits, so a single sort by pixel and depth finds them
+        pixel = y * width + x
+        keys = (pixel.astype(np.uint64) << np.uint64(32)) | z.astype(np.float32).view(np.uint32).astype(np.uint64)
+        order = np.argsort(keys)
+        sorted_pixel = pixel[order]
+        first = order[np.r_[True, sorted_pixel[1:] != sorted_pixel[:-1]]]
+
+        # Keep the fragments nearer than those of previous chunks
+        first = first[z[first] < depth_buffer[pixel[first]]]
+        depth_buffer[pixel[first]] = z[first]
+        face_buffer[pixel[first]] = face[first]
+        barycentric[pixel[first]] = weights[first]
+
+    return face_buffer.reshape(height, width), barycentric.reshape(height, width, 3)
+
+
+def render_frame(meshes, camera, shading="gouraud"):
+    '''
+    Renders one frame of a list of meshes (vertices, faces and color),
+    which hide each other.
+
+    Returns:
+        image: uint8 array of shape height x width x 3
+    '''
+    if shading not in SHADINGS:
+        raise ValueError("Unknown shading '%s' (supported: %s)" % (shading, ", ".join(SHADINGS)))
+
+    offsets = np.cumsum([0] + [len(vertices) for vertices, _, _ in meshes])
+    vertices = np.concatenate([vertices for vertices, _, _ in meshes]).astype(np.float32)
+    faces = np.concatenate([faces + offset for (_, faces, _), offset in zip(meshes, offsets)])
+    colors = np.concatenate([
+        np.tile(np.asarray(color, dtype=np.float32), (len(faces), 1)) for _, faces, color in meshes
+    ])
+
+    pixels, depth = camera.project(vertices)
+    face_buffer, barycentric = rasterize(pixels, depth, faces, camera.resolution)
+
+    covered = face_buffer >= 0
+    face = face_buffer[covered]
+
+    if shading == "flat":
+        intensity = light_intensity(face_normals(vertices, faces))[face]
+    else:
+        vertex_intensity = light_intensity(vertex_normals(vertices, faces))
+        intensity = (barycentric[covered] * vertex_intensity[faces[face]]).sum(axis=-1)
+
+    width, height = camera.resolution
+    image = np.empty((height, width, 3), dtype=np.float32)
+    image[...] = BACKGROUND_COLOR
+    image[covered] = colors[face] * intensity[:, None]
+
+    return np.clip(255 * image + 0.5, 0, 255).astype(np.uint8)
+
+
+def render_frames(vertices, faces, colors, cameras, shading="gouraud"):
+    '''
+    Renders consecutive frames of several meshes.
+
+    Args:
+        vertices: list with the vertices of each mesh, arrays of shape
+            num_frames x num_vertices x 3
+        faces: list with the faces of each mesh
+        colors: list with the color of each mesh
+        cameras: list with the Camera of each frame
+
+    Returns:
+        frames: uint8 array of shape num_frames x height x width x 3
+    '''
+    return np.stack([
+        render_frame(list(zip([v[i] for v in vertices], faces, colors)), camera, shading)
+        for i, camera in enumerate(cameras)
+    ])
+
+
+def render_task(task):
+    return render_frames(*task)
+
+
+def render_sequence(v_garment, f_garment, v_body=None, f_body=None, frames=None,
+                    resolution=RESOLUTION, fov=FOV, shading="gouraud", follow=True,
+                    pool=None, chunk_size=4):
+    '''
+    Renders previews of the garment (and the body) of a sequence, e.g., the
+    output of model.run_model or the meshes loaded by io.load_meshes. With
+    several garments, v_garment and f_garment are dictionaries by name.
+
+    Args:
+        frames: indices of the frames to render (all by default)
+        follow: if True, the camera follows the meshes (see fit_cameras)
+        pool: optional multiprocessing.Pool that renders chunks of
+            chunk_size frames in parallel
+
+    Returns:
+        images: uint8 array of shape num_frames x height x width x 3
+    '''
+    if not isinstance(v_garment, dict):
+        v_garment, f_garment = {"garment": v_garment}, {"garment": f_garment}
+
+    if frames is None:
+        frames = np.arange(len(next(iter(v_garment.values()))))
+
+    vertices = [np.asarray(v_garment[name][frames], dtype=np.float32) for name in v_garment]
+    faces = [np.asarray(f_garment[name]) for name in v_garment]
+    colors = [GARMENT_COLOR] * len(v_garment)
+
+    if v_body is not None:
+        vertices.insert(0, np.asarray(v_body[frames], dtype=np.float32))
+        faces.insert(0, np.asarray(f_body))
+        colors.insert(0, BODY_COLOR)
+
+    cameras = fit_cameras(vertices, resolution, fov, follow)
+
+    tasks = [
+        ([v[start:start + chunk_size] for v in vertices], faces, colors, cameras[start:start + chunk_size], shading)
+        for start in range(0, len(cameras), chunk_size)
+    ]
+
+    if pool is None:
+        return np.concatenate([render_task(task) for task in tasks])
+
+    return np.concatenate(pool.map(render_task, tasks))
+
+
+def sheet_frames(num_frames, count=16):
+    '''Indices of count frames evenly spaced in a sequence'''
+    return np.unique(np.linspace(0, num_frames - 1, min(count, num_frames)).round().astype(int))
+
+
+def contact_sheet(images, columns=None, border=2):
+    '''
+    Tiles images (e.g., rendered at the frames of sheet_frames) in a grid,
+    separated by border pixels.
+
+    Returns:
+        sheet: uint8 array of shape sheet_height x sheet_width x 3
+    '''
+    count, height, width = images.shape[:3]
+    columns = columns or int(np.ceil(np.sqrt(count)))
+    rows = -(-count // columns)
+
+    sheet = np.full((
+        rows * (height + border) + border, columns * (width + border) + border, 3
+    ), 255, dtype=np.uint8)
+
+    for i, image in enumerate(images):
+        y = border + (i // columns) * (height + border)
+        x = border + (i % columns) * (width + border)
+        sheet[y:y + height, x:x + width] = image
+
+    return sheet
+
+
+def save_png(path, image):
+    '''Saves an RGB uint8 image as a PNG file'''
+    height, width = image.shape[:2]
+
+    # Each row starts with its filter type (0, none)
+    rows = np.concatenate([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, -1)], axis=1)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    with open(path, "wb") as fp:
+        fp.write(b"\x89PNG\r\n\x1a\n")
+        fp.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        fp.write(chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)))
+        fp.write(chunk(b"IEND", b""))
+
+
+def save_video(path, images, fps=30, crf=20):
+    '''Encodes images with ffmpeg (H.264), piping them as raw frames'''
+    height, width = images.shape[1:3]
+
+    command = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", "%dx%d" % (width, height),
+        "-framerate", str(fps), "-i", "-",
+        "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-crf", str(crf), path
+    ]
+
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        for image in images:
+            process.stdin.write(np.ascontiguousarray(image).tobytes())
+    finally:
+        process.stdin.close()
+        process.wait()
+
+    if process.returncode != 0:
+        raise RuntimeError("ffmpeg exited with code %d" % process.returncode)
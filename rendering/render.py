@@ -1,27 +1,103 @@
 #!/usr/bin/env python
-import sys 
+import sys
 import os
 import glob
+import argparse
+import subprocess
+
+import bpy
 
 sys.path.append(".")
 
-from rendering.renderer import GarmentRenderer
+from rendering.renderer import GarmentRenderer, MeshFrames, concatenate_videos, frame_ranges
+from src.io import mesh_names, obj_frame_name
+from src.mesh_sequence import EXTENSION as MESH_SEQUENCE_EXTENSION
+
+
+def mesh_source(path, name):
+    '''Mesh sequence file of a mesh in path, or its OBJ files (one per frame)'''
+    sequence_path = os.path.join(path, name + MESH_SEQUENCE_EXTENSION)
+    if os.path.exists(sequence_path):
+        return sequence_path
+
+    return sorted(
+        obj_path for obj_path in glob.glob(os.path.join(path, "*_%s.obj" % glob.escape(name)))
+        if obj_frame_name(obj_path) == name
+    )
+
+
+def render_processes(args, start, end):
+    '''Renders disjoint ranges of frames (from start to end) in parallel Blender processes'''
+    export_path = os.path.join(args.path, "render")
+    os.makedirs(export_path, exist_ok=True)
+
+    processes, segments = [], []
+    for first, last in frame_ranges(end - start + 1, args.processes):
+        command = [
+            bpy.app.binary_path, "--background", bpy.data.filepath, "--python", os.path.abspath(__file__),
+            "--", "--path", args.path, "--start", str(start + first), "--end", str(start + last), "--worker"
+        ]
+
+        if args.video:
+            segments.append(os.path.join(export_path, "segment_%05d.mp4" % (start + first)))
+            command += ["--video", "--fps", str(args.fps), "--segment", segments[-1]]
+
+        processes.append(subprocess.Popen(command))
+
+    failed = sum(process.wait() != 0 for process in processes)
+    if failed:
+        raise RuntimeError("%d of %d render processes failed" % (failed, len(processes)))
+
+    if args.video:
+        concatenate_videos(segments, os.path.join(export_path, "output.mp4"))
+        for segment in segments:
+            os.remove(segment)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the meshes of a sequence", allow_abbrev=False)
+    parser.add_argument("--path", type=str, required=True, help="directory with the meshes (OBJ files or mesh sequences)")
+    parser.add_argument("--start", type=int, default=0, help="first frame")
+    parser.add_argument("--end", type=int, default=None, help="last frame (included)")
+    parser.add_argument("--processes", type=int, default=1, help="Blender processes rendering disjoint ranges of frames")
+    parser.add_argument("--video", action="store_true", help="pipe the frames to ffmpeg instead of saving them as images")
+    parser.add_argument("--fps", type=int, default=30, help="frame rate of the video")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--segment", type=str, default=None, help=argparse.SUPPRESS)
+
+    # Arguments after "--" are not parsed by Blender
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    args, _ = parser.parse_known_args(argv)
+
+    # One source per garment ("garment" with a single garment, see src/io.py)
+    cloth_sources = {
+        name: mesh_source(args.path, name) for name in mesh_names(args.path) if name != "body"
+    }
+    body_source = mesh_source(args.path, "body")
 
-try:
-    index = sys.argv.index("--path")
-    path = sys.argv[index + 1]
-except ValueError:
-    print("Usage: blender --background rendering/scene.blend --python rendering/render.py --path <path_to_meshes>")
+    if args.processes > 1:
+        num_frames = max(len(MeshFrames(source)) for source in list(cloth_sources.values()) + [body_source])
+        end = num_frames - 1 if args.end is None else min(args.end, num_frames - 1)
+        render_processes(args, args.start, end)
 
+    renderer = GarmentRenderer(
+        cloth_paths=cloth_sources,
+        body_paths=body_source,
+        cloth_material="ClothMaterialYellow",
+        body_material="MannequinMaterialDark",
+        export_path=os.path.join(args.path, "render")
+    )
 
-renderer = GarmentRenderer(
-    cloth_paths=sorted(glob.glob(os.path.join(path, "*garment.obj"))),
-    body_paths=sorted(glob.glob(os.path.join(path, "*body.obj"))),
-    cloth_material="ClothMaterialYellow",
-    body_material="MannequinMaterialDark",
-    export_path=os.path.join(path, "render")
-)
+    video_path = args.segment
+    if args.video and video_path is None:
+        video_path = os.path.join(args.path, "render", "output.mp4")
 
-renderer.render(resolution_percentage=100, fov=50, start_frame=0, end_frame=None)
-renderer.generate_video()
+    # With --processes, the frames have been rendered by render_processes
+    if args.processes <= 1:
+        renderer.render(
+            resolution_percentage=100, fov=50, start_frame=args.start, end_frame=args.end,
+            video_path=video_path, fps=args.fps
+        )
 
+    if not args.video and not args.worker:
+        renderer.generate_video(fps=args.fps)
@@ -1,14 +1,101 @@
 import bpy
+import math
 import os
+import shutil
+import subprocess
+import tempfile
 
 import numpy as np
 
+from src.mesh_sequence import MeshSequence
+from src.obj import read_obj
+
+# Rotation from the Y-up space of the meshes to the Z-up space of Blender
+# (the axis conversion of the OBJ importer)
+AXIS_ROTATION = (math.pi / 2, 0.0, 0.0)
+
+# Format of the frames piped to ffmpeg (lossless and fast to write)
+PIPE_FORMAT = "PNG"
+PIPE_EXTENSION = ".png"
+
+
+class MeshFrames:
+    '''
+    Vertices of a mesh in each frame, read from a list of OBJ files (one per
+    frame), from a mesh sequence file (see src/mesh_sequence.py) or from an
+    array of shape num_frames x num_vertices x 3 (with its faces). Frames 
+    are read when they are accessed.
+    '''
+    def __init__(self, source, faces=None):
+        self.paths = None
+        self.vertices = None
+        self.faces = faces
+
+        if isinstance(source, str):
+            self.vertices = MeshSequence(source)
+            self.faces = np.asarray(self.vertices.faces)
+
+        elif isinstance(source, (list, tuple)):
+            self.paths = list(source)
+            if self.faces is None and self.paths:
+                self.faces = read_obj(self.paths[0])[1]
+
+        else:
+            if faces is None:
+                raise ValueError("The faces are required to render an array of vertices")
+
+            self.vertices = np.asarray(source, dtype=np.float32)
+
+
+    def __len__(self):
+        return len(self.paths) if self.paths is not None else len(self.vertices)
+
+
+    def __getitem__(self, frame):
+        if self.paths is not None:
+            return read_obj(self.paths[frame])[0]
+
+        return np.asarray(self.vertices[frame], dtype=np.float32)
 
-class GarmentRenderer:
 
+def frame_ranges(num_frames, num_ranges):
+    '''Splits the frames into consecutive ranges (first and last frame) of similar size'''
+    bounds = np.linspace(0, num_frames, min(num_ranges, num_frames) + 1).round().astype(int)
+    return [(int(start), int(stop) - 1) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def concatenate_videos(paths, output_path):
+    '''Joins videos with the same encoding (e.g., rendered by several processes) without re-encoding them'''
+    list_path = output_path + ".txt"
+    with open(list_path, "w") as fp:
+        for path in paths:
+            fp.write("file '%s'\n" % os.path.abspath(path))
+
+    command = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output_path]
+    subprocess.run(command, check=True)
+    os.remove(list_path)
+
+
+class GarmentRenderer:
+    '''
+    Renders the garment and the body of a sequence. Each mesh is given as a
+    list of OBJ files (one per frame), the path of a mesh sequence file or 
+    an array of vertices (with cloth_faces and body_faces). With several
+    garments, cloth_paths (and cloth_faces) are dictionaries by name.
+
+    The objects are created once, and the coordinates of their vertices are
+    replaced in each frame.
+    '''
     def __init__(self, cloth_paths, body_paths, **config):
-        self.cloth_paths = cloth_paths
-        self.body_paths = body_paths
+        cloth_faces = config.pop("cloth_faces", None)
+        if not isinstance(cloth_paths, dict):
+            cloth_paths, cloth_faces = {"garment": cloth_paths}, {"garment": cloth_faces}
+
+        self.cloths = {
+            name: MeshFrames(source, (cloth_faces or {}).get(name))
+            for name, source in cloth_paths.items()
+        }
+        self.body = MeshFrames(body_paths, config.pop("body_faces", None))
 
         # Blender scene
         self.camera = bpy.context.scene.camera
@@ -42,12 +129,24 @@ class GarmentRenderer:
         if self.initialized:
             return
 
-        self.frames = max(len(self.cloth_paths), len(self.body_paths))
+        self.frames = max([len(cloth) for cloth in self.cloths.values()] + [len(self.body)])
 
         # Create the export directory if does not exist
         if not os.path.exists(self.export_path):
             os.makedirs(self.export_path)
 
+        self.body_mesh = None
+        if self.render_body and len(self.body) > 0:
+            self.body_mesh = self.create_object("Body", self.body, self.body_material)
+
+        # One object per garment ("Cloth" with a single garment)
+        self.cloth_meshes = {}
+        if self.render_cloth:
+            for name, cloth in self.cloths.items():
+                if len(cloth) > 0:
+                    object_name = "Cloth" if len(self.cloths) == 1 else "Cloth_" + name
+                    self.cloth_meshes[name] = self.create_object(object_name, cloth, self.cloth_material)
+
         self.initialized = True
 
 
@@ -65,16 +164,6 @@ class GarmentRenderer:
         self.camera.constraints["Track To"].target = mesh         
   
 
-    def get_body(self, frame):
-        return self.load_obj(self.body_paths[frame], self.body_material)
-
-
-    def get_cloth(self, frame):
-        cloth = self.load_obj(self.cloth_paths[frame], self.cloth_material)
-        # self.add_wireframe(cloth, thickness=0.0005)
-        return cloth
-
-
     def add_wireframe(self, obj, thickness = 0.001):
         obj.data.materials.append(bpy.data.materials["WireframeMaterial"])
         obj.modifiers.new(type='WIREFRAME', name="Wireframe")
@@ -83,24 +172,56 @@ class GarmentRenderer:
         obj.modifiers["Wireframe"].use_replace = False
 
 
-    def load_obj(self, path, material):
-        bpy.ops.import_scene.obj(filepath=path, split_mode="OFF")
-        bpy.ops.object.origin_set(type='ORIGIN_GEOMETRY')
-        bpy.ops.object.shade_smooth()
+    def create_object(self, name, frames, material):
+        '''Creates a smooth shaded object with the faces of a mesh and the vertices of its first frame'''
+        faces = np.asarray(frames.faces)
 
-        mesh = bpy.context.selected_objects[0]
-        mesh.active_material = bpy.data.materials[material]
+        mesh = bpy.data.meshes.new(name)
+        mesh.from_pydata(frames[0].tolist(), [], faces.tolist())
+        mesh.polygons.foreach_set("use_smooth", np.ones(len(faces), dtype=bool))
+        mesh.materials.append(bpy.data.materials[material])
+        mesh.update()
 
-        return mesh
+        obj = bpy.data.objects.new(name, mesh)
+        obj.rotation_euler = AXIS_ROTATION
+        bpy.context.scene.collection.objects.link(obj)
+
+        return obj
+
+
+    def update_object(self, obj, vertices):
+        '''
+        Replaces the vertices of an object in bulk. As with
+        origin_set(type='ORIGIN_GEOMETRY'), the origin of the object is the
+        median of its vertices.
+        '''
+        center = vertices.mean(axis=0)
+        coordinates = np.ascontiguousarray(vertices - center, dtype=np.float32)
+
+        obj.data.vertices.foreach_set("co", coordinates.ravel())
+        obj.data.update()
+
+        # Location in Blender space (Z-up)
+        obj.location = (center[0], -center[2], center[1])
 
 
     def delete_object(self, mesh):
         if mesh == None: 
             return
 
-        bpy.ops.object.select_all(action='DESELECT')
-        mesh.select_set(state=True)
-        bpy.ops.object.delete()
+        bpy.data.objects.remove(mesh, do_unlink=True)
+
+
+    def open_video(self, path, fps=30, crf=20):
+        '''Starts an ffmpeg process that encodes the frames written to its input'''
+        command = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "image2pipe", "-framerate", str(fps), "-c:v", "png", "-i", "-",
+            "-c:v", "libx264", "-profile:v", "high", "-pix_fmt", "yuv420p",
+            "-crf", str(crf), path
+        ]
+
+        return subprocess.Popen(command, stdin=subprocess.PIPE)
 
 
     def render_path(self, frame):
@@ -108,7 +229,13 @@ class GarmentRenderer:
         return os.path.join(self.export_path, file_name)
 
 
-    def render(self, resolution_x = 1920, resolution_y = 1080, fov = 45, resolution_percentage = 100, start_frame = 0, end_frame = None):
+    def render(self, resolution_x = 1920, resolution_y = 1080, fov = 45, resolution_percentage = 100, start_frame = 0, end_frame = None,
+               video_path = None, fps = 30, crf = 20):
+        '''
+        Renders the frames from start_frame to end_frame (both included) as
+        images in the export path or, with video_path, pipes them to ffmpeg
+        to encode them as a video (without intermediate JPEG files).
+        '''
         self.initialize()
      
         # Set render settings
@@ -116,48 +243,76 @@ class GarmentRenderer:
         self.render_settings.resolution_y = resolution_y
         self.render_settings.resolution_percentage = resolution_percentage
         self.camera.data.sensor_width = max(fov, 25)
-  
-        body_mesh = None
-        cloth_mesh = None
-    
-        # Start rendering
-        for frame in range(self.frames):
 
-            if frame < start_frame:
-                continue
+        body_mesh = self.body_mesh
+        cloth_meshes = self.cloth_meshes
+
+        # Blender only renders to files, so each frame is written (losslessly)
+        # to the same temporary file and then piped to ffmpeg
+        video, frame_directory = None, None
+        if video_path is not None:
+            video = self.open_video(video_path, fps, crf)
+            frame_directory = tempfile.mkdtemp(prefix="render_")
+            self.render_settings.image_settings.file_format = PIPE_FORMAT
+            self.render_settings.image_settings.compression = 0
+
+        try:
+            # Start rendering
+            for frame in range(self.frames):
+
+                if frame < start_frame:
+                    continue
+
+                if end_frame is not None and frame > end_frame:
+                    break
 
-            if end_frame is not None and frame > end_frame:
-                break
+                print("\n[ INFO ] Rendering frame %d" % frame)
 
-            print("\n[ INFO ] Rendering frame %d" % frame)
+                # Update the vertices of the current frame
+                if body_mesh != None and frame < len(self.body):
+                    body_mesh.rotation_euler = AXIS_ROTATION
+                    self.update_object(body_mesh, self.body[frame])
 
-            # Get the objects of the current frame 
-            if self.render_body and frame < len(self.body_paths):
-                self.delete_object(body_mesh)
-                body_mesh = self.get_body(frame)
+                for name, cloth_mesh in cloth_meshes.items():
+                    if frame < len(self.cloths[name]):
+                        self.update_object(cloth_mesh, self.cloths[name][frame])
 
-            if frame < len(self.cloth_paths):
-                self.delete_object(cloth_mesh)
-                cloth_mesh = self.get_cloth(frame)
+                # Make the camera look at the (first) cloth, or the body if there is no cloth
+                if cloth_meshes and not self.follow_body:
+                    self.track_object(next(iter(cloth_meshes.values())))
 
-            # Make the camera look at the cloth (or the body if there is no cloth)
-            if cloth_mesh != None and not self.follow_body:
-                self.track_object(cloth_mesh)
+                if body_mesh != None and self.follow_body:
+                    self.track_object(body_mesh)    
 
-            if body_mesh != None and self.follow_body:
-                self.track_object(body_mesh)    
-            
-            # Rotate the cloth
-            cloth_mesh.parent = body_mesh
-            cloth_mesh.matrix_parent_inverse = body_mesh.matrix_world.inverted()
-            body_mesh.rotation_euler[2] = self.rotation
-       
-            # Render the frame
-            self.render_settings.filepath = self.render_path(frame)
-            bpy.ops.render.render(write_still = True) 
+                # Rotate the cloth
+                if cloth_meshes and body_mesh != None:
+                    bpy.context.view_layer.update()
+                    for cloth_mesh in cloth_meshes.values():
+                        cloth_mesh.parent = body_mesh
+                        cloth_mesh.matrix_parent_inverse = body_mesh.matrix_world.inverted()
+                    body_mesh.rotation_euler[2] = self.rotation
 
-        self.delete_object(body_mesh)
-        self.delete_object(cloth_mesh)
+                # Render the frame
+                if video is None:
+                    self.render_settings.filepath = self.render_path(frame)
+                    bpy.ops.render.render(write_still = True) 
+                    continue
+
+                path = os.path.join(frame_directory, "frame" + PIPE_EXTENSION)
+                self.render_settings.filepath = path
+                bpy.ops.render.render(write_still = True)
+
+                with open(path, "rb") as fp:
+                    video.stdin.write(fp.read())
+
+        finally:
+            if video is not None:
+                video.stdin.close()
+                video.wait()
+                shutil.rmtree(frame_directory, ignore_errors=True)
+
+        if video is not None and video.returncode != 0:
+            raise RuntimeError("ffmpeg exited with code %d" % video.returncode)
 
 
     def generate_video(self, fps = 30, crf = 20, name="output"):
@@ -174,41 +329,3 @@ class GarmentRenderer:
 
     # Convert jpg sequence to video
     # ffmpeg -framerate 30 -i %05d.jpg -c:v libx264 -profile:v high -crf 10 -pix_fmt yuv420p output.mp4
-
-def read_obj(file_name, read_uvs=False):
-    # Counts number of vertices and faces
-    vertices = []
-    faces = []
-    uvs = []
-    faces_uv = []
-
-    with open(file_name, 'r') as fp:
-        for line in fp:
-            line_split = line.split()
-            
-            if not line_split:
-                continue
-
-            if read_uvs and line_split[0] == 'vt':
-                uvs.append([line_split[1], line_split[2]])
-
-            if line_split[0] == 'v':
-                vertices.append([line_split[1], line_split[2], line_split[3]])
-
-            if line_split[0] == 'f':
-                vertex_indices = [s.split("/")[0] for s in line_split[1:]]
-                faces.append(vertex_indices)
-
-                if read_uvs:
-                    uv_indices = [s.split("/")[1] for s in line_split[1:]]
-                    faces_uv.append(uv_indices)
-
-    vertices = np.array(vertices, dtype=np.float32)
-    faces = np.array(faces, dtype=np.int32) - 1
-
-    if read_uvs:
-        uvs = np.array(uvs, dtype=np.float32)
-        faces_uv = np.array(faces_uv, dtype=np.int32) - 1
-        return vertices, faces, uvs, faces_uv
-
-    return vertices, faces
\ No newline at end of file
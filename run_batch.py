@@ -0,0 +1,144 @@
+import argparse
+import os
+
+from src import tracing
+from src.batching import *
+from src.io import *
+from src.model import *
+from src.precision import PRECISIONS
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the garment deformation model for many sequences in batches"
+    )
+
+    parser.add_argument(
+        "motions",
+        type=str,
+        help="directory, glob pattern or manifest file with the motion files"
+    )
+
+    parser.add_argument(
+        "model_path",
+        type=str,
+        help="path to the trained model"
+    )
+
+    parser.add_argument(
+        "--export_dir",
+        type=str,
+        default="results",
+        help="directory to save the predictions (one subdirectory per sequence)"
+    )
+
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=8,
+        help="maximum number of sequences per batch"
+    )
+
+    parser.add_argument(
+        "--bucket_width",
+        type=int,
+        default=32,
+        help="sequences in the same batch differ in less than this number of frames"
+    )
+
+    parser.add_argument(
+        "--memory_budget",
+        type=int,
+        default=1024,
+        help="memory budget (in MB) for the intermediate tensors, 0 for no limit"
+    )
+
+    parser.add_argument(
+        "--format",
+        type=str,
+        default="obj",
+        choices=EXPORT_FORMATS,
+        help="export format: one OBJ file per frame or one mesh sequence file per mesh"
+    )
+
+    parser.add_argument(
+        "--vertex_dtype",
+        type=str,
+        default="float32",
+        choices=list(mesh_sequence.VERTEX_DTYPES),
+        help="storage type of the vertices in mesh sequence files"
+    )
+
+    parser.add_argument(
+        "--top_k",
+        type=int,
+        default=None,
+        help="skin each body vertex with the k joints of largest weight (faster, approximate; the garment always uses all the joints)"
+    )
+
+    parser.add_argument(
+        "--precision",
+        type=str,
+        default="float32",
+        choices=PRECISIONS,
+        help="precision of the decoder and diffused body networks (reduced precisions are approximate and, on CPU, not faster than float32: use them to evaluate their accuracy; int8 needs --runtime tflite)"
+    )
+
+    parser.add_argument(
+        "--runtime",
+        type=str,
+        default="keras",
+        choices=RUNTIMES,
+        help="run the networks with Keras or with TFLite (convert them first with convert_tflite.py)"
+    )
+
+    parser.add_argument(
+        "--tflite_threads",
+        type=int,
+        default=None,
+        help="threads of the TFLite interpreter"
+    )
+
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="record the time and memory of each stage and save them to this file (.json for the Chrome trace format, JSON lines otherwise)"
+    )
+
+    args = parser.parse_args()
+
+    if args.trace:
+        tracing.enable()
+
+    paths = find_motions(args.motions)
+    print("[INFO] Found %d sequences" % len(paths))
+
+    garment = garment_name(args.model_path)
+    _, f_garment = load_obj(f"assets/meshes/{garment}.obj")
+    _, f_body = load_obj("assets/meshes/body.obj")
+
+    outputs = run_model_batch(
+        model_dict=load_model(
+            args.model_path, top_k=args.top_k, precision=args.precision,
+            runtime=args.runtime, num_threads=args.tflite_threads
+        ),
+        motions=paths,
+        batch_size=args.batch_size,
+        bucket_width=args.bucket_width,
+        memory_budget=args.memory_budget * 1024 ** 2 or None,
+        lengths=[motion_length(path) for path in paths]
+    )
+
+    # Save meshes
+    for i, v_garment, v_body in outputs:
+        export_dir = os.path.join(args.export_dir, motion_name(paths[i], args.motions))
+        save_meshes(
+            export_dir, v_garment, f_garment, v_body, f_body,
+            args.format, args.vertex_dtype, verbose=False
+        )
+        print("[INFO] Saved:", export_dir)
+
+    if args.trace:
+        print(tracing.summary())
+        print("[INFO] Saved trace:", tracing.save(args.trace))
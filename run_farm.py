@@ -0,0 +1,112 @@
+import argparse
+import sys
+
+from src import mesh_sequence
+from src.farm import run_farm
+from src.io import EXPORT_FORMATS, find_motions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the garment deformation model for many sequences with a pool of worker processes"
+    )
+
+    parser.add_argument(
+        "motions",
+        type=str,
+        help="directory, glob pattern or manifest file with the motion files"
+    )
+
+    parser.add_argument(
+        "model_path",
+        type=str,
+        help="path to the trained model"
+    )
+
+    parser.add_argument(
+        "--export_dir",
+        type=str,
+        default="results",
+        help="directory to save the predictions (one subdirectory per sequence)"
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (by default, one per 4 cores)"
+    )
+
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="TensorFlow intra-op threads per worker (by default, cores / workers)"
+    )
+
+    parser.add_argument(
+        "--memory_budget",
+        type=int,
+        default=1024,
+        help="memory budget (in MB) per worker for the intermediate tensors, 0 for no limit"
+    )
+
+    parser.add_argument(
+        "--format",
+        type=str,
+        default="obj",
+        choices=EXPORT_FORMATS,
+        help="export format: one OBJ file per frame or one mesh sequence file per mesh"
+    )
+
+    parser.add_argument(
+        "--vertex_dtype",
+        type=str,
+        default="float32",
+        choices=list(mesh_sequence.VERTEX_DTYPES),
+        help="storage type of the vertices in mesh sequence files"
+    )
+
+    parser.add_argument(
+        "--top_k",
+        type=int,
+        default=None,
+        help="skin each body vertex with the k joints of largest weight (faster, approximate; the garment always uses all the joints)"
+    )
+
+    parser.add_argument(
+        "--precision",
+        type=str,
+        default="float32",
+        choices=["float32", "float16", "bfloat16", "int8"],  # precision.PRECISIONS, without importing TensorFlow
+        help="precision of the decoder and diffused body networks (reduced precisions are approximate and, on CPU, not faster than float32: use them to evaluate their accuracy; int8 needs --runtime tflite)"
+    )
+
+    parser.add_argument(
+        "--runtime",
+        type=str,
+        default="keras",
+        choices=["keras", "tflite"],  # model.RUNTIMES
+        help="run the networks with Keras or with TFLite (convert them first with convert_tflite.py)"
+    )
+
+    args = parser.parse_args()
+
+    failed = run_farm(
+        paths=find_motions(args.motions),
+        model_path=args.model_path,
+        export_dir=args.export_dir,
+        num_workers=args.workers,
+        threads_per_worker=args.threads,
+        memory_budget=args.memory_budget * 1024 ** 2 or None,
+        export_format=args.format,
+        vertex_dtype=args.vertex_dtype,
+        top_k=args.top_k,
+        precision=args.precision,
+        runtime=args.runtime,
+        root=args.motions
+    )
+
+    if failed:
+        print("[ERROR] %d sequences failed" % len(failed))
+        sys.exit(1)
@@ -1,8 +1,13 @@
 import argparse
 import os
 
+from src import collisions
+from src import startup
+from src import tracing
+from src.export import export_blocks
 from src.io import *
 from src.model import *
+from src.precision import PRECISIONS
 
 
 if __name__ == "__main__":
@@ -17,9 +22,10 @@ if __name__ == "__main__":
     )
 
     parser.add_argument(
-        "model_path",
+        "model_paths",
         type=str,
-        help="path to the trained model"
+        nargs="+",
+        help="paths to the trained models of one or more garments worn together"
     )
 
     parser.add_argument(
@@ -29,24 +35,166 @@ if __name__ == "__main__":
         help="directory to save the predictions"
     )
 
+    parser.add_argument(
+        "--memory_budget",
+        type=int,
+        default=1024,
+        help="memory budget (in MB) for the intermediate tensors, 0 for no limit"
+    )
+
+    parser.add_argument(
+        "--format",
+        type=str,
+        default="obj",
+        choices=EXPORT_FORMATS,
+        help="export format: one OBJ file per frame or one mesh sequence file per mesh"
+    )
+
+    parser.add_argument(
+        "--vertex_dtype",
+        type=str,
+        default="float32",
+        choices=list(mesh_sequence.VERTEX_DTYPES),
+        help="storage type of the vertices in mesh sequence files"
+    )
+
+    parser.add_argument(
+        "--writers",
+        type=int,
+        default=2,
+        help="number of threads writing meshes while the model runs, 0 to write them at the end"
+    )
+
+    parser.add_argument(
+        "--writer_processes",
+        action="store_true",
+        help="use processes instead of threads to write meshes"
+    )
+
+    parser.add_argument(
+        "--startup_report",
+        action="store_true",
+        help="print the time spent importing and loading each component"
+    )
+
+    parser.add_argument(
+        "--top_k",
+        type=int,
+        default=None,
+        help="skin each body vertex with the k joints of largest weight (faster, approximate; the garment always uses all the joints)"
+    )
+
+    parser.add_argument(
+        "--precision",
+        type=str,
+        default="float32",
+        choices=PRECISIONS,
+        help="precision of the decoder and diffused body networks (reduced precisions are approximate and, on CPU, not faster than float32: use them to evaluate their accuracy; int8 needs --runtime tflite)"
+    )
+
+    parser.add_argument(
+        "--fps",
+        type=int,
+        default=FPS,
+        help="output frame rate (the regressor runs at %d fps and its latent codes are interpolated)" % FPS
+    )
+
+    parser.add_argument(
+        "--runtime",
+        type=str,
+        default="keras",
+        choices=RUNTIMES,
+        help="run the networks with Keras or with TFLite (convert them first with convert_tflite.py)"
+    )
+
+    parser.add_argument(
+        "--tflite_threads",
+        type=int,
+        default=None,
+        help="threads of the TFLite interpreter"
+    )
+
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="record the time and memory of each stage and save them to this file (.json for the Chrome trace format, JSON lines otherwise)"
+    )
+
+    parser.add_argument(
+        "--collisions",
+        action="store_true",
+        help="measure the penetration of each garment in the body and save it to collisions.json (<garment>_collisions.json with several garments)"
+    )
+
     args = parser.parse_args()
 
-    v_garment, v_body = run_model(
-        model_dict=load_model(args.model_path), 
-        motion=load_motion(args.motion_path)
+    if args.trace:
+        tracing.enable()
+
+    model_dicts = load_models(
+        args.model_paths, top_k=args.top_k, precision=args.precision,
+        runtime=args.runtime, num_threads=args.tflite_threads
     )
+    motion = load_motion(args.motion_path)
+    memory_budget = args.memory_budget * 1024 ** 2 or None
 
-    # Save meshes
     os.makedirs(args.export_dir, exist_ok=True)
 
-    garment_name = os.path.basename(args.model_path)
-    _, f_garment = load_obj(f"assets/meshes/{garment_name}.obj")
+    f_garment = {name: load_obj(f"assets/meshes/{name}.obj")[1] for name in model_dicts}
     _, f_body = load_obj("assets/meshes/body.obj")
 
-    for i in range(len(v_garment)):
-        path = os.path.join(args.export_dir, f"{i:04d}_body.obj")
-        save_obj(path, v_body[i], f_body)
+    analyzers = {}
+    if args.collisions:
+        analyzers = {name: collisions.CollisionAnalyzer(f_body) for name in model_dicts}
+
+    # A single garment is saved as "garment" (see io.named_meshes)
+    single = len(model_dicts) == 1
+    if single:
+        f_garment = next(iter(f_garment.values()))
+
+    def outputs(blocks):
+        for frames, v_garments, v_body in blocks:
+            for name, analyzer in analyzers.items():
+                analyzer.update(v_garments[name], v_body)
+
+            yield frames, next(iter(v_garments.values())) if single else v_garments, v_body
+
+    # Save meshes while the model runs (quantized sequences need all the frames)
+    blocks = outputs(iterate_garments(model_dicts, motion, memory_budget, args.fps))
+    if args.writers > 0 and not (args.format == "mseq" and args.vertex_dtype == "quantized"):
+        export_blocks(
+            blocks,
+            args.export_dir, f_garment, f_body, args.format, args.vertex_dtype,
+            num_writers=args.writers, processes=args.writer_processes,
+            verbose=False
+        )
+
+    else:
+        v_garment, v_body = collect(blocks, num_output_frames(len(motion["pose"]), args.fps))
+        save_meshes(
+            args.export_dir, v_garment, f_garment, v_body, f_body,
+            args.format, args.vertex_dtype, verbose=False
+        )
+
+    num_frames = num_output_frames(len(motion["pose"]), args.fps)
+    print("[INFO] Saved %d frames to %s" % (num_frames, args.export_dir))
+
+    for name, analyzer in analyzers.items():
+        summary = analyzer.summary()
+        path = os.path.join(args.export_dir, collisions.report_file("garment" if single else name))
+        collisions.save_report(path, summary, analyzer.per_frame())
+
+        print("[INFO] Penetrating vertices%s: %.2f%% (%d frames), max depth %.1fmm" % (
+            "" if single else " (%s)" % name,
+            100 * summary["mean_penetrating_fraction"], summary["frames_with_penetration"],
+            1000 * summary["max_depth"]
+        ))
+        print("[INFO] Saved:", path)
 
-        path = os.path.join(args.export_dir, f"{i:04d}_garment.obj")
-        save_obj(path, v_garment[i], f_garment)
+    if args.startup_report:
+        print(startup.report())
 
+    if args.trace:
+        print(tracing.summary())
+        print("[INFO] Saved trace:", tracing.save(args.trace))
@@ -0,0 +1,132 @@
+import argparse
+import os
+
+from src import tracing
+from src.model import RUNTIMES, load_model, load_network, network_paths
+from src.precision import PRECISIONS
+from src.server import MAX_BATCH_SIZE, MAX_DELAY, InferenceServer, make_server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve the garment deformation model to streaming client sessions over HTTP"
+    )
+
+    parser.add_argument(
+        "model_path",
+        type=str,
+        help="path to the trained model"
+    )
+
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="address to listen on"
+    )
+
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8000,
+        help="TCP port to listen on"
+    )
+
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=None,
+        help="listen on this Unix socket instead of a TCP port"
+    )
+
+    parser.add_argument(
+        "--max_batch_size",
+        type=int,
+        default=MAX_BATCH_SIZE,
+        help="maximum number of requests (of different sessions) evaluated together"
+    )
+
+    parser.add_argument(
+        "--max_delay",
+        type=float,
+        default=1000 * MAX_DELAY,
+        help="maximum time (in ms) that a request waits for others to fill a batch"
+    )
+
+    parser.add_argument(
+        "--frames_per_request",
+        type=int,
+        default=1,
+        help="frames per request of the clients (the server is warmed up for batches of these requests)"
+    )
+
+    parser.add_argument(
+        "--runtime",
+        type=str,
+        default="keras",
+        choices=RUNTIMES,
+        help="run the networks with Keras or with TFLite (the regressor always runs with Keras)"
+    )
+
+    parser.add_argument(
+        "--tflite_threads",
+        type=int,
+        default=None,
+        help="threads of the TFLite interpreter"
+    )
+
+    parser.add_argument(
+        "--precision",
+        type=str,
+        default="float32",
+        choices=PRECISIONS,
+        help="precision of the decoder and diffused body networks (reduced precisions are approximate and, on CPU, not faster than float32: use them to evaluate their accuracy; int8 needs --runtime tflite)"
+    )
+
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="record the time and memory of each batch and save them to this file when the server stops"
+    )
+
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="log every request"
+    )
+
+    args = parser.parse_args()
+
+    if args.trace:
+        tracing.enable()
+
+    model_dict = load_model(
+        args.model_path, lazy=False, precision=args.precision,
+        runtime=args.runtime, num_threads=args.tflite_threads
+    )
+
+    # The stateful regressor needs the Keras model
+    gru = None
+    if args.runtime != "keras":
+        gru = load_network(network_paths(args.model_path)["garment/gru"])
+
+    inference = InferenceServer(model_dict, gru, args.max_batch_size, args.max_delay / 1000)
+    inference.warm_up(args.frames_per_request)
+
+    if args.socket and os.path.exists(args.socket):
+        os.remove(args.socket)
+
+    server = make_server(inference, args.host, args.port, args.socket, args.verbose)
+    print("[INFO] Listening on", args.socket or "http://%s:%d" % (args.host, args.port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("[INFO] Served %(requests)d requests (%(frames)d frames) in %(batches)d batches" % inference.status())
+
+        if args.trace:
+            print("[INFO] Saved trace:", tracing.save(args.trace))
@@ -0,0 +1,123 @@
+import numpy as np
+
+from . import io
+from . import model
+from . import tracing
+
+
+def make_batches(lengths, batch_size=8, bucket_width=32):
+    '''
+    Groups sequences of similar length into batches.
+
+    Sequences are first assigned to buckets of bucket_width frames, so the
+    padding of a sequence is always less than bucket_width frames, and each
+    bucket is then split into batches of at most batch_size sequences.
+
+    Args:
+        lengths: number of frames of each sequence
+
+    Returns:
+        batches: list with the indices of the sequences of each batch
+    '''
+    buckets = {}
+    for i in np.argsort(lengths, kind="stable"):
+        bucket = -(-lengths[i] // bucket_width)
+        buckets.setdefault(bucket, []).append(int(i))
+
+    batches = []
+    for bucket in sorted(buckets):
+        indices = buckets[bucket]
+        for start in range(0, len(indices), batch_size):
+            batches.append(indices[start:start + batch_size])
+
+    return batches
+
+
+def run_batch(model_dict, motions, memory_budget=model.DEFAULT_MEMORY_BUDGET):
+    '''
+    Runs the model for a batch of sequences at once.
+
+    The pose encoder, decoder, body model and diffused body networks process
+    the frames of all the sequences together. The recurrent regressor
+    processes the sequences as a padded batch: sequences are padded with
+    zeros at the end, which does not change the output of the regressor
+    for the valid frames because it only looks at previous frames.
+
+    Args:
+        model_dict: dictionary returned by load_model
+        motions: list of dictionaries returned by load_motion
+
+    Returns:
+        v_garment: list with an array num_frames x num_garment_vertices x 3
+            for each sequence
+        v_body: list with an array num_frames x num_body_vertices x 3
+            for each sequence
+    '''
+    lengths = [len(motion["pose"]) for motion in motions]
+    offsets = np.cumsum([0] + lengths)
+
+    pose = np.concatenate([motion["pose"] for motion in motions])
+    translation = np.concatenate([motion["translation"] for motion in motions])
+    shape = np.concatenate([
+        np.tile(motion["shape"], (length, 1))
+        for motion, length in zip(motions, lengths)
+    ])
+
+    # Run pose encoder for all the frames of the batch
+    pose_encoded = model_dict["body/pose_encoder"].predict(pose[:, 3:])
+
+    # Run recurrent regressor with padded sequences
+    inputs = {}
+    for i, motion in enumerate(motions):
+        frames = slice(offsets[i], offsets[i + 1])
+        features = model.compute_features(
+            model_dict, motion, pose_encoded=pose_encoded[frames]
+        )
+
+        for key, value in model.regressor_inputs(motion["shape"], features).items():
+            if key not in inputs:
+                padded_shape = (len(motions), max(lengths)) + value.shape[2:]
+                inputs[key] = np.zeros(padded_shape, dtype=value.dtype)
+
+            inputs[key][i, :lengths[i]] = value[0]
+
+    v_encoded = model_dict["garment/gru"].predict(inputs)
+    v_encoded = np.concatenate([v_encoded[i, :n] for i, n in enumerate(lengths)])
+
+    # Decode and deform the garment for all the frames of the batch
+    v_garment, v_body = model.run_body_and_garment(
+        model_dict, v_encoded, shape, pose, translation, memory_budget
+    )
+
+    return np.split(v_garment, offsets[1:-1]), np.split(v_body, offsets[1:-1])
+
+
+def run_model_batch(model_dict, motions, batch_size=8, bucket_width=32,
+                    memory_budget=model.DEFAULT_MEMORY_BUDGET, lengths=None):
+    '''
+    Runs the model for many sequences, grouped in batches of similar length.
+    The output for each sequence matches the output of run_model.
+
+    motions can also be paths of motion files, loaded one batch at a time 
+    with io.load_motion, so that only the sequences of a batch are in 
+    memory. In that case, lengths gives the number of frames of each 
+    sequence (see io.motion_length).
+
+    Yields:
+        index: index of the sequence in motions
+        v_garment: array of shape num_frames x num_garment_vertices x 3
+        v_body: array of shape num_frames x num_body_vertices x 3
+    '''
+    if lengths is None:
+        lengths = [len(motion["pose"]) for motion in motions]
+
+    load = lambda motion: io.load_motion(motion) if isinstance(motion, str) else motion
+
+    for batch in make_batches(lengths, batch_size, bucket_width):
+        num_frames = sum(lengths[i] for i in batch)
+        with tracing.span("batch", sequences=len(batch), frames=num_frames):
+            v_garment, v_body = run_batch(
+                model_dict, [load(motions[i]) for i in batch], memory_budget
+            )
+
+        yield from zip(batch, v_garment, v_body)
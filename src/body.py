@@ -0,0 +1,42 @@
+import os
+
+
+SMPL_MODEL_PATH = "assets/SMPL/basicModel_f_lbs_10_207_0_v1.0.0.pkl"
+
+# Implementations of the body model: smpl.SMPL (Keras layer) or 
+# smpl_numpy.SMPL (does not import TensorFlow)
+BACKENDS = ["tensorflow", "numpy"]
+
+
+def smpl_model_path():
+    '''
+    Path of the SMPL model: the archive created by convert_smpl.py if it
+    exists (faster to load and does not require chumpy), or the pickle.
+    '''
+    npz_path = os.path.splitext(SMPL_MODEL_PATH)[0] + ".npz"
+    if os.path.exists(npz_path):
+        return npz_path
+
+    return SMPL_MODEL_PATH
+
+
+def load_smpl(model_path=None, backend="tensorflow", **kwargs):
+    '''
+    Loads the body model with the given backend. TensorFlow is only 
+    imported by the "tensorflow" backend.
+
+    Example:
+        body = load_smpl(backend="numpy")
+        v_body, smpl_dict = body(motion["shape"], motion["pose"])
+    '''
+    model_path = model_path or smpl_model_path()
+
+    if backend == "tensorflow":
+        from . import smpl
+        return smpl.SMPL(model_path, **kwargs)
+
+    if backend == "numpy":
+        from . import smpl_numpy
+        return smpl_numpy.SMPL(model_path, **kwargs)
+
+    raise ValueError("Unknown backend: %s (must be one of %s)" % (backend, BACKENDS))
@@ -0,0 +1,43 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    '''
+    Dictionary with at most maxsize entries. When it is full, adding an
+    entry evicts the least recently used one.
+    '''
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key, default=None):
+        if key not in self.entries:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+    def clear(self):
+        self.entries.clear()
+
+
+    def __contains__(self, key):
+        return key in self.entries
+
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,533 @@
+import functools
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+from . import io
+from . import mesh_sequence
+from . import tracing
+
+
+# Triangles per leaf of the bounding volume hierarchy
+LEAF_SIZE = 2
+
+# Garment vertices queried at once (bounds the memory of the traversal)
+QUERY_CHUNK_SIZE = 4096
+
+# Bits per axis of the Morton codes that order the triangles of the tree
+MORTON_BITS = 10
+
+# Per-frame metrics computed by penetration_metrics
+METRICS = ["num_penetrating", "penetrating_fraction", "max_depth", "mean_depth"]
+
+# Name of the report saved in each export directory
+REPORT_FILE = "collisions.json"
+
+
+def morton_codes(points, bits=MORTON_BITS):
+    '''Morton (Z-order) codes of points quantized in their bounding box'''
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    scale = (2 ** bits - 1) / np.maximum(hi - lo, 1e-12)
+    cells = ((points - lo) * scale).astype(np.uint64)
+
+    codes = np.zeros(len(points), dtype=np.uint64)
+    for bit in range(bits):
+        for axis in range(3):
+            codes |= ((cells[:, axis] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(3 * bit + axis)
+
+    return codes
+
+
+def dot(x, y):
+    '''Row-wise dot products of arrays of shape N x 3'''
+    return np.einsum("ij,ij->i", x, y)
+
+
+def closest_points_on_triangles(p, a, b, c):
+    '''
+    Closest points of triangles (a, b, c) to points p (Ericson, Real-Time
+    Collision Detection, 5.1.5), for arrays of shape N x 3.
+
+    Returns:
+        barycentric: array of shape N x 3 with the weights of a, b and c
+    '''
+    ab, ac = b - a, c - a
+    ap, bp, cp = p - a, p - b, p - c
+
+    d1, d2 = dot(ab, ap), dot(ac, ap)
+    d3, d4 = dot(ab, bp), dot(ac, bp)
+    d5, d6 = dot(ab, cp), dot(ac, cp)
+
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    def ratio(x, y):
+        return x / np.where(y == 0, 1, y)
+
+    # Barycentric weights of b and c in each region (edges and interior)
+    v_ab = ratio(d1, d1 - d3)
+    w_ac = ratio(d2, d2 - d6)
+    w_bc = ratio(d4 - d3, (d4 - d3) + (d5 - d6))
+    total = va + vb + vc
+    v_in, w_in = ratio(vb, total), ratio(vc, total)
+
+    # Regions in order of precedence: vertices a, b, edge ab, vertex c,
+    # edges ac, bc and the interior
+    regions = [
+        (d1 <= 0) & (d2 <= 0),
+        (d3 >= 0) & (d4 <= d3),
+        (vc <= 0) & (d1 >= 0) & (d3 <= 0),
+        (d6 >= 0) & (d5 <= d6),
+        (vb <= 0) & (d2 >= 0) & (d6 <= 0),
+        (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0),
+    ]
+    v = np.select(regions, [0, 1, v_ab, 0, 0, 1 - w_bc], v_in)
+    w = np.select(regions, [0, 0, 0, 1, w_ac, w_bc], w_in)
+
+    return np.stack([1 - v - w, v, w], axis=-1)
+
+
+def vertex_normals(vertices, faces):
+    '''Area-weighted vertex normals of a triangle mesh'''
+    a, b, c = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+    face_normals = np.cross(b - a, c - a)
+
+    normals = np.stack([
+        np.bincount(faces.ravel(), np.repeat(face_normals[:, axis], 3), len(vertices))
+        for axis in range(3)
+    ], axis=-1)
+
+    return normals / np.maximum(np.linalg.norm(normals, axis=-1, keepdims=True), 1e-12)
+
+
+def segment_starts(keys):
+    '''Start of each run of equal values of a sorted array'''
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+class BodyBVH:
+    '''
+    Bounding volume hierarchy over the triangles of the body. The order of
+    the triangles (and so the topology of the tree) is computed once from
+    the Morton codes of their centroids, and refit updates the boxes for
+    the vertices of each frame in linear time: the body deforms smoothly,
+    so the tree stays efficient without being rebuilt.
+
+    The tree is a complete binary tree stored by levels (node i of a level
+    has children 2i and 2i + 1 in the next one), whose leaves hold
+    leaf_size consecutive triangles. The boxes of each level are stored by
+    axis (arrays of shape 3 x num_nodes), so that the bounds of many nodes
+    are computed with contiguous arrays. Each node also has a vertex of one
+    of its triangles, whose distance to a point bounds the distance of the
+    point to the body.
+
+    Example:
+        bvh = BodyBVH(f_body, v_body[0])
+        for frame in range(num_frames):
+            bvh.refit(v_body[frame])
+            triangles, barycentric, distances = bvh.closest_points(v_garment[frame])
+    '''
+    def __init__(self, faces, vertices, leaf_size=LEAF_SIZE):
+        self.faces = np.asarray(faces, dtype=np.int64)
+        self.leaf_size = leaf_size
+
+        num_leaves = -(-len(self.faces) // leaf_size)
+        self.depth = max(0, int(np.ceil(np.log2(num_leaves))))
+        num_slots = 2 ** self.depth * leaf_size
+
+        # Triangle of each slot of the leaves (-1 for padding)
+        vertices = np.asarray(vertices, dtype=np.float64)
+        centroids = vertices[self.faces].mean(axis=1)
+        self.order = np.full(num_slots, -1, dtype=np.int64)
+        self.order[:len(self.faces)] = np.argsort(morton_codes(centroids), kind="stable")
+
+        # Vertex of the middle triangle of each node (or of the first one,
+        # if the middle slot is padding), -1 for empty nodes
+        self.representatives = []
+        for level in range(self.depth + 1):
+            slots_per_node = num_slots // 2 ** level
+            slots = np.arange(2 ** level) * slots_per_node
+            middle = self.order[slots + slots_per_node // 2]
+            triangles = np.where(middle >= 0, middle, self.order[slots])
+            self.representatives.append(np.where(triangles >= 0, self.faces[triangles, 0], -1))
+
+        self.refit(vertices)
+
+
+    def refit(self, vertices):
+        '''Updates the boxes of the tree for new vertex positions'''
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        self.normals = None
+
+        triangles = self.vertices[self.faces[self.order]]
+        valid = (self.order >= 0)[:, None]
+        lo = np.where(valid, triangles.min(axis=1), np.inf)
+        hi = np.where(valid, triangles.max(axis=1), -np.inf)
+
+        # Boxes (lo, hi) of each level, from the leaves to the root
+        self.boxes = [None] * (self.depth + 1)
+        lo, hi = lo.reshape(-1, self.leaf_size, 3).min(axis=1), hi.reshape(-1, self.leaf_size, 3).max(axis=1)
+        self.boxes[self.depth] = (np.ascontiguousarray(lo.T), np.ascontiguousarray(hi.T))
+
+        for level in range(self.depth - 1, -1, -1):
+            lo, hi = lo.reshape(-1, 2, 3).min(axis=1), hi.reshape(-1, 2, 3).max(axis=1)
+            self.boxes[level] = (np.ascontiguousarray(lo.T), np.ascontiguousarray(hi.T))
+
+
+    def box_distances(self, level, nodes, coordinates):
+        '''
+        Squared distances from points (coordinates by axis) to the boxes of
+        nodes of a level (0 inside the box, infinite for empty nodes)
+        '''
+        lo, hi = self.boxes[level]
+        distances = 0
+
+        for axis in range(3):
+            d = np.maximum(lo[axis][nodes] - coordinates[axis], coordinates[axis] - hi[axis][nodes])
+            np.maximum(d, 0, out=d)
+            distances = distances + d * d
+
+        return distances
+
+
+    def vertex_normals(self):
+        if self.normals is None:
+            self.normals = vertex_normals(self.vertices, self.faces)
+
+        return self.normals
+
+
+    def triangle_distances(self, points, triangles):
+        '''Squared distances and barycentric coordinates of the closest points'''
+        corners = self.vertices[self.faces[triangles]]
+        barycentric = closest_points_on_triangles(points, corners[:, 0], corners[:, 1], corners[:, 2])
+        difference = points - np.einsum("ij,ijk->ik", barycentric, corners)
+
+        return dot(difference, difference), barycentric
+
+
+    def closest_points(self, points, hint=None):
+        '''
+        Finds the closest point of the body to each point.
+
+        Args:
+            points: array of shape num_points x 3
+            hint: optional array with a triangle of each point (e.g., its
+                closest triangle in the previous frame), whose distance
+                bounds the search from the start
+
+        Returns:
+            triangles: closest triangle of each point
+            barycentric: array of shape num_points x 3 with the barycentric
+                coordinates of the closest points
+            distances: distance of each point to the body
+        '''
+        points = np.asarray(points, dtype=np.float64)
+        triangles = np.empty(len(points), dtype=np.int64)
+        barycentric = np.empty((len(points), 3))
+        distances = np.empty(len(points))
+
+        for start in range(0, len(points), QUERY_CHUNK_SIZE):
+            chunk = slice(start, start + QUERY_CHUNK_SIZE)
+            chunk_hint = None if hint is None else hint[chunk]
+            triangles[chunk], barycentric[chunk], distances[chunk] = self.query(points[chunk], chunk_hint)
+
+        return triangles, barycentric, distances
+
+
+    def leaf_distances(self, points, queries, leaves):
+        '''
+        Exact distances from points to the triangles of leaves, for pairs of
+        points and leaves sorted by point.
+
+        Returns:
+            triangles, barycentric, squared distances of the closest
+            triangle of each point
+        '''
+        slots = (leaves[:, None] * self.leaf_size + np.arange(self.leaf_size)).ravel()
+        queries = np.repeat(queries, self.leaf_size)
+        candidates = self.order[slots]
+
+        valid = candidates >= 0
+        queries, candidates = queries[valid], candidates[valid]
+
+        distances, barycentric = self.triangle_distances(points[queries], candidates)
+
+        # First candidate with the minimum distance of each point
+        starts = segment_starts(queries)
+        minimum = np.repeat(np.minimum.reduceat(distances, starts), np.diff(np.r_[starts, len(queries)]))
+        best = np.flatnonzero(distances == minimum)
+        best = best[segment_starts(queries[best])]
+
+        return candidates[best], barycentric[best], distances[best]
+
+
+    def representative_distances(self, level, nodes, coordinates):
+        '''Squared distances from points to the representative vertices of nodes'''
+        vertices = self.representatives[level][nodes]
+        distances = 0
+
+        for axis in range(3):
+            d = self.vertices[vertices, axis] - coordinates[axis]
+            distances = distances + d * d
+
+        return np.where(vertices >= 0, distances, np.inf)
+
+
+    def query(self, points, hint=None):
+        '''
+        Traverses the tree level by level for all the points at once. Each
+        point keeps the nodes whose box is closer than an upper bound of its
+        distance to the body: the distance to the hint triangle or to the
+        closest representative vertex of the nodes visited so far.
+        '''
+        num_points = len(points)
+        coordinates = np.ascontiguousarray(points.T)
+
+        upper = self.representative_distances(0, np.zeros(num_points, dtype=np.int64), coordinates)
+        if hint is not None:
+            upper = np.minimum(upper, self.triangle_distances(points, hint)[0])
+
+        # Pairs of points and nodes, sorted by point
+        queries = np.arange(num_points)
+        nodes = np.zeros(num_points, dtype=np.int64)
+
+        for level in range(1, self.depth + 1):
+            queries = np.repeat(queries, 2)
+            nodes = (2 * nodes[:, None] + np.arange(2)).ravel()
+            pair_coordinates = coordinates[:, queries]
+
+            # Both children of a node are consecutive pairs of a point
+            bound = self.representative_distances(level, nodes, pair_coordinates)
+            bound = np.minimum(bound[0::2], bound[1::2])
+            starts = segment_starts(queries[0::2])
+            upper[queries[0::2][starts]] = np.minimum(
+                upper[queries[0::2][starts]], np.minimum.reduceat(bound, starts)
+            )
+
+            keep = self.box_distances(level, nodes, pair_coordinates) <= upper[queries]
+            queries, nodes = queries[keep], nodes[keep]
+
+        triangles, barycentric, distances = self.leaf_distances(points, queries, nodes)
+
+        return triangles, barycentric, np.sqrt(distances)
+
+
+    def signed_distances(self, points, hint=None):
+        '''
+        Signed distances of the points to the body (negative inside), with
+        the sign given by the vertex normals of the body interpolated at the
+        closest points.
+
+        Returns:
+            distances: array of shape num_points
+            triangles: closest triangle of each point (a hint for the next frame)
+        '''
+        points = np.asarray(points, dtype=np.float64)
+        triangles, barycentric, distances = self.closest_points(points, hint)
+
+        corners = self.faces[triangles]
+        closest = np.einsum("ij,ijk->ik", barycentric, self.vertices[corners])
+        normals = np.einsum("ij,ijk->ik", barycentric, self.vertex_normals()[corners])
+
+        side = dot(points - closest, normals)
+
+        return np.where(side < 0, -distances, distances), triangles
+
+
+def penetration_metrics(distances, tolerance=0.0):
+    '''
+    Penetration metrics of the signed distances of the garment vertices of
+    one frame. Vertices closer than -tolerance (in meters) are penetrating.
+
+    Returns:
+        metrics: dictionary with the number and fraction of penetrating
+            vertices, and their maximum and mean depth (in meters)
+    '''
+    depth = -distances[distances < -tolerance]
+
+    return {
+        "num_penetrating": int(len(depth)),
+        "penetrating_fraction": len(depth) / max(1, len(distances)),
+        "max_depth": float(depth.max()) if len(depth) else 0.0,
+        "mean_depth": float(depth.mean()) if len(depth) else 0.0,
+    }
+
+
+class CollisionAnalyzer:
+    '''
+    Computes the penetration of the garment in the body frame by frame. The
+    tree of the body is built for the first frame and refit for the next
+    ones, and the closest triangles of each frame bound the search in the
+    next one.
+
+    Blocks of frames (e.g., yielded by model.iterate_model) can be analyzed
+    while they are computed with observe:
+
+        analyzer = CollisionAnalyzer(f_body)
+        blocks = analyzer.observe(model.iterate_model(model_dict, motion))
+        export.export_blocks(blocks, ...)
+        print(analyzer.summary())
+    '''
+    def __init__(self, f_body, tolerance=0.0, leaf_size=LEAF_SIZE, keep_distances=False):
+        self.f_body = f_body
+        self.tolerance = tolerance
+        self.leaf_size = leaf_size
+        self.keep_distances = keep_distances
+        self.reset()
+
+
+    def reset(self):
+        self.bvh = None
+        self.hint = None
+        self.metrics = {key: [] for key in METRICS}
+        self.distances = []
+
+
+    def update(self, v_garment, v_body):
+        '''
+        Analyzes the next frames.
+
+        Args:
+            v_garment: array of shape num_frames x num_garment_vertices x 3
+            v_body: array of shape num_frames x num_body_vertices x 3
+        '''
+        with tracing.span("collisions", frames=len(v_garment)):
+            for garment, body in zip(v_garment, v_body):
+                if self.bvh is None:
+                    self.bvh = BodyBVH(self.f_body, body, self.leaf_size)
+                else:
+                    self.bvh.refit(body)
+
+                distances, self.hint = self.bvh.signed_distances(garment, self.hint)
+
+                for key, value in penetration_metrics(distances, self.tolerance).items():
+                    self.metrics[key].append(value)
+
+                if self.keep_distances:
+                    self.distances.append(distances.astype(np.float32))
+
+
+    def observe(self, blocks):
+        '''Analyzes the blocks of frames of an iterator and yields them unchanged'''
+        for frames, v_garment, v_body in blocks:
+            self.update(v_garment, v_body)
+            yield frames, v_garment, v_body
+
+
+    def per_frame(self):
+        '''Dictionary with an array of each metric per frame'''
+        return {key: np.array(values) for key, values in self.metrics.items()}
+
+
+    def summary(self):
+        '''Metrics of the whole sequence'''
+        metrics = self.per_frame()
+        num_frames = len(metrics["num_penetrating"])
+
+        return {
+            "frames": num_frames,
+            "frames_with_penetration": int((metrics["num_penetrating"] > 0).sum()),
+            "mean_penetrating_fraction": float(metrics["penetrating_fraction"].mean()) if num_frames else 0.0,
+            "max_depth": float(metrics["max_depth"].max()) if num_frames else 0.0,
+            "mean_depth": float(metrics["mean_depth"][metrics["num_penetrating"] > 0].mean())
+                if (metrics["num_penetrating"] > 0).any() else 0.0,
+        }
+
+
+def analyze_sequence(v_garment, v_body, f_body, tolerance=0.0):
+    '''
+    Penetration metrics of each frame of a sequence (see CollisionAnalyzer).
+
+    Returns:
+        summary: dictionary with the metrics of the whole sequence
+        per_frame: dictionary with an array of each metric per frame
+    '''
+    analyzer = CollisionAnalyzer(f_body, tolerance)
+    analyzer.update(v_garment, v_body)
+
+    return analyzer.summary(), analyzer.per_frame()
+
+
+def save_report(path, summary, per_frame):
+    '''Saves the summary and per-frame metrics of a sequence as JSON'''
+    with open(path, "w") as fp:
+        json.dump({
+            "summary": summary,
+            "per_frame": {key: values.tolist() for key, values in per_frame.items()}
+        }, fp, indent=2)
+
+
+def find_sequences(path):
+    '''Directories under path (included) with the meshes saved by io.save_meshes'''
+    directories = []
+
+    for root, _, files in os.walk(path):
+        if "body" + mesh_sequence.EXTENSION in files or any(name.endswith("_body.obj") for name in files):
+            directories.append(root)
+
+    return sorted(directories)
+
+
+def report_file(garment):
+    '''Report of a garment: REPORT_FILE for a single garment (saved as "garment"), or prefixed by its name'''
+    return REPORT_FILE if garment == "garment" else "%s_%s" % (garment, REPORT_FILE)
+
+
+def analyze_directory(export_dir, tolerance=0.0, save=True):
+    '''
+    Penetration metrics of each garment of the sequence saved in export_dir
+    (OBJ files or mesh sequences), saved to export_dir/collisions.json (or
+    <garment>_collisions.json with several garments) if save is True.
+
+    Returns:
+        result: dictionary with the path and the summary and the per-frame
+            metrics (as lists) of each garment, by name
+    '''
+    v_garments, _, v_body, f_body = io.load_meshes(export_dir)
+
+    garments = {}
+    for name, v_garment in v_garments.items():
+        summary, per_frame = analyze_sequence(v_garment, v_body, f_body, tolerance)
+
+        if save:
+            save_report(os.path.join(export_dir, report_file(name)), summary, per_frame)
+
+        garments[name] = {
+            "summary": summary,
+            "per_frame": {key: values.tolist() for key, values in per_frame.items()}
+        }
+
+    return {"path": export_dir, "garments": garments}
+
+
+def try_analyze_directory(export_dir, tolerance=0.0, save=True):
+    '''Same as analyze_directory, returning the path and the error if it fails'''
+    try:
+        return analyze_directory(export_dir, tolerance, save)
+    except Exception as e:
+        return {"path": export_dir, "error": repr(e)}
+
+
+def analyze_directories(directories, tolerance=0.0, num_workers=None, save=True):
+    '''
+    Analyzes many sequences in parallel, one per worker process. A sequence
+    that cannot be analyzed (e.g., missing or truncated meshes) does not 
+    stop the others.
+
+    Yields:
+        result: dictionary returned by analyze_directory, in order of
+            completion, or with the path and the "error" of the sequences
+            that failed
+    '''
+    task = functools.partial(try_analyze_directory, tolerance=tolerance, save=save)
+
+    if num_workers == 1 or len(directories) <= 1:
+        yield from map(task, directories)
+        return
+
+    with multiprocessing.Pool(min(num_workers or os.cpu_count() or 1, len(directories))) as pool:
+        yield from pool.imap_unordered(task, directories)
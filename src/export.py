@@ -0,0 +1,149 @@
+import concurrent.futures
+import os
+import threading
+
+from . import io
+from . import mesh_sequence
+
+
+class AsyncExporter:
+    '''
+    Runs export tasks (e.g., writing meshes to disk) in a pool of writer
+    threads or processes while the caller keeps computing.
+
+    At most max_pending tasks are queued or running at any time: submit
+    blocks when the queue is full, so memory does not grow if the writers
+    are slower than the producer. The first error raised by a task is
+    raised again by the next call to submit or by close.
+
+    Example:
+        with AsyncExporter(num_writers=2) as exporter:
+            for i, vertices in enumerate(frames):
+                exporter.submit(io.save_obj, f"{i:04d}.obj", vertices, faces)
+    '''
+    def __init__(self, num_writers=2, max_pending=None, processes=False):
+        executor_class = concurrent.futures.ThreadPoolExecutor
+        if processes:
+            executor_class = concurrent.futures.ProcessPoolExecutor
+
+        self.executor = executor_class(max_workers=num_writers)
+        self.slots = threading.BoundedSemaphore(max_pending or 4 * num_writers)
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.error = None
+
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+
+    def done(self, future):
+        with self.lock:
+            self.pending.discard(future)
+
+            if not future.cancelled() and future.exception() is not None:
+                self.error = self.error or future.exception()
+
+        self.slots.release()
+
+
+    def submit(self, function, *args, **kwargs):
+        self.check()
+        self.slots.acquire()
+
+        try:
+            future = self.executor.submit(function, *args, **kwargs)
+        except BaseException:
+            self.slots.release()
+            raise
+
+        with self.lock:
+            self.pending.add(future)
+
+        future.add_done_callback(self.done)
+
+
+    def close(self, cancel=False):
+        '''
+        Waits until all the tasks are finished (or cancels the pending ones)
+        and raises the first error, if any.
+        '''
+        if cancel:
+            with self.lock:
+                pending = list(self.pending)
+
+            for future in pending:
+                future.cancel()
+
+        self.executor.shutdown(wait=True)
+        self.check()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(cancel=exc_type is not None)
+
+
+def export_blocks(blocks, export_dir, f_garment, f_body, export_format="obj",
+                  vertex_dtype="float32", num_writers=2, processes=False,
+                  verbose=True):
+    '''
+    Saves the blocks of frames yielded by model.iterate_model (or by
+    model.iterate_garments, with f_garment given as a dictionary by garment
+    name) while they are computed (same output as io.save_meshes).
+
+    OBJ files are written by num_writers threads (or processes). Mesh
+    sequence files are written in order by a single thread, and quantized
+    sequences are not supported because their bounds must be known before
+    the first frame is written.
+
+    Returns:
+        num_frames: number of exported frames
+    '''
+    num_frames = 0
+
+    if export_format == "mseq":
+        if vertex_dtype == "quantized":
+            raise ValueError("Quantized mesh sequences can not be exported asynchronously")
+
+        writers = {}
+
+        try:
+            with AsyncExporter(num_writers=1) as exporter:
+                for frames, v_garment, v_body in blocks:
+                    for name, vertices, faces in io.named_meshes(v_garment, f_garment, v_body, f_body):
+                        if name not in writers:
+                            path = os.path.join(export_dir, name + mesh_sequence.EXTENSION)
+                            writers[name] = mesh_sequence.MeshSequenceWriter(
+                                path, faces, vertices.shape[1], vertex_dtype
+                            )
+
+                        exporter.submit(writers[name].write, vertices)
+
+                    num_frames = frames.stop
+
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        if verbose:
+            for writer in writers.values():
+                print("Saved:", writer.path)
+
+        return num_frames
+
+    with AsyncExporter(num_writers, processes=processes) as exporter:
+        for frames, v_garment, v_body in blocks:
+            meshes = io.named_meshes(v_garment, f_garment, v_body, f_body)
+            for i, frame in enumerate(range(frames.start, frames.stop)):
+                for name, vertices, faces in meshes:
+                    path = os.path.join(export_dir, f"{frame:04d}_{name}.obj")
+                    exporter.submit(io.save_obj, path, vertices[i], faces, verbose=verbose)
+
+            num_frames = frames.stop
+
+    return num_frames
@@ -0,0 +1,214 @@
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from . import io
+
+
+# Name of the file (in the export directory) recording finished and failed
+# sequences
+PROGRESS_FILE = "progress.jsonl"
+
+# State of each worker process, initialized once by init_worker
+worker = {}
+
+
+def num_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+
+def split_cores(num_workers=None, threads_per_worker=None):
+    '''
+    Splits the available cores between worker processes and TensorFlow
+    intra-op threads. By default each worker gets 4 threads: the networks
+    are small, so several workers make better use of the cores than a
+    single process with many threads.
+
+    Returns:
+        num_workers, threads_per_worker
+    '''
+    cores = num_cores()
+
+    if num_workers is None:
+        num_workers = max(1, cores // (threads_per_worker or 4))
+
+    if threads_per_worker is None:
+        threads_per_worker = max(1, cores // num_workers)
+
+    return num_workers, threads_per_worker
+
+
+def load_progress(export_dir):
+    '''
+    Returns the names of the sequences already finished in export_dir
+    (failed sequences are run again)
+    '''
+    path = os.path.join(export_dir, PROGRESS_FILE)
+    if not os.path.exists(path):
+        return set()
+
+    finished = set()
+    with open(path, "r") as fp:
+        for line in fp:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Line truncated by an interrupted run
+
+            if "sequence" in record and "error" not in record:
+                finished.add(record["sequence"])
+
+    return finished
+
+
+def record_progress(export_dir, record):
+    with open(os.path.join(export_dir, PROGRESS_FILE), "a") as fp:
+        fp.write(json.dumps(record) + "\n")
+        fp.flush()
+        os.fsync(fp.fileno())
+
+
+def init_worker(model_path, threads_per_worker, memory_budget, export_format,
+                vertex_dtype, top_k=None, precision="float32", runtime="keras"):
+    '''Loads the model once per worker process'''
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads_per_worker)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    from . import model
+
+    garment_name = os.path.basename(os.path.normpath(model_path))
+
+    worker["model_dict"] = model.load_model(
+        model_path, top_k=top_k, precision=precision, runtime=runtime,
+        num_threads=threads_per_worker
+    )
+    worker["memory_budget"] = memory_budget
+    worker["export_format"] = export_format
+    worker["vertex_dtype"] = vertex_dtype
+    worker["f_garment"] = io.load_obj(f"assets/meshes/{garment_name}.obj")[1]
+    worker["f_body"] = io.load_obj("assets/meshes/body.obj")[1]
+
+
+def process_sequence(task):
+    '''Runs the model for a sequence and saves the meshes'''
+    from . import model
+
+    motion_path, export_dir = task
+    start = time.time()
+
+    try:
+        v_garment, v_body = model.run_model(
+            worker["model_dict"], io.load_motion(motion_path), worker["memory_budget"]
+        )
+
+        io.save_meshes(
+            export_dir, v_garment, worker["f_garment"], v_body, worker["f_body"],
+            worker["export_format"], worker["vertex_dtype"], verbose=False
+        )
+
+    except Exception as e:
+        return {"path": motion_path, "error": repr(e)}
+
+    return {
+        "path": motion_path,
+        "frames": len(v_garment),
+        "seconds": time.time() - start,
+        "pid": os.getpid()
+    }
+
+
+def run_farm(paths, model_path, export_dir, num_workers=None,
+             threads_per_worker=None, memory_budget=None,
+             export_format="obj", vertex_dtype="float32", top_k=None,
+             precision="float32", runtime="keras", root=None):
+    '''
+    Runs the model for many sequences with a pool of worker processes. Each
+    worker loads the model once and takes sequences from a shared queue.
+
+    Sequences are saved in subdirectories of export_dir named by
+    io.motion_name (with root, the path given to io.find_motions, their
+    path relative to it). Finished and failed sequences are recorded in
+    export_dir/progress.jsonl, so an interrupted run resumes from the
+    sequences that were not finished.
+
+    If a worker dies (e.g., killed by the OOM killer) or fails to load the
+    model, the pool cannot be used anymore: the sequences that were not 
+    finished are recorded as failed and the farm stops.
+
+    Returns:
+        failed: list with the paths of the sequences that failed
+    '''
+    os.makedirs(export_dir, exist_ok=True)
+
+    names = {path: io.motion_name(path, root) for path in paths}
+    finished = load_progress(export_dir)
+    tasks = [
+        (path, os.path.join(export_dir, names[path]))
+        for path in paths if names[path] not in finished
+    ]
+
+    print("[INFO] %d sequences (%d already finished)" % (
+        len(paths), len(paths) - len(tasks)
+    ))
+
+    if not tasks:
+        return []
+
+    num_workers, threads_per_worker = split_cores(num_workers, threads_per_worker)
+    num_workers = min(num_workers, len(tasks))
+    print("[INFO] Start %d workers with %d threads each" % (
+        num_workers, threads_per_worker
+    ))
+
+    # Spawn fresh processes instead of forking the TensorFlow runtime
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(
+            model_path, threads_per_worker, memory_budget,
+            export_format, vertex_dtype, top_k, precision, runtime
+        )
+    )
+
+    failed = []
+
+    def fail(path, error):
+        print("[ERROR] %s: %s" % (names[path], error))
+        record_progress(export_dir, dict(sequence=names[path], path=path, error=error))
+        failed.append(path)
+
+    try:
+        futures = {executor.submit(process_sequence, task): task[0] for task in tasks}
+
+        for i, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            path = futures[future]
+
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                result = {"path": path, "error": "worker process died: %r" % e}
+
+            if "error" in result:
+                fail(path, result["error"])
+                continue
+
+            record_progress(export_dir, dict(sequence=names[path], **result))
+            print("[INFO] (%d/%d) Finished %s: %d frames in %.1fs" % (
+                i, len(tasks), names[path], result["frames"], result["seconds"]
+            ))
+
+        executor.shutdown()
+
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+    return failed
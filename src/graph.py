@@ -0,0 +1,195 @@
+import tensorflow as tf
+import tensorflow.keras as keras
+
+from . import math
+from . import model
+
+
+def finite_diff(x, h):
+    '''TensorFlow version of math.finite_diff'''
+    return tf.concat([tf.zeros_like(x[:1]), (x[1:] - x[:-1]) / h], axis=0)
+
+
+class GarmentModel(keras.Model):
+    '''
+    End-to-end version of model.run_model as a single Keras model.
+
+    The input features are computed in the graph and the networks are
+    chained without leaving TensorFlow, so the whole pipeline can be traced
+    into a single graph (optionally compiled with XLA) and exported as a
+    single SavedModel.
+
+    As in model.iterate_body_and_garment, the decoder, the body model and
+    the diffused body networks run in blocks of frames whose tensors fit in
+    memory_budget (in bytes, None evaluates all the frames at once), so the
+    memory does not grow with the length of the sequence.
+    '''
+    def __init__(self, model_dict, memory_budget=model.DEFAULT_MEMORY_BUDGET,
+                 name="garment_model", **kwargs):
+        super(GarmentModel, self).__init__(name=name, **kwargs)
+
+        self.smpl = model_dict["smpl"]
+        self.pose_encoder = model_dict["body/pose_encoder"]
+        self.skinning_weights = model_dict["body/skinning_weights"]
+        self.pose_blendshape = model_dict["body/pose_blendshape"]
+        self.shape_blendshape = model_dict["body/shape_blendshape"]
+        self.gru = model_dict["garment/gru"]
+        self.decoder = model_dict["garment/decoder"]
+        self.lbs = model_dict["skinning"]
+
+        self.num_vertices = model.num_garment_vertices(model_dict)
+        frame_bytes = (
+            self.num_vertices * model.GARMENT_ROW_BYTES + 
+            self.smpl.num_vertices * model.BODY_ROW_BYTES
+        )
+        self.block_size = model.frame_block_size(frame_bytes, memory_budget)
+
+
+    def call(self, inputs):
+        """
+        Args:
+            inputs: dictionary with the tensors
+                "pose": num_frames x 72
+                "translation": num_frames x 3
+                "shape": 10
+
+        Returns:
+            outputs: dictionary with the tensors
+                "garment": num_frames x num_garment_vertices x 3
+                "body": num_frames x num_body_vertices x 3
+        """
+        pose = inputs["pose"]
+        translation = inputs["translation"]
+        num_frames = tf.shape(pose)[0]
+        shape = tf.tile(inputs["shape"][tf.newaxis], [num_frames, 1])
+
+        # Compute input features
+        h = 1.0 / model.FPS
+        features = {"pose_encoded": self.pose_encoder(pose[:, 3:], training=False)}
+
+        features["translation_vel"] = finite_diff(translation, h)
+        features["translation_acc"] = finite_diff(features["translation_vel"], h)
+
+        root_rotation = math.AxisAngleToMatrix()(pose[:, :3])
+        euler_angles = math.MatrixToEuler()(root_rotation)
+        features["euler_angles_vel"] = finite_diff(euler_angles, h)
+        features["euler_angles_acc"] = finite_diff(features["euler_angles_vel"], h)
+
+        features["pose_encoded_vel"] = finite_diff(features["pose_encoded"], h)
+        features["pose_encoded_acc"] = finite_diff(features["pose_encoded_vel"], h)
+
+        # Run recurrent regressor
+        gru_inputs = {"shape": shape[tf.newaxis]}
+        for key in model.REGRESSOR_FEATURES:
+            gru_inputs[key] = features[key][tf.newaxis]
+
+        v_encoded = self.gru(gru_inputs, training=False)[0]
+
+        if self.block_size is None:
+            v_garment, v_body = self.deform(v_encoded, shape, pose)
+
+        else:
+            # Pad the frames to a multiple of the block size, so that all the
+            # blocks have the same static shape (as required by XLA), and
+            # evaluate one block at a time
+            num_blocks = (num_frames + self.block_size - 1) // self.block_size
+            padding = num_blocks * self.block_size - num_frames
+
+            def blocks(x):
+                x = tf.pad(x, [[0, padding], [0, 0]])
+                return tf.reshape(x, tf.concat([[num_blocks, self.block_size], tf.shape(x)[1:]], 0))
+
+            v_garment, v_body = tf.map_fn(
+                lambda block: self.deform(*block),
+                (blocks(v_encoded), blocks(shape), blocks(pose)),
+                fn_output_signature=(tf.float32, tf.float32),
+                parallel_iterations=1
+            )
+
+            v_garment = tf.reshape(v_garment, (-1, self.num_vertices, 3))[:num_frames]
+            v_body = tf.reshape(v_body, (-1, self.smpl.num_vertices, 3))[:num_frames]
+
+        # Add translation
+        return {
+            "garment": v_garment + translation[:, tf.newaxis, :],
+            "body": v_body + translation[:, tf.newaxis, :]
+        }
+
+
+    def deform(self, v_encoded, shape, pose):
+        '''Decodes and deforms the garment, and runs the body model, for a block of frames'''
+        num_frames = tf.shape(v_encoded)[0]
+
+        # Project from latent space to canonical space
+        v_canonical = self.decoder(v_encoded, training=False)
+        v_canonical_flat = tf.reshape(v_canonical, (-1, 3))
+
+        # Project from canonical space to unpose
+        v_body, smpl_dict = self.smpl(shape, pose)
+
+        pose_repeat = tf.repeat(smpl_dict["pose_feature"], self.num_vertices, axis=0)
+        pose_blendshape = self.pose_blendshape([v_canonical_flat, pose_repeat], training=False)
+
+        shape_repeat = tf.repeat(shape, self.num_vertices, axis=0)
+        shape_blendshape = self.shape_blendshape([v_canonical_flat, shape_repeat], training=False)
+
+        skinning_weights = self.skinning_weights(v_canonical_flat, training=False)
+        skinning_weights = tf.reshape(
+            skinning_weights, (num_frames, self.num_vertices, self.smpl.num_joints)
+        )
+
+        v_unpose = v_canonical_flat + pose_blendshape + shape_blendshape
+        v_unpose = tf.reshape(v_unpose, (num_frames, self.num_vertices, 3))
+
+        # Compute linear blend skinning
+        v_garment = self.lbs(v_unpose, smpl_dict["joint_transforms"], skinning_weights)
+
+        return v_garment, v_body
+
+
+def serving_function(garment_model, xla=False):
+    '''
+    Traces the model into a tf.function with a fixed input signature.
+    Set xla to True to compile the graph with XLA.
+    '''
+    @tf.function(
+        input_signature=[
+            tf.TensorSpec([None, 72], tf.float32, name="pose"),
+            tf.TensorSpec([None, 3], tf.float32, name="translation"),
+            tf.TensorSpec([10], tf.float32, name="shape"),
+        ],
+        jit_compile=xla
+    )
+    def serve(pose, translation, shape):
+        return garment_model({
+            "pose": pose,
+            "translation": translation,
+            "shape": shape
+        })
+
+    return serve
+
+
+def export_saved_model(model_dict, export_path, xla=False,
+                       memory_budget=model.DEFAULT_MEMORY_BUDGET):
+    '''
+    Exports the whole pipeline as a single SavedModel, evaluated in blocks
+    of frames that fit in memory_budget (see GarmentModel)
+    '''
+    garment_model = GarmentModel(model_dict, memory_budget)
+    serve = serving_function(garment_model, xla)
+
+    tf.saved_model.save(
+        garment_model,
+        export_path,
+        signatures={"serving_default": serve.get_concrete_function()}
+    )
+
+
+def load_saved_model(path):
+    '''
+    Loads a model exported with export_saved_model. The returned function
+    takes pose, translation and shape tensors as keyword arguments and
+    returns a dictionary with the "garment" and "body" vertices.
+    '''
+    return tf.saved_model.load(path).signatures["serving_default"]
@@ -0,0 +1,77 @@
+import numpy as np
+
+from . import rotations
+
+
+def frame_times(num_frames, fps, output_fps):
+    '''
+    Times of the frames of a sequence resampled from fps to output_fps,
+    measured in frames of the input sequence (e.g., 0, 0.25, 0.5, ... from
+    30 to 120fps). The first and last output frames are at most at the
+    first and last input frames, so the output is never extrapolated.
+    '''
+    step = fps / output_fps
+    num_output_frames = int(np.floor((num_frames - 1) / step + 1e-6)) + 1
+
+    return np.arange(num_output_frames) * step
+
+
+def weights(times, num_frames):
+    '''Previous input frame and weight of the next one for each time'''
+    previous = np.clip(np.floor(times).astype(np.int64), 0, max(num_frames - 2, 0))
+    weight = np.clip(times - previous, 0, 1)
+
+    if num_frames == 1:
+        weight = np.zeros_like(weight)
+
+    return previous, np.minimum(previous + 1, num_frames - 1), weight
+
+
+def interpolate(x, times):
+    '''
+    Linear interpolation of the frames of x (array of shape num_frames x
+    ...) at the given times (see frame_times).
+    '''
+    x = np.asarray(x)
+    previous, following, weight = weights(times, len(x))
+    weight = weight.reshape((-1,) + (1,) * (x.ndim - 1)).astype(x.dtype)
+
+    return (1 - weight) * x[previous] + weight * x[following]
+
+
+def interpolate_pose(pose, times):
+    '''
+    Interpolates the joint rotations of SMPL poses (array of shape
+    num_frames x 72, in axis-angle representation) at the given times,
+    with spherical linear interpolation of each joint.
+    '''
+    pose = np.asarray(pose)
+    previous, following, weight = weights(times, len(pose))
+
+    quaternions = rotations.axis_angle_to_quaternion(
+        pose.reshape(len(pose), -1, 3).astype(np.float64)
+    )
+    quaternions = rotations.slerp(
+        quaternions[previous], quaternions[following], weight[:, np.newaxis]
+    )
+
+    axis_angle = rotations.quaternion_to_axis_angle(quaternions)
+
+    return axis_angle.reshape(len(times), -1).astype(pose.dtype)
+
+
+def interpolate_motion(motion, times):
+    '''
+    Interpolates the pose (see interpolate_pose) and translation of a motion
+    dictionary at the given times. The shape is kept, or interpolated if
+    it is given per frame.
+    '''
+    shape = np.asarray(motion["shape"])
+    if shape.ndim == 2:
+        shape = interpolate(shape, times)
+
+    return {
+        "pose": interpolate_pose(motion["pose"], times),
+        "shape": shape,
+        "translation": interpolate(motion["translation"], times),
+    }
@@ -1,12 +1,46 @@
+import glob
 import os
 import pickle
 
 import numpy as np
-import tensorflow as tf
-from scipy.spatial.transform import Rotation as R
 
+from . import mesh_sequence
+from . import motion_store
+from . import obj
+from . import rotations
+from . import tracing
+
+
+# Parameters of the SMPL model used by smpl.SMPL
+SMPL_KEYS = [
+    "v_template", "f", "weights", "shapedirs", "posedirs", 
+    "J_regressor", "kintree_table"
+]
+
+# Formats supported by save_meshes
+EXPORT_FORMATS = ["obj", "mseq"]
+
+# Motion files searched by find_motions in directories
+MOTION_PATTERNS = ["*_poses.npz", "*.pkl"]
+
+
+@tracing.traced()
+def load_motion(path, separate_arms=True, fps=30):
+    '''
+    Loads a motion (pose, shape and translation at 30fps) from an AMASS
+    .npz file, a .pkl file of the dataset or a packed motion store, given as
+    "<store>.mstore/<name>" (see motion_store.py). Sequences of stores are
+    already preprocessed and returned as read-only views of the store,
+    without reading or copying the data (separate_arms is ignored, the
+    store records the value used to pack it).
+
+    AMASS sequences can be loaded at a different frame rate with fps (a
+    divisor of the capture rate). The recurrent regressor is trained with
+    30fps sequences: use run_model's output_fps to get higher frame rates.
+    '''
+    if motion_store.split_path(path) is not None:
+        return motion_store.load_sequence(path)
 
-def load_motion(path, separate_arms=True):
     filename, file_extension = os.path.splitext(path)
 
     if file_extension == ".pkl":
@@ -14,12 +48,10 @@ def load_motion(path, separate_arms=True):
 
     motion_dict = dict(np.load(path))
 
-    # The recurrent regressor is trained with 30fps sequences
-    target_fps = 30
-    drop_factor = int(motion_dict["mocap_framerate"] // target_fps)
+    drop_factor = max(1, int(motion_dict["mocap_framerate"] // fps))
 
-    trans = motion_dict["trans"][::drop_factor]
-    poses = motion_dict["poses"][::drop_factor, :72]
+    trans = motion_dict["trans"][::drop_factor].astype(np.float64)
+    poses = motion_dict["poses"][::drop_factor, :72].astype(np.float64)
     shape = motion_dict["betas"][:10]
 
     # Separate arms
@@ -29,18 +61,17 @@ def load_motion(path, separate_arms=True):
         right_arm = 16
 
         poses = poses.reshape((-1, poses.shape[-1] // 3, 3))
-        rot = R.from_euler('z', -angle, degrees=True)
-        poses[:, left_arm] = (rot * R.from_rotvec(poses[:, left_arm])).as_rotvec()
-        rot = R.from_euler('z', angle, degrees=True)
-        poses[:, right_arm] = (rot * R.from_rotvec(poses[:, right_arm])).as_rotvec()
+        rot = rotations.euler_to_matrix([-angle], 'z', degrees=True)
+        poses[:, left_arm] = rotations.compose_axis_angle(rot, poses[:, left_arm])
+        rot = rotations.euler_to_matrix([angle], 'z', degrees=True)
+        poses[:, right_arm] = rotations.compose_axis_angle(rot, poses[:, right_arm])
 
         poses = poses.reshape((poses.shape[0], -1))
 
     # Swap axes
-    rotation = R.from_euler("zx", [-90, 270], degrees=True)
-    root_rotation = R.from_rotvec(poses[:, :3])
-    poses[:, :3] = (rotation * root_rotation).as_rotvec()
-    trans = rotation.apply(trans)
+    rotation = rotations.euler_to_matrix([-90, 270], "zx", degrees=True)
+    poses[:, :3] = rotations.compose_axis_angle(rotation, poses[:, :3])
+    trans = trans @ rotation.T
 
     # Remove hand rotation
     poses[:, 66:] = 0
@@ -55,6 +86,91 @@ def load_motion(path, separate_arms=True):
     }
 
 
+def find_motions(path):
+    '''
+    Returns the paths of the motion files given by path, which can be a
+    directory (searched recursively), a glob pattern, a manifest file with
+    one path per line (relative paths are relative to the manifest) or a
+    motion store (the paths of its sequences, see load_motion).
+    '''
+    if os.path.splitext(path)[1] == motion_store.EXTENSION:
+        return [
+            os.path.join(path, name)
+            for name in motion_store.open_store(os.path.abspath(path))
+        ]
+
+    if os.path.isdir(path):
+        paths = []
+        for pattern in MOTION_PATTERNS:
+            paths += glob.glob(os.path.join(path, "**", pattern), recursive=True)
+        return sorted(paths)
+
+    if os.path.isfile(path) and os.path.splitext(path)[1] not in [".npz", ".pkl"]:
+        root = os.path.dirname(path)
+        with open(path, "r") as fp:
+            lines = [line.strip() for line in fp]
+        return [
+            os.path.join(root, line) for line in lines
+            if line and not line.startswith("#")
+        ]
+
+    return sorted(glob.glob(path))
+
+
+def motion_name(path, root=None):
+    '''
+    Name of a motion file, used to name its export directory. With root
+    (the path given to find_motions), the name is the path of the file 
+    relative to root, without the extension, so files with the same name
+    in different subdirectories do not collide.
+    '''
+    if root is not None:
+        store_path = motion_store.split_path(path)
+        if store_path is not None:
+            return store_path[1]
+
+        # Manifest files and glob patterns are relative to their directory
+        base = root
+        if not os.path.isdir(base):
+            base = os.path.dirname(base)
+        while glob.has_magic(base):
+            base = os.path.dirname(base)
+
+        relative_path = os.path.relpath(path, base or os.curdir)
+        if not relative_path.startswith(os.pardir):
+            return os.path.splitext(relative_path)[0]
+
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def motion_length(path, fps=30):
+    '''
+    Number of frames of the motion returned by load_motion, reading only
+    the index of motion stores and the array headers of AMASS files.
+    '''
+    store_path = motion_store.split_path(path)
+    if store_path is not None:
+        store_path, name = store_path
+        return motion_store.open_store(os.path.abspath(store_path)).sequences[name]["length"]
+
+    if os.path.splitext(path)[1] == ".pkl":
+        return len(load_motion_dataset(path)["pose"])
+
+    with np.load(path) as motion_dict:
+        drop_factor = max(1, int(motion_dict["mocap_framerate"] // fps))
+
+        with motion_dict.zip.open("poses.npy") as fp:
+            version = np.lib.format.read_magic(fp)
+            if version == (1, 0):
+                num_frames = np.lib.format.read_array_header_1_0(fp)[0][0]
+            elif version == (2, 0):
+                num_frames = np.lib.format.read_array_header_2_0(fp)[0][0]
+            else:
+                num_frames = len(motion_dict["poses"])
+
+    return -(-num_frames // drop_factor)
+
+
 def load_motion_dataset(path):
     with open(path, "rb") as f:
         motion_dict = pickle.load(f)
@@ -66,38 +182,162 @@ def load_motion_dataset(path):
     }
 
 
+def load_smpl_model(path):
+    '''
+    Loads the parameters of the SMPL model as NumPy arrays, either from the
+    original pickle (which requires chumpy and scipy) or from an archive
+    created with convert_smpl_model (which only requires NumPy).
+    '''
+    if os.path.splitext(path)[1] == ".npz":
+        with np.load(path) as data:
+            return dict(data)
+
+    with open(path, 'rb') as f:
+        dd = pickle.load(f, encoding='latin1')
+
+    return {
+        key: np.array(dd[key].todense() if key == "J_regressor" else dd[key])
+        for key in SMPL_KEYS
+    }
+
+
+def convert_smpl_model(path, output_path=None):
+    '''
+    Converts the SMPL pickle to a NumPy archive that can be loaded without
+    chumpy (by default, next to the pickle with .npz extension).
+    '''
+    if output_path is None:
+        output_path = os.path.splitext(path)[0] + ".npz"
+
+    np.savez(output_path, **load_smpl_model(path))
+
+    return output_path
+
+
 def load_obj(filename):
-    vertices = []
-    faces = []
+    return obj.read_obj(filename)
+
+
+def save_obj(filename, vertices, faces, precision=6, verbose=True):
+    with tracing.span("save_obj", path=filename):
+        obj.write_obj(filename, vertices, faces, precision=precision)
+
+    if verbose:
+        print("Saved:", filename)
+
+
+def named_meshes(v_garment, f_garment, v_body, f_body):
+    '''
+    Returns the name, vertices and faces of each mesh of a sequence: "body"
+    and "garment", or "body" and the name of each garment if v_garment and
+    f_garment are dictionaries by garment name (see model.run_garments).
+    '''
+    meshes = [("body", v_body, f_body)]
+
+    if isinstance(v_garment, dict):
+        return meshes + [(name, v_garment[name], f_garment[name]) for name in v_garment]
+
+    return meshes + [("garment", v_garment, f_garment)]
+
+
+def save_meshes(export_dir, v_garment, f_garment, v_body, f_body,
+                export_format="obj", vertex_dtype="float32", verbose=True):
+    '''
+    Saves the garment and body meshes of a sequence, either as one OBJ file
+    per frame and mesh or as one mesh sequence file per mesh ("mseq", see
+    mesh_sequence.py, with vertices stored as vertex_dtype).
+
+    With several garments (v_garment and f_garment given as dictionaries),
+    each one is saved with its name instead of "garment" (see named_meshes).
+    '''
+    meshes = named_meshes(v_garment, f_garment, v_body, f_body)
+
+    if export_format == "mseq":
+        for name, vertices, faces in meshes:
+            path = os.path.join(export_dir, name + mesh_sequence.EXTENSION)
+            with tracing.span("save_mesh_sequence", path=path, frames=len(vertices)):
+                mesh_sequence.save_mesh_sequence(path, vertices, faces, vertex_dtype)
+
+            if verbose:
+                print("Saved:", path)
+        return
+
+    for i in range(len(v_body)):
+        for name, vertices, faces in meshes:
+            path = os.path.join(export_dir, f"{i:04d}_{name}.obj")
+            save_obj(path, vertices[i], faces, verbose=verbose)
+
+
+def obj_frame_name(filename):
+    '''Name of the mesh of an OBJ file saved by save_meshes (e.g., "body" for 0000_body.obj), or None'''
+    name, extension = os.path.splitext(os.path.basename(filename))
+    frame, _, name = name.partition("_")
+
+    return name if extension == ".obj" and frame.isdigit() and name else None
+
+
+def mesh_names(export_dir):
+    '''
+    Names of the meshes saved by save_meshes in export_dir: "body" and
+    "garment", or "body" and the name of each garment (see named_meshes)
+    '''
+    names = set()
+
+    for filename in os.listdir(export_dir):
+        if filename.endswith(mesh_sequence.EXTENSION):
+            names.add(filename[:-len(mesh_sequence.EXTENSION)])
+        elif obj_frame_name(filename):
+            names.add(obj_frame_name(filename))
+
+    return sorted(names)
+
+
+def load_mesh_frames(export_dir, name):
+    '''
+    Loads the frames of a mesh saved by save_meshes in export_dir.
 
-    with open(filename, 'r') as fp:
-        for line in fp:
-            line_split = line.split()
-            
-            if not line_split:
-                continue
+    Returns:
+        vertices: array of shape num_frames x num_vertices x 3
+        faces: array of shape num_faces x 3
+    '''
+    path = os.path.join(export_dir, name + mesh_sequence.EXTENSION)
+    if os.path.exists(path):
+        sequence = mesh_sequence.MeshSequence(path)
+        return sequence[:], np.array(sequence.faces)
 
-            elif line_split[0] == 'v':
-                vertices.append([line_split[1], line_split[2], line_split[3]])
+    paths = sorted(
+        path for path in glob.glob(os.path.join(export_dir, "*_%s.obj" % glob.escape(name)))
+        if obj_frame_name(path) == name
+    )
+    if not paths:
+        raise FileNotFoundError("No %s meshes in %s" % (name, export_dir))
 
-            elif line_split[0] == 'f':
-                vertex_indices = [s.split("/")[0] for s in line_split[1:]]
-                faces.append(vertex_indices)
+    frames = [load_obj(path) for path in paths]
+    return np.stack([vertices for vertices, _ in frames]), frames[0][1]
 
-    vertices = np.array(vertices, dtype=np.float32)
-    faces = np.array(faces, dtype=np.int32) - 1
 
-    return vertices, faces
+def load_meshes(export_dir):
+    '''
+    Loads the garment and body meshes saved by save_meshes (or by
+    export.export_blocks) in export_dir, in either format.
 
+    Returns:
+        v_garments: dictionary with an array of shape num_frames x
+            num_garment_vertices x 3 per garment, by name ("garment" for
+            the sequences of a single garment, see named_meshes)
+        f_garments: dictionary with an array of shape num_garment_faces x 3
+            per garment, by name
+        v_body: array of shape num_frames x num_body_vertices x 3
+        f_body: array of shape num_body_faces x 3
+    '''
+    garments = [name for name in mesh_names(export_dir) if name != "body"]
+    if not garments:
+        raise FileNotFoundError("No garment meshes in " + export_dir)
 
-def save_obj(filename, vertices, faces):
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    v_garments, f_garments = {}, {}
+    for name in garments:
+        v_garments[name], f_garments[name] = load_mesh_frames(export_dir, name)
 
-    with open(filename, 'w') as fp:
-        for v in vertices:
-            fp.write('v %f %f %f\n' % (v[0], v[1], v[2]))
+    v_body, f_body = load_mesh_frames(export_dir, "body")
 
-        for f in (faces + 1):  # Faces are 1-based, not 0-based in obj files
-            fp.write('f %d %d %d\n' % (f[0], f[1], f[2]))
-    
-    print("Saved:", filename)
+    return v_garments, f_garments, v_body, f_body
@@ -10,6 +10,7 @@ class AxisAngleToMatrix(keras.layers.Layer):
 
     def call(self, axis_angle):
         """Converts rotations in axis-angle representation to rotation matrices
+        (TensorFlow version of rotations.axis_angle_to_matrix)
 
         Args:
             axis_angle: tensor of shape batch_size x 3
@@ -20,59 +21,81 @@ class AxisAngleToMatrix(keras.layers.Layer):
         initial_shape = tf.shape(axis_angle)
 
         axis_angle = tf.reshape(axis_angle, [-1, 3])
-        batch_size = tf.shape(axis_angle)[0]
+        x, y, z = tf.unstack(axis_angle, axis=1)
+        xx, yy, zz = x * x, y * y, z * z
+        angle2 = xx + yy + zz
 
-        angle = tf.expand_dims(tf.norm(axis_angle + 1e-8, axis=1), -1)
-        axis = tf.expand_dims(tf.math.divide(axis_angle, angle), -1)
+        small = angle2 < 1e-6
+        angle = tf.sqrt(tf.where(small, tf.ones_like(angle2), angle2))
 
-        angle = tf.expand_dims(angle, -1)
-        cos = tf.cos(angle)
-        sin = tf.sin(angle)
+        a = tf.where(small, 1 - angle2 / 6, tf.sin(angle) / angle)
+        b = tf.where(small, 0.5 - angle2 / 24, 0.5 * (tf.sin(angle / 2) / (angle / 2)) ** 2)
 
-        outer = tf.matmul(axis, axis, transpose_b=True, name="outer")
+        # K^2 = v v^T - angle^2 I, with K the skew matrix of v
+        bxy, bxz, byz = b * x * y, b * x * z, b * y * z
+        ax, ay, az = a * x, a * y, a * z
 
-        eyes = tf.tile(tf.expand_dims(tf.eye(3), 0), [batch_size, 1, 1])
-        R = cos * eyes + (1 - cos) * outer + sin * Skew()(axis)
+        R = tf.stack([
+            1 - b * (yy + zz), bxy - az, bxz + ay,
+            bxy + az, 1 - b * (xx + zz), byz - ax,
+            bxz - ay, byz + ax, 1 - b * (xx + yy)
+        ], axis=1)
         R = tf.reshape(R, tf.concat([initial_shape, [3]], axis=0))
 
         return R
 
 
-class Skew(keras.layers.Layer):
+class MatrixToEuler(keras.layers.Layer):
     def __init__(self, **kwargs):
-        super(Skew, self).__init__(**kwargs)
+        super(MatrixToEuler, self).__init__(**kwargs)
 
 
-    def call(self, vec):
-        """Returns the skew symetric version of each 3x3 matrix in a vector
+    def call(self, rotation_matrix):
+        """Converts rotation matrices to extrinsic 'zxy' Euler angles 
+        (same convention as scipy's Rotation.as_euler('zxy'))
 
         Args:
-            vec: tensor of shape batch_size x 3
+            rotation_matrix: tensor of shape batch_size x 3 x 3
 
         Returns:
-            rotation_matrix: tensor of shape batch_size x 3 x 3
+            euler_angles: tensor of shape batch_size x 3
         """
-        batch_size = tf.shape(vec)[0]
-        
-        col_inds = tf.constant([1, 2, 3, 5, 6, 7])
-        batch_inds = tf.reshape(tf.range(0, batch_size) * 9, [-1, 1])
-        indices = tf.reshape(batch_inds + col_inds, [-1, 1])
-
-        updates = tf.stack(
-            values=[-vec[:, 2], vec[:, 1], vec[:, 2],
-                    -vec[:, 0], -vec[:, 1], vec[:, 0]],
-            axis=1
-        )
-        updates = tf.reshape(updates, [-1])
-                
-        out_shape = [batch_size * 9]
-        res = tf.scatter_nd(indices, updates, out_shape)
-        res = tf.reshape(res, [batch_size, 3, 3])
-
-        return res
+        R = rotation_matrix
+        z = tf.atan2(R[..., 1, 0], R[..., 1, 1])
+        x = tf.atan2(-R[..., 1, 2], tf.sqrt(R[..., 1, 0] ** 2 + R[..., 1, 1] ** 2))
+        y = tf.atan2(R[..., 0, 2], R[..., 2, 2])
+
+        return tf.stack([z, x, y], axis=-1)
 
 
 def finite_diff(x, h):
     v = np.zeros(x.shape)
     v[1:] = (x[1:] - x[0:-1]) / h
     return v
+
+
+class FiniteDiff:
+    """Incremental version of finite_diff
+
+    Consecutive calls with blocks of a sequence return the same values 
+    as a single call of finite_diff over the whole sequence.
+    """
+    def __init__(self, h):
+        self.h = h
+        self.previous = None
+
+
+    def __call__(self, x):
+        v = np.zeros(x.shape)
+
+        if len(x) == 0:
+            return v
+
+        if self.previous is None:
+            v[1:] = (x[1:] - x[0:-1]) / self.h
+        else:
+            x_ext = np.concatenate([self.previous, x])
+            v[:] = (x_ext[1:] - x_ext[0:-1]) / self.h
+
+        self.previous = np.array(x[-1:])
+        return v
@@ -0,0 +1,204 @@
+import json
+import os
+
+import numpy as np
+
+from . import tracing
+
+
+# Binary mesh sequence format:
+#   magic (8 bytes) + JSON header padded with spaces to HEADER_SIZE bytes
+#   faces: int32 array of shape num_faces x 3
+#   vertices: array of shape num_frames x num_vertices x 3 (see VERTEX_DTYPES)
+#
+# Faces and vertices are stored contiguously and aligned to ALIGNMENT bytes,
+# so both can be memory-mapped and any frame can be read without loading
+# the rest of the sequence. The number of frames in the header is written 
+# when the file is closed: readers count the frames from the size of the
+# file, so the frames of an interrupted writer can still be read.
+EXTENSION = ".mseq"
+MAGIC = b"MESHSEQ\x01"
+HEADER_SIZE = 1024
+ALIGNMENT = 64
+
+# Storage type of the vertices. "quantized" stores each coordinate as a
+# 16-bit integer in the bounding box of the sequence.
+VERTEX_DTYPES = {
+    "float32": np.float32,
+    "float16": np.float16,
+    "quantized": np.uint16,
+}
+
+
+def align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class MeshSequenceWriter:
+    '''
+    Writes a mesh sequence frame by frame.
+
+    Quantized sequences need the bounding box of the sequence before the
+    first frame is written (see save_mesh_sequence to compute it from the
+    vertices).
+    '''
+    def __init__(self, path, faces, num_vertices, vertex_dtype="float32", bounds=None):
+        if vertex_dtype not in VERTEX_DTYPES:
+            raise ValueError("Unknown vertex dtype '%s'" % vertex_dtype)
+
+        if vertex_dtype == "quantized" and bounds is None:
+            raise ValueError("Quantized sequences need the bounds of the vertices")
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        faces = np.ascontiguousarray(faces, dtype=np.int32)
+
+        self.path = path
+        self.num_frames = 0
+        self.header = {
+            "num_frames": 0,
+            "num_vertices": int(num_vertices),
+            "num_faces": len(faces),
+            "vertex_dtype": vertex_dtype,
+            "faces_offset": HEADER_SIZE,
+            "vertices_offset": align(HEADER_SIZE + faces.nbytes),
+        }
+
+        if vertex_dtype == "quantized":
+            lower, upper = np.asarray(bounds, dtype=np.float64)
+            scale = np.maximum(upper - lower, 1e-12) / np.iinfo(np.uint16).max
+            self.header["offset"] = lower.tolist()
+            self.header["scale"] = scale.tolist()
+
+        self.fp = open(path, "wb")
+        self.write_header()
+        self.fp.write(faces.tobytes())
+        self.fp.seek(self.header["vertices_offset"])
+
+
+    def write_header(self):
+        header = MAGIC + json.dumps(self.header).encode("utf-8")
+        if len(header) > HEADER_SIZE:
+            raise ValueError("Header too large")
+
+        self.fp.seek(0)
+        self.fp.write(header.ljust(HEADER_SIZE, b" "))
+
+
+    def write(self, vertices):
+        '''
+        Args:
+            vertices: array of shape num_vertices x 3 (one frame)
+                or num_frames x num_vertices x 3
+        '''
+        vertices = np.reshape(vertices, (-1, self.header["num_vertices"], 3))
+
+        with tracing.span("write_mesh_sequence", path=self.path, frames=len(vertices)):
+            if self.header["vertex_dtype"] == "quantized":
+                vertices = (vertices - self.header["offset"]) / self.header["scale"]
+                vertices = np.clip(np.rint(vertices), 0, np.iinfo(np.uint16).max)
+
+            dtype = VERTEX_DTYPES[self.header["vertex_dtype"]]
+            self.fp.write(np.ascontiguousarray(vertices, dtype=dtype).tobytes())
+            self.num_frames += len(vertices)
+
+
+    def close(self):
+        if self.fp.closed:
+            return
+
+        self.header["num_frames"] = self.num_frames
+        self.write_header()
+        self.fp.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def save_mesh_sequence(path, vertices, faces, vertex_dtype="float32"):
+    '''
+    Saves a mesh sequence to a single file.
+
+    Args:
+        path: path of the file (see EXTENSION)
+        vertices: array of shape num_frames x num_vertices x 3
+        faces: array of shape num_faces x 3
+        vertex_dtype: storage type of the vertices (see VERTEX_DTYPES)
+    '''
+    bounds = None
+    if vertex_dtype == "quantized":
+        bounds = vertices.min(axis=(0, 1)), vertices.max(axis=(0, 1))
+
+    with MeshSequenceWriter(path, faces, vertices.shape[1], vertex_dtype, bounds) as writer:
+        writer.write(vertices)
+
+
+class MeshSequence:
+    '''
+    Memory-mapped reader of mesh sequences. Frames are read (and dequantized)
+    only when they are accessed:
+
+        sequence = MeshSequence("garment.mseq")
+        vertices = sequence[10]        # num_vertices x 3
+        vertices = sequence[10:20]     # 10 x num_vertices x 3
+    '''
+    def __init__(self, path):
+        with open(path, "rb") as fp:
+            header = fp.read(HEADER_SIZE)
+
+        if not header.startswith(MAGIC):
+            raise ValueError("Not a mesh sequence file: " + path)
+
+        self.path = path
+        self.header = json.loads(header[len(MAGIC):].decode("utf-8"))
+
+        self.faces = np.memmap(
+            path, dtype=np.int32, mode="r",
+            offset=self.header["faces_offset"],
+            shape=(self.header["num_faces"], 3)
+        )
+
+        # Complete frames in the file (the header has 0 frames if the writer
+        # was interrupted before closing it)
+        dtype = VERTEX_DTYPES[self.header["vertex_dtype"]]
+        frame_size = self.header["num_vertices"] * 3 * np.dtype(dtype).itemsize
+        vertices_size = max(0, os.path.getsize(path) - self.header["vertices_offset"])
+        self.header["num_frames"] = vertices_size // frame_size
+
+        shape = (self.header["num_frames"], self.header["num_vertices"], 3)
+        if self.header["num_frames"] == 0:
+            self.data = np.empty(shape, dtype=dtype)
+        else:
+            self.data = np.memmap(
+                path, dtype=dtype, mode="r",
+                offset=self.header["vertices_offset"], shape=shape
+            )
+
+
+    @property
+    def num_vertices(self):
+        return self.header["num_vertices"]
+
+
+    def __len__(self):
+        return self.header["num_frames"]
+
+
+    def __getitem__(self, index):
+        vertices = self.data[index]
+
+        if self.header["vertex_dtype"] == "quantized":
+            return (vertices * np.float32(self.header["scale"]) + np.float32(self.header["offset"])).astype(np.float32)
+
+        return np.asarray(vertices, dtype=np.float32)
+
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
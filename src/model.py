@@ -1,126 +1,641 @@
 import os
 
 import numpy as np
-import tensorflow as tf
-from scipy.spatial.transform import Rotation as R
 
+from . import startup
+from . import tracing
+
+with startup.timed("import tensorflow"):
+    import tensorflow as tf
+
+from . import body
+from . import interpolation
 from . import math
+from . import precision as precisions
+from . import rotations
 from . import skinning
-from . import smpl
+from . import tflite
+
+# The recurrent regressor is trained with 30fps sequences
+FPS = 30
+
+# Inputs of the recurrent regressor, besides the body shape
+REGRESSOR_FEATURES = [
+    'pose_encoded', 'pose_encoded_vel', 'pose_encoded_acc',
+    'translation_vel', 'translation_acc',
+    'euler_angles_vel', 'euler_angles_acc',
+]
+
+# Default batch size of keras.Model.predict
+PREDICT_BATCH_SIZE = 32
+
+# Approximate memory used per garment vertex and frame while unposing and
+# skinning (inputs and outputs of the networks of the diffused body and LBS)
+GARMENT_ROW_BYTES = 4 * (3 + 207 + 10 + 3 + 3 + 24 + 3 + 16 + 4 + 4)
+
+# Approximate memory used per body vertex and frame by smpl.SMPL
+BODY_ROW_BYTES = 4 * (3 + 3 + 3 + 24 + 16 + 4 + 4)
+
+DEFAULT_MEMORY_BUDGET = 1024 ** 3
+
+# Networks of the diffused body model, shared by all the garments
+DIFFUSED_BODY_PATH = "trained_models/diffused_body"
+
+# Name of the garment of the functions that run a single garment
+GARMENT = "garment"
+
+# Entries of load_model shared by all the garments worn by the same body (see
+# load_models)
+BODY_KEYS = [
+    "smpl", "skinning", "body/pose_encoder", "body/skinning_weights",
+    "body/pose_blendshape", "body/shape_blendshape",
+]
+
+# Runtimes of the networks: Keras SavedModels or TFLite models converted with
+# convert_tflite.py (see tflite.py)
+RUNTIMES = ["keras", "tflite"]
 
 
-def load_model(garment_model_path):
+def load_network(path):
+    return tf.keras.models.load_model(path, compile=False)
+
+
+def network_paths(garment_model_path, diffused_body_path=DIFFUSED_BODY_PATH):
+    '''Paths of the SavedModels of the networks, by key of load_model'''
     return {
-        "smpl": smpl.SMPL(
-            "assets/SMPL/basicModel_f_lbs_10_207_0_v1.0.0.pkl"
-        ),
-
-        "body/pose_encoder": tf.keras.models.load_model(
-            "trained_models/diffused_body/pose_encoder",
-            compile=False
-        ),
-
-        "body/skinning_weights": tf.keras.models.load_model(
-            "trained_models/diffused_body/skinning_weights",
-            compile=False
-        ),
-
-        "body/pose_blendshape": tf.keras.models.load_model(
-            "trained_models/diffused_body/pose_blendshape",
-            compile=False
-        ),
-
-        "body/shape_blendshape": tf.keras.models.load_model(
-            "trained_models/diffused_body/shape_blendshape",
-            compile=False
-        ),
-
-        "garment/gru": tf.keras.models.load_model(
-            os.path.join(garment_model_path, "gru"),
-            compile=False
-        ),
-
-        "garment/decoder": tf.keras.models.load_model(
-            os.path.join(garment_model_path, "decoder"),
-            compile=False
-        )
+        "body/pose_encoder": os.path.join(diffused_body_path, "pose_encoder"),
+        "body/skinning_weights": os.path.join(diffused_body_path, "skinning_weights"),
+        "body/pose_blendshape": os.path.join(diffused_body_path, "pose_blendshape"),
+        "body/shape_blendshape": os.path.join(diffused_body_path, "shape_blendshape"),
+        "garment/gru": os.path.join(garment_model_path, "gru"),
+        "garment/decoder": os.path.join(garment_model_path, "decoder"),
     }
 
 
-def run_model(model_dict, motion):
+def network_loader(path, runtime="keras", precision="float32", num_threads=None):
+    '''Returns a function that loads the network saved in path'''
+    if runtime == "tflite":
+        return lambda: tflite.load_network(tflite.model_path(path, precision), num_threads)
+
+    return lambda: precisions.convert_network(load_network(path), precision)
+
+
+def load_model(garment_model_path, lazy=True, top_k=None, body_backend="tensorflow",
+               smpl_path=None, diffused_body_path=DIFFUSED_BODY_PATH, precision="float32",
+               runtime="keras", num_threads=None):
     '''
-    This function evaluates the runtime pipeline step by step.
-    
-    Note: to run our model at interactive framerates we wrap 
-    this code into a custom Keras model and use TensorRT to optimize 
-    the computational graph. We provide the unoptimized code because
-    despite being slower it's much clearer and shows all the computations
-    involved in our method (and doesn't require additional dependencies).
+    Returns a dictionary with the body model and the networks. With lazy 
+    set to True, each of them is loaded the first time it is used (e.g.,
+    jobs that only need the body never load the garment networks).
+    Load times are recorded in startup.timings.
+
+    With top_k, the body is skinned with the top_k joints of largest weight
+    of each vertex (see skinning.LBS). The garment is always skinned with
+    all the joints: its weights differ per frame, and selecting the top_k
+    joints of every frame is slower than the fused LBS for any top_k with
+    a small error (see benchmarks/benchmark_skinning.py).
+
+    body_backend selects the implementation of the body model (see 
+    body.load_smpl). graph.GarmentModel requires the "tensorflow" backend.
+
+    smpl_path and diffused_body_path replace the default body model and
+    diffused body networks (e.g., with the synthetic models of the 
+    benchmarks).
+
+    precision ("float32", "float16", "bfloat16" or "int8") is the precision
+    of the decoder and the diffused body networks, which dominate the cost
+    (see precision.py). int8 requires the "tflite" runtime, and bfloat16 the
+    "keras" runtime. Reduced precisions are approximate: run benchmarks/benchmark_precision.py to 
+    measure their error and speed.
+
+    With runtime set to "tflite", the networks are run by the TFLite 
+    interpreter (with the XNNPACK delegate and num_threads threads) from
+    the models created by convert_tflite.py next to the SavedModels. 
+    streaming.StreamingSession and graph.GarmentModel require the "keras"
+    runtime.
+    '''
+    if precision not in precisions.PRECISIONS:
+        raise ValueError("Unknown precision '%s' (supported: %s)" % (
+            precision, ", ".join(precisions.PRECISIONS)
+        ))
+
+    if runtime not in RUNTIMES:
+        raise ValueError("Unknown runtime '%s' (supported: %s)" % (runtime, ", ".join(RUNTIMES)))
+
+    # Checked before loading anything (lazy models load the networks later)
+    supported = tflite.PRECISIONS if runtime == "tflite" else precisions.KERAS_PRECISIONS
+    if precision not in supported:
+        raise ValueError("Precision '%s' is not supported by the %s runtime (supported: %s)" % (
+            precision, runtime, ", ".join(supported)
+        ))
+
+    loaders = {
+        "smpl": lambda: body.load_smpl(smpl_path, backend=body_backend, top_k=top_k),
+
+        # Garment skinning (with weights per frame), with all the joints
+        "skinning": lambda: skinning.LBS(),
+    }
+
+    for key, path in network_paths(garment_model_path, diffused_body_path).items():
+        network_precision = precision if key in precisions.NETWORKS else "float32"
+        loaders[key] = network_loader(path, runtime, network_precision, num_threads)
+
+    model_dict = startup.LazyDict(loaders)
+
+    if not lazy:
+        for key in model_dict:
+            model_dict[key]
+
+    return model_dict
+
+
+def garment_name(garment_model_path):
+    '''Name of a garment (e.g., "tshirt" for trained_models/tshirt)'''
+    return os.path.basename(os.path.normpath(garment_model_path))
+
+
+def load_models(garment_model_paths, lazy=True, **kwargs):
+    '''
+    Loads several garments to be worn by the same body (see run_garments).
+    The body model and the diffused body networks are loaded only once and
+    shared by all the garments. The keyword arguments are those of 
+    load_model.
+
+    Returns:
+        model_dicts: dictionary with the model_dict of each garment (as
+            returned by load_model), by garment name
+    '''
+    model_dicts = {}
+
+    for path in garment_model_paths:
+        name = garment_name(path)
+        if name in model_dicts:
+            raise ValueError("Garment '%s' given more than once" % name)
+
+        model_dict = load_model(path, lazy=True, **kwargs)
+        if model_dicts:
+            model_dict.link(next(iter(model_dicts.values())), BODY_KEYS)
+
+        model_dicts[name] = model_dict
+
+    if not lazy:
+        for model_dict in model_dicts.values():
+            for key in model_dict:
+                model_dict[key]
+
+    return model_dicts
+
+
+def compute_features(model_dict, motion, diffs=None, pose_encoded=None):
     '''
+    Computes the input features of the recurrent regressor.
 
-    num_frames = len(motion["pose"])
+    Args:
+        model_dict: dictionary returned by load_model
+        motion: dictionary with "pose" and "translation" arrays
+        diffs: optional dictionary of math.FiniteDiff objects, one per
+            derivative. Passing the same dictionary on consecutive calls
+            computes the derivatives across blocks of a longer sequence.
+        pose_encoded: optional output of the pose encoder, if it has
+            already been evaluated for these frames
+
+    Returns:
+        features: dictionary with the encoded pose and the velocities and
+            accelerations of the pose, translation and root orientation
+    '''
+    if diffs is None:
+        diffs = {}
+
+    h = 1.0 / FPS
+
+    def diff(name, x):
+        return diffs.setdefault(name, math.FiniteDiff(h))(x)
+
+    features = {}
 
     # Run pose encoder
-    motion["pose_encoded"] = model_dict["body/pose_encoder"].predict(
-        motion["pose"][:, 3:]
-    )
+    if pose_encoded is None:
+        with tracing.span("pose_encoder") as span:
+            pose_encoded = model_dict["body/pose_encoder"].predict(
+                motion["pose"][:, 3:]
+            )
+            span.add_tensor("pose_encoded", pose_encoded)
+
+    features["pose_encoded"] = pose_encoded
 
     # Compute velocities and accelerations for input vector
-    h = 1.0 / 30.0 # 30 fps
-    motion['translation_vel'] = math.finite_diff(motion['translation'], h)
-    motion['translation_acc'] = math.finite_diff(motion['translation_vel'], h)
+    features['translation_vel'] = diff('translation_vel', motion['translation'])
+    features['translation_acc'] = diff('translation_acc', features['translation_vel'])
+
+    root_rotation = rotations.axis_angle_to_matrix(motion['pose'][:, :3].astype(np.float64))
+    features['euler_angles'] = rotations.matrix_to_euler(root_rotation, 'zxy')
+    features['euler_angles_vel'] = diff('euler_angles_vel', features['euler_angles'])
+    features['euler_angles_acc'] = diff('euler_angles_acc', features['euler_angles_vel'])
+
+    features['pose_encoded_vel'] = diff('pose_encoded_vel', features['pose_encoded'])
+    features['pose_encoded_acc'] = diff('pose_encoded_acc', features['pose_encoded_vel'])
+
+    return features
+
+
+def regressor_inputs(shape, features):
+    '''
+    Builds the input dictionary of the recurrent regressor for a single
+    sequence (i.e., with a batch dimension of size 1).
+    '''
+    num_frames = len(features["pose_encoded"])
+    shape = np.tile(shape, (num_frames, 1))
+
+    inputs = {'shape': np.expand_dims(shape, axis=0)}
+    for key in REGRESSOR_FEATURES:
+        inputs[key] = np.expand_dims(features[key], axis=0)
 
-    rot =  R.from_rotvec(motion['pose'][:,:3])
-    motion['euler_angles'] = rot.as_euler('zxy')
-    motion['euler_angles_vel'] = math.finite_diff(motion['euler_angles'], h)
-    motion['euler_angles_acc'] = math.finite_diff(motion['euler_angles_vel'], h)
+    return inputs
+
+
+def run_body(model_dict, shape, pose):
+    '''
+    Poses the body model.
 
-    motion['pose_encoded_vel'] = math.finite_diff(motion['pose_encoded'], h)
-    motion['pose_encoded_acc'] = math.finite_diff(motion['pose_encoded_vel'], h)
+    Args:
+        model_dict: dictionary returned by load_model
+        shape: array of shape 10, or num_frames x 10 (one shape per frame)
+        pose: array of shape num_frames x 72
+
+    If all the frames have the same shape, the shape-only quantities of the
+    body are taken from the cache of the body model (see smpl.SMPL.shaped).
+
+    Returns:
+        v_body: tensor of shape num_frames x num_body_vertices x 3
+        smpl_dict: dictionary with the intermediate tensors of smpl.SMPL
+    '''
+    shape = np.asarray(shape)
+    if shape.ndim == 2 and len(shape) > 0 and (shape == shape[:1]).all():
+        shape = shape[0]
+
+    with tracing.span("body", frames=len(pose)) as span:
+        v_body, smpl_dict = model_dict["smpl"](shape, pose)
+        span.add_tensor("v_body", v_body)
+
+    return v_body, smpl_dict
+
+
+def decode(model_dict, v_encoded):
+    '''
+    Projects the latent garment codes to the canonical space.
+
+    Returns:
+        v_canonical: array of shape num_frames x num_garment_vertices x 3
+    '''
+    with tracing.span("decoder", frames=len(v_encoded)) as span:
+        v_canonical = model_dict["garment/decoder"].predict(v_encoded)
+        span.add_tensor("v_canonical", v_canonical)
+
+    return v_canonical
+
+
+def num_garment_vertices(model_dict):
+    '''Number of vertices of the garment, from the output shape of the decoder'''
+    return model_dict["garment/decoder"].output_shape[1]
+
+
+def frame_block_size(frame_bytes, memory_budget):
+    '''
+    Number of frames processed at once so that the tensors of a block,
+    frame_bytes per frame, fit in the memory budget (None means no limit).
+
+    Blocks are multiples of PREDICT_BATCH_SIZE frames, so Keras predicts the
+    same batches (of frames for the decoder and of vertices for the diffused
+    body networks) as when the whole sequence is evaluated at once.
+    '''
+    if memory_budget is None:
+        return None
+
+    num_frames = int(memory_budget // frame_bytes)
+
+    return max(PREDICT_BATCH_SIZE, num_frames - num_frames % PREDICT_BATCH_SIZE)
+
+
+def run_garment(model_dict, v_canonical, shape, smpl_dict, memory_budget=None):
+    '''
+    Deforms the garment from the canonical space with the diffused body
+    model (i.e., adds the pose and shape blendshapes and applies linear 
+    blend skinning).
 
-    shape = np.tile(motion["shape"], (num_frames, 1))
+    The networks of the diffused body are evaluated per vertex and frame.
+    Instead of repeating the pose and shape features for every vertex of 
+    the sequence, the rows are evaluated in chunks that fit in memory_budget
+    (in bytes, None evaluates all the rows at once). The result does not 
+    depend on the size of the chunks.
+
+    Args:
+        model_dict: dictionary returned by load_model
+        v_canonical: array of shape num_frames x num_garment_vertices x 3
+        shape: array of shape 10, or num_frames x 10 (one shape per frame)
+        smpl_dict: dictionary returned by run_body for the same frames
+
+    Returns:
+        v_garment: tensor of shape num_frames x num_garment_vertices x 3
+    '''
+    num_frames, num_vertices = v_canonical.shape[:2]
+    num_rows = num_frames * num_vertices
+
+    v_canonical_flat = np.reshape(v_canonical, (-1, 3))
+    pose_feature = np.asarray(smpl_dict['pose_feature'])
+    shape = np.broadcast_to(shape, (num_frames, np.shape(shape)[-1]))
+
+    chunk_size = num_rows
+    if memory_budget is not None:
+        chunk_size = int(memory_budget // GARMENT_ROW_BYTES)
+        chunk_size = max(PREDICT_BATCH_SIZE, chunk_size - chunk_size % PREDICT_BATCH_SIZE)
+
+    v_unpose = np.empty((num_rows, 3), dtype=np.float32)
+    skinning_weights = None
+
+    for start in range(0, num_rows, chunk_size):
+        rows = slice(start, min(start + chunk_size, num_rows))
+        frames = np.arange(rows.start, rows.stop) // num_vertices
+
+        v = v_canonical_flat[rows]
+        with tracing.span("pose_blendshape", rows=len(v)):
+            pose_blendshape = model_dict["body/pose_blendshape"].predict([v, pose_feature[frames]])
+
+        with tracing.span("shape_blendshape", rows=len(v)):
+            shape_blendshape = model_dict["body/shape_blendshape"].predict([v, shape[frames]])
+
+        with tracing.span("skinning_weights", rows=len(v)) as span:
+            weights = model_dict["body/skinning_weights"].predict(v)
+            span.add_tensor("weights", weights)
+
+        if skinning_weights is None:
+            skinning_weights = np.empty((num_rows, weights.shape[-1]), dtype=np.float32)
+
+        v_unpose[rows] = v + pose_blendshape + shape_blendshape
+        skinning_weights[rows] = weights
+
+    v_unpose = np.reshape(v_unpose, (num_frames, num_vertices, 3))
+    skinning_weights = np.reshape(skinning_weights, (num_frames, num_vertices, -1))
+
+    joint_transforms = smpl_dict['joint_transforms']
+    with tracing.span("skinning", frames=num_frames) as span:
+        v_garment = model_dict["skinning"](v_unpose, joint_transforms, skinning_weights)
+        span.add_tensor("v_garment", v_garment)
+
+    return v_garment
+
+
+def iterate_body_and_garments(model_dicts, v_encoded, shape, pose, translation,
+                              memory_budget=DEFAULT_MEMORY_BUDGET):
+    '''
+    Same as iterate_body_and_garment for several garments worn by the same
+    body (see load_models): the body model runs once per block of frames,
+    and only the decoder and the diffused body networks run per garment.
+
+    Args:
+        model_dicts: dictionary with the model_dict of each garment
+        v_encoded: dictionary with the latent codes of each garment, arrays
+            of shape num_frames x latent_size
+
+    Yields:
+        frames: slice with the frames of the block
+        v_garments: dictionary with the vertices of each garment, arrays of
+            shape block_size x num_garment_vertices x 3
+        v_body: array of shape block_size x num_body_vertices x 3
+    '''
+    body_dict = next(iter(model_dicts.values()))
+    num_frames = len(pose)
+    shape = np.broadcast_to(shape, (num_frames, np.shape(shape)[-1]))
+
+    num_vertices = sum(num_garment_vertices(model_dict) for model_dict in model_dicts.values())
+    frame_bytes = num_vertices * GARMENT_ROW_BYTES + body_dict["smpl"].num_vertices * BODY_ROW_BYTES
+    block_size = frame_block_size(frame_bytes, memory_budget) or num_frames
+
+    for start in range(0, num_frames, block_size):
+        frames = slice(start, min(start + block_size, num_frames))
+
+        # The span ends before the block is yielded, so it does not include
+        # the time spent by the caller (e.g., exporting the meshes)
+        with tracing.span("block", start=frames.start, stop=frames.stop):
+            v_body, smpl_dict = run_body(body_dict, shape[frames], pose[frames])
+
+            v_garments = {}
+            for name, model_dict in model_dicts.items():
+                with tracing.span("garment", garment=name):
+                    v_canonical = decode(model_dict, v_encoded[name][frames])
+                    v_garment = run_garment(
+                        model_dict, v_canonical, shape[frames], smpl_dict, memory_budget
+                    )
+
+                # Add translation
+                v_garments[name] = np.asarray(v_garment) + translation[frames, None, :]
+
+            v_body = np.asarray(v_body) + translation[frames, None, :]
+
+        yield frames, v_garments, v_body
+
+
+def iterate_body_and_garment(model_dict, v_encoded, shape, pose, translation,
+                             memory_budget=DEFAULT_MEMORY_BUDGET):
+    '''
+    Decodes the garment, runs the body model and deforms the garment in 
+    blocks of frames, so that the intermediate tensors fit in memory_budget
+    (in bytes, None evaluates all the frames at once).
+
+    Args:
+        model_dict: dictionary returned by load_model
+        v_encoded: array of shape num_frames x latent_size
+        shape: array of shape 10, or num_frames x 10 (one shape per frame)
+        pose: array of shape num_frames x 72
+        translation: array of shape num_frames x 3
+
+    Yields:
+        frames: slice with the frames of the block
+        v_garment: array of shape block_size x num_garment_vertices x 3
+        v_body: array of shape block_size x num_body_vertices x 3
+    '''
+    blocks = iterate_body_and_garments(
+        {GARMENT: model_dict}, {GARMENT: v_encoded}, shape, pose, translation, memory_budget
+    )
+
+    for frames, v_garments, v_body in blocks:
+        yield frames, v_garments[GARMENT], v_body
+
+
+def collect(blocks, num_frames):
+    '''
+    Gathers the blocks of frames yielded by iterate_body_and_garment or
+    iterate_model into arrays with the whole sequence (or by
+    iterate_garments, into dictionaries of arrays by garment name).
+
+    Returns:
+        v_garment: array of shape num_frames x num_garment_vertices x 3
+        v_body: array of shape num_frames x num_body_vertices x 3
+    '''
+    def allocate(block):
+        return np.empty((num_frames,) + block.shape[1:], dtype=np.float32)
+
+    v_garment, v_body = None, None
+
+    for frames, v_garment_block, v_body_block in blocks:
+        if v_body is None:
+            v_body = allocate(v_body_block)
+            if isinstance(v_garment_block, dict):
+                v_garment = {name: allocate(block) for name, block in v_garment_block.items()}
+            else:
+                v_garment = allocate(v_garment_block)
+
+        v_body[frames] = v_body_block
+        if isinstance(v_garment, dict):
+            for name, block in v_garment_block.items():
+                v_garment[name][frames] = block
+        else:
+            v_garment[frames] = v_garment_block
+
+    return v_garment, v_body
+
+
+def run_body_and_garment(model_dict, v_encoded, shape, pose, translation,
+                         memory_budget=DEFAULT_MEMORY_BUDGET):
+    '''
+    Same as iterate_body_and_garment, but returns the whole sequence.
+
+    Returns:
+        v_garment: array of shape num_frames x num_garment_vertices x 3
+        v_body: array of shape num_frames x num_body_vertices x 3
+    '''
+    blocks = iterate_body_and_garment(
+        model_dict, v_encoded, shape, pose, translation, memory_budget
+    )
+
+    return collect(blocks, len(v_encoded))
+
+
+def num_output_frames(num_frames, output_fps=None):
+    '''Number of frames returned by run_model for output_fps'''
+    if output_fps is None:
+        return num_frames
+
+    return len(interpolation.frame_times(num_frames, FPS, output_fps))
+
+
+def upsample(v_encoded, motion, output_fps):
+    '''
+    Resamples the latent garment codes and the body motion from FPS to
+    output_fps (see run_model). The codes and the translation are
+    interpolated linearly and the joint rotations with slerp.
+
+    Args:
+        v_encoded: array of shape num_frames x latent_size, or dictionary
+            with the codes of each garment (see run_garments)
+
+    Returns:
+        v_encoded: array (or dictionary of arrays) of shape
+            num_output_frames x latent_size
+        motion: dictionary with the resampled "pose", "shape" and
+            "translation"
+    '''
+    with tracing.span("upsample", output_fps=output_fps) as span:
+        times = interpolation.frame_times(len(motion["pose"]), FPS, output_fps)
+        motion = interpolation.interpolate_motion(motion, times)
+
+        if isinstance(v_encoded, dict):
+            v_encoded = {
+                name: interpolation.interpolate(codes, times) for name, codes in v_encoded.items()
+            }
+        else:
+            v_encoded = interpolation.interpolate(v_encoded, times)
+            span.add_tensor("v_encoded", v_encoded)
+
+    return v_encoded, motion
+
+
+def iterate_garments(model_dicts, motion, memory_budget=DEFAULT_MEMORY_BUDGET,
+                     output_fps=None):
+    '''
+    Same as run_garments, but yields the output in blocks of frames as soon
+    as they are computed (see iterate_body_and_garments).
+    '''
+    body_dict = next(iter(model_dicts.values()))
+
+    # Compute input features
+    with tracing.span("features", frames=len(motion["pose"])):
+        features = compute_features(body_dict, motion)
+        motion.update(features)
 
     # Run model
-    print("[INFO] Run recurrent regressor...")
-    v_encoded = model_dict["garment/gru"].predict({
-        'shape': np.expand_dims(shape, axis=0),
-        'pose_encoded': np.expand_dims(motion['pose_encoded'], axis=0),
-        'pose_encoded_vel': np.expand_dims(motion['pose_encoded_vel'], axis=0),
-        'pose_encoded_acc': np.expand_dims(motion['pose_encoded_acc'], axis=0),
-        'translation_vel': np.expand_dims(motion['translation_vel'], axis=0),
-        'translation_acc': np.expand_dims(motion['translation_acc'], axis=0),
-        'euler_angles_vel': np.expand_dims(motion['euler_angles_vel'], axis=0),
-        'euler_angles_acc': np.expand_dims(motion['euler_angles_acc'], axis=0),
-    })[0]
-
-    print("[INFO] Project from latent space to canonical space...")
-    v_canonical = model_dict["garment/decoder"].predict(v_encoded)
-    v_canonical_flat = tf.reshape(v_canonical, (-1, 3))
-    num_vertices = v_canonical.shape[-2]
- 
-    print("[INFO] Project from canonical space to unpose...")
-    v_body, smpl_dict = model_dict["smpl"](shape, motion["pose"])
-    
-    pose_repeat = tf.repeat(smpl_dict['pose_feature'], num_vertices, axis=0)
-    pose_blendshape = model_dict["body/pose_blendshape"].predict([v_canonical_flat, pose_repeat])
+    inputs = regressor_inputs(motion["shape"], features)
+    v_encoded = {}
+    for name, model_dict in model_dicts.items():
+        with tracing.span("regressor", frames=len(motion["pose"]), garment=name) as span:
+            v_encoded[name] = model_dict["garment/gru"].predict(inputs)[0]
+            span.add_tensor("v_encoded", v_encoded[name])
+
+    body_motion = motion
+    if output_fps is not None and output_fps != FPS:
+        v_encoded, body_motion = upsample(v_encoded, motion, output_fps)
+
+    yield from iterate_body_and_garments(
+        model_dicts, v_encoded, body_motion["shape"], body_motion["pose"],
+        body_motion["translation"], memory_budget
+    )
+
+
+def iterate_model(model_dict, motion, memory_budget=DEFAULT_MEMORY_BUDGET,
+                  output_fps=None):
+    '''
+    Same as run_model, but yields the output in blocks of frames as soon as
+    they are computed (see iterate_body_and_garment), so that they can be
+    exported while the next blocks are computed.
+    '''
+    blocks = iterate_garments({GARMENT: model_dict}, motion, memory_budget, output_fps)
+
+    for frames, v_garments, v_body in blocks:
+        yield frames, v_garments[GARMENT], v_body
+
+
+def run_model(model_dict, motion, memory_budget=DEFAULT_MEMORY_BUDGET, output_fps=None):
+    '''
+    This function evaluates the runtime pipeline step by step.
     
-    shape_repeat = tf.repeat(shape, num_vertices, axis=0)
-    shape_blendshape = model_dict["body/shape_blendshape"].predict([v_canonical_flat, shape_repeat])
+    Note: to run our model at interactive framerates we wrap 
+    this code into a custom Keras model and use TensorRT to optimize 
+    the computational graph. We provide the unoptimized code because
+    despite being slower it's much clearer and shows all the computations
+    involved in our method (and doesn't require additional dependencies).
+    The Keras model is available as graph.GarmentModel.
 
-    skinning_weights = model_dict["body/skinning_weights"].predict(v_canonical_flat)
-    skinning_weights = tf.reshape(skinning_weights, (num_frames, num_vertices, -1))
+    The body and garment are evaluated in blocks of frames so that the 
+    intermediate tensors fit in memory_budget (in bytes). Set it to None
+    to evaluate the whole sequence at once.
 
-    v_unpose = v_canonical_flat + pose_blendshape + shape_blendshape
-    v_unpose = tf.reshape(v_unpose, (num_frames, num_vertices, 3))
+    The recurrent regressor always runs at FPS. With output_fps (e.g., 60 or
+    120), its latent codes and the body motion are interpolated to that
+    frame rate before decoding and skinning, so the extra frames only cost
+    the decoder, the diffused body and the body model (see num_output_frames
+    for the number of frames returned).
 
-    print("[INFO] Compute linear blend skinning...")
-    joint_transforms = smpl_dict['joint_transforms']
-    v_garment = skinning.LBS()(v_unpose, joint_transforms, skinning_weights)
+    If tracing is enabled, each stage is recorded as a span (see tracing.py).
+    '''
+    blocks = iterate_model(model_dict, motion, memory_budget, output_fps)
+    v_garment, v_body = collect(blocks, num_output_frames(len(motion["pose"]), output_fps))
+
+    return v_garment, v_body
 
-    # Add translation
-    v_body = v_body + motion["translation"][:, None, :]
-    v_garment = v_garment + motion["translation"][:, None, :]
 
-    print("[INFO] Done!")
+def run_garments(model_dicts, motion, memory_budget=DEFAULT_MEMORY_BUDGET, output_fps=None):
+    '''
+    Same as run_model for several garments worn by the same body (e.g., a
+    tshirt and trousers, loaded with load_models). The pose encoder, the
+    input features, the body model and the joint transforms are evaluated
+    once, and only the regressor, the decoder and the diffused body networks
+    run for each garment.
+
+    Returns:
+        v_garments: dictionary with the vertices of each garment, arrays of
+            shape num_frames x num_garment_vertices x 3
+        v_body: array of shape num_frames x num_body_vertices x 3
+    '''
+    blocks = iterate_garments(model_dicts, motion, memory_budget, output_fps)
+    v_garments, v_body = collect(blocks, num_output_frames(len(motion["pose"]), output_fps))
 
-    return v_garment.numpy(), v_body.numpy()
+    return v_garments, v_body
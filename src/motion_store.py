@@ -0,0 +1,194 @@
+import functools
+import json
+import multiprocessing
+import os
+import struct
+
+import numpy as np
+
+
+# Packed motion store format:
+#   magic (8 bytes) + offset and size of the index (uint64 each), padded
+#   to ALIGNMENT bytes
+#   for each sequence: pose (float32 array of shape num_frames x 72) and
+#   translation (float32 array of shape num_frames x 3), each aligned to
+#   ALIGNMENT bytes
+#   index: JSON with the offsets, length and shape (betas) of each sequence
+#
+# The sequences are preprocessed as in io.load_motion, so reading one is a
+# view of the memory-mapped file, without parsing or copying.
+EXTENSION = ".mstore"
+MAGIC = b"MOTIONS\x01"
+ALIGNMENT = 64
+
+HEADER = struct.Struct("<8sQQ")
+
+# Columns of the arrays of each sequence
+POSE_SIZE = 72
+TRANSLATION_SIZE = 3
+
+
+def align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def split_path(path):
+    '''
+    Splits paths of sequences in a store ("<store>.mstore/<name>") into the
+    path of the store and the name of the sequence. Returns None for other
+    paths.
+    '''
+    store_path, separator, name = path.partition(EXTENSION + os.sep)
+    if not separator or not name:
+        return None
+
+    return store_path + EXTENSION, name
+
+
+class MotionStore:
+    '''
+    Memory-mapped reader of packed motion stores (see pack_motions).
+    Sequences are returned as read-only views of the file, with the same
+    format as io.load_motion (copy them to modify them).
+
+        store = MotionStore("cmu.mstore")
+        motion = store["01_01_poses"]
+    '''
+    def __init__(self, path):
+        with open(path, "rb") as fp:
+            magic, index_offset, index_size = HEADER.unpack(fp.read(HEADER.size))
+
+            if magic != MAGIC:
+                raise ValueError("Not a motion store: " + path)
+
+            fp.seek(index_offset)
+            self.index = json.loads(fp.read(index_size).decode("utf-8"))
+
+        self.path = path
+        self.sequences = self.index["sequences"]
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+
+
+    def __len__(self):
+        return len(self.sequences)
+
+
+    def __iter__(self):
+        return iter(self.sequences)
+
+
+    def __contains__(self, name):
+        return name in self.sequences
+
+
+    def names(self):
+        return list(self.sequences)
+
+
+    def __getitem__(self, name):
+        if name not in self.sequences:
+            raise KeyError("No sequence '%s' in %s" % (name, self.path))
+
+        entry = self.sequences[name]
+        num_frames = entry["length"]
+
+        return {
+            "pose": np.ndarray(
+                (num_frames, POSE_SIZE), dtype=np.float32,
+                buffer=self.data, offset=entry["pose_offset"]
+            ),
+            "shape": np.array(entry["shape"], dtype=np.float32),
+            "translation": np.ndarray(
+                (num_frames, TRANSLATION_SIZE), dtype=np.float32,
+                buffer=self.data, offset=entry["translation_offset"]
+            ),
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def open_store(path):
+    '''Opens a store once per process (the index is read only once)'''
+    return MotionStore(path)
+
+
+def load_sequence(path):
+    '''Loads a sequence given by "<store>.mstore/<name>" (see split_path)'''
+    store_path, name = split_path(path)
+    return open_store(os.path.abspath(store_path))[name]
+
+
+def preprocess(path, root=None, separate_arms=True):
+    from . import io
+
+    return io.motion_name(path, root), io.load_motion(path, separate_arms)
+
+
+def pack_motions(paths, output_path, num_workers=None, separate_arms=True, verbose=True, root=None):
+    '''
+    Preprocesses motion files (as io.load_motion) in parallel and packs
+    them into a single store. Sequences are named after their files, 
+    relative to root (the path given to io.find_motions, see 
+    io.motion_name), as the export directories of run_batch.py and 
+    run_farm.py. The names must be unique.
+
+    The store is written to a temporary file next to output_path, which
+    replaces output_path only when the store is complete.
+
+    Returns:
+        num_frames: total number of frames in the store
+    '''
+    from . import io
+
+    names = [io.motion_name(path, root) for path in paths]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError("Several motion files are named %s" % ", ".join("'%s'" % name for name in duplicates))
+
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    sequences = {}
+    task = functools.partial(preprocess, root=root, separate_arms=separate_arms)
+    temporary_path = output_path + ".tmp"
+
+    try:
+        with open(temporary_path, "wb") as fp:
+            fp.write(HEADER.pack(MAGIC, 0, 0).ljust(ALIGNMENT, b"\0"))
+
+            def write(array):
+                fp.write(b"\0" * (align(fp.tell()) - fp.tell()))
+                offset = fp.tell()
+                fp.write(np.ascontiguousarray(array, dtype=np.float32).tobytes())
+                return offset
+
+            with multiprocessing.Pool(num_workers) as pool:
+                for i, (name, motion) in enumerate(pool.imap(task, paths, chunksize=4), 1):
+                    sequences[name] = {
+                        "length": len(motion["pose"]),
+                        "shape": motion["shape"].tolist(),
+                        "pose_offset": write(motion["pose"]),
+                        "translation_offset": write(motion["translation"]),
+                    }
+
+                    if verbose and i % 100 == 0:
+                        print("[INFO] Packed %d/%d sequences" % (i, len(paths)))
+
+            num_frames = sum(entry["length"] for entry in sequences.values())
+            index = json.dumps({
+                "num_frames": num_frames,
+                "separate_arms": separate_arms,
+                "sequences": sequences,
+            }).encode("utf-8")
+
+            index_offset = fp.tell()
+            fp.write(index)
+
+            fp.seek(0)
+            fp.write(HEADER.pack(MAGIC, index_offset, len(index)))
+
+        os.replace(temporary_path, output_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+    return num_frames
@@ -0,0 +1,143 @@
+import os
+
+import numpy as np
+
+
+def parse_floats(lines, columns):
+    '''
+    Parses lines of whitespace-separated numbers (e.g., the vertex lines of
+    an OBJ file with the "v" prefix removed) into an array of shape
+    len(lines) x columns. Extra values in each line are ignored.
+    '''
+    if not lines:
+        return np.zeros((0, columns), dtype=np.float32)
+
+    values = np.fromstring(" ".join(lines), dtype=np.float32, sep=" ")
+    if values.size % len(lines) != 0:
+        raise ValueError("All the lines must have the same number of values")
+
+    return np.ascontiguousarray(values.reshape(len(lines), -1)[:, :columns])
+
+
+def parse_faces(lines, counts=None):
+    '''
+    Parses the face lines of an OBJ file ("f" prefix already removed) with
+    any of the formats "v", "v/vt", "v//vn" or "v/vt/vn".
+
+    Negative indices are relative to the elements defined before each face
+    (-1 is the last one), given by counts: an array of shape num_faces x 3 
+    with the number of vertices, texture coordinates and normals defined
+    before each face line.
+
+    Returns:
+        indices: int array of shape num_faces x corners x components, with
+            0-based indices and -1 for missing components
+    '''
+    if not lines:
+        return np.zeros((0, 3, 1), dtype=np.int32)
+
+    corners = len(lines[0].split())
+    text = " ".join(lines)
+    components = text.split(None, 1)[0].count("/") + 1
+
+    # Missing components (e.g., "1//2") are read as 0, and become -1 below
+    text = text.replace("//", "/0/").replace("/", " ")
+
+    indices = np.fromstring(text, dtype=np.int64, sep=" ")
+    if indices.size != len(lines) * corners * components:
+        raise ValueError("All the faces must have the same format and number of vertices")
+
+    indices = indices.reshape(len(lines), corners, components)
+
+    if (indices < 0).any():
+        if counts is None:
+            raise ValueError("Relative (negative) face indices need the counts of the elements")
+
+        counts = np.asarray(counts, dtype=np.int64)[:, None, :components]
+        indices = np.where(indices < 0, indices + counts + 1, indices)
+
+    return (indices - 1).astype(np.int32)
+
+
+def read_obj(filename, read_uvs=False):
+    '''
+    Reads the vertices and faces (and optionally the texture coordinates) of
+    an OBJ file. Lines are parsed in bulk, so all faces must have the same
+    number of vertices (e.g., triangles).
+
+    Returns:
+        vertices: float32 array of shape num_vertices x 3
+        faces: int32 array of shape num_faces x 3
+        uvs: (if read_uvs) float32 array of shape num_uvs x 2
+        faces_uv: (if read_uvs) int32 array of shape num_faces x 3
+    '''
+    with open(filename, 'r') as fp:
+        lines = fp.read().splitlines()
+
+    # Lines of each element, by the first token (which can be indented or
+    # followed by tabs), and the number of vertices, texture coordinates and
+    # normals before each face (see parse_faces)
+    elements = {"v": [], "vt": [], "vn": [], "f": []}
+    counts = []
+
+    for line in lines:
+        tokens = line.split(None, 1)
+        if len(tokens) < 2 or tokens[0] not in elements:
+            continue
+
+        if tokens[0] == "f":
+            counts.append((len(elements["v"]), len(elements["vt"]), len(elements["vn"])))
+
+        elements[tokens[0]].append(tokens[1])
+
+    vertices = parse_floats(elements["v"], 3)
+
+    indices = parse_faces(elements["f"], counts)
+    faces = np.ascontiguousarray(indices[:, :, 0])
+
+    if not read_uvs:
+        return vertices, faces
+
+    uvs = parse_floats(elements["vt"], 2)
+
+    faces_uv = np.ascontiguousarray(indices[:, :, 1]) if indices.shape[-1] > 1 else None
+
+    return vertices, faces, uvs, faces_uv
+
+
+def write_obj(filename, vertices, faces, uvs=None, faces_uv=None, precision=6):
+    '''
+    Writes a mesh to an OBJ file. The lines of each element are formatted in
+    bulk, with precision decimals for vertices and texture coordinates.
+
+    Args:
+        vertices: array of shape num_vertices x 3
+        faces: array of shape num_faces x 3 (0-based indices)
+        uvs: optional array of shape num_uvs x 2
+        faces_uv: optional array of shape num_faces x 3 (0-based indices)
+    '''
+    if os.path.dirname(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces)
+
+    v_format = "v" + " %.{}f".format(precision) * vertices.shape[1] + "\n"
+    chunks = [(v_format * len(vertices)) % tuple(vertices.ravel().tolist())]
+
+    # Faces are 1-based, not 0-based in obj files
+    if uvs is not None and faces_uv is not None:
+        uvs = np.asarray(uvs)
+        vt_format = "vt" + " %.{}f".format(precision) * uvs.shape[1] + "\n"
+        chunks.append((vt_format * len(uvs)) % tuple(uvs.ravel().tolist()))
+
+        indices = np.stack([faces, np.asarray(faces_uv)], axis=-1) + 1
+        f_format = "f" + " %d/%d" * faces.shape[1] + "\n"
+    else:
+        indices = faces + 1
+        f_format = "f" + " %d" * faces.shape[1] + "\n"
+
+    chunks.append((f_format * len(faces)) % tuple(indices.ravel().tolist()))
+
+    with open(filename, 'w') as fp:
+        fp.write("".join(chunks))
@@ -0,0 +1,113 @@
+import tensorflow as tf
+
+
+# Precisions of the networks supported by load_model
+PRECISIONS = ["float32", "float16", "bfloat16", "int8"]
+
+# Precisions supported by convert_network (Keras runtime). int8 is only 
+# supported by the TFLite runtime (see tflite.py), which runs the products
+# with int8 kernels: dequantizing int8 weights to compute in float32 with
+# Keras is not faster than float32.
+KERAS_PRECISIONS = ["float32", "float16", "bfloat16"]
+
+# Networks converted by model.load_model. They are evaluated per vertex (or
+# per frame and vertex for the decoder output) and dominate the cost. The
+# recurrent regressor and the pose encoder stay in float32: they are cheap,
+# and the errors of the regressor would accumulate in its state.
+NETWORKS = [
+    "garment/decoder",
+    "body/pose_blendshape",
+    "body/shape_blendshape",
+    "body/skinning_weights",
+]
+
+# Flags of /proc/cpuinfo for CPUs with native instructions for each
+# precision (without them, TensorFlow emulates the reduced precision types
+# and they can be slower than float32)
+CPU_FLAGS = {
+    "float16": ["avx512_fp16", "amx_fp16"],
+    "bfloat16": ["avx512_bf16", "amx_bf16"],
+    "int8": ["avx512_vnni", "avx_vnni", "amx_int8"],
+}
+
+
+def cpu_flags():
+    '''Flags of the CPU (empty if /proc/cpuinfo is not available)'''
+    try:
+        with open("/proc/cpuinfo", "r") as fp:
+            for line in fp:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+
+    return set()
+
+
+def cpu_supports(precision):
+    '''Whether the CPU has native instructions for the precision'''
+    if precision == "float32":
+        return True
+
+    return bool(cpu_flags() & set(CPU_FLAGS[precision]))
+
+
+def clone_network(network, clone_layer):
+    '''
+    Clones a Keras network replacing each layer with clone_layer(layer),
+    which returns the new layer and its weights (None to copy them).
+    '''
+    weights = []
+
+    def clone(layer):
+        new_layer, new_weights = clone_layer(layer)
+        weights.append((new_layer, layer.get_weights() if new_weights is None else new_weights))
+        return new_layer
+
+    clone = tf.keras.models.clone_model(network, clone_function=clone)
+    for layer, layer_weights in weights:
+        layer.set_weights(layer_weights)
+
+    return clone
+
+
+def cast_network(network, dtype):
+    '''
+    Clone of a network that computes in dtype (float16 or bfloat16), with
+    float32 weights, inputs and outputs (Keras mixed precision).
+    '''
+    policy = tf.keras.mixed_precision.Policy("mixed_" + dtype)
+
+    def clone_layer(layer):
+        config = layer.get_config()
+        if not isinstance(layer, tf.keras.layers.InputLayer):
+            config["dtype"] = policy
+
+        return layer.__class__.from_config(config), None
+
+    clone = clone_network(network, clone_layer)
+
+    outputs = [
+        tf.keras.layers.Activation("linear", dtype="float32")(output)
+        for output in clone.outputs
+    ]
+
+    return tf.keras.Model(clone.inputs, outputs if len(outputs) > 1 else outputs[0])
+
+
+def convert_network(network, precision):
+    '''
+    Returns a network equivalent to network (a Keras model) that computes
+    with the given precision (see KERAS_PRECISIONS). Inputs and outputs are
+    always float32.
+    '''
+    if precision == "float32":
+        return network
+
+    if precision in ["float16", "bfloat16"]:
+        return cast_network(network, precision)
+
+    if precision == "int8":
+        raise ValueError("Precision 'int8' requires the TFLite runtime (see convert_tflite.py)")
+
+    raise ValueError("Unknown precision '%s' (supported: %s)" % (precision, ", ".join(KERAS_PRECISIONS)))
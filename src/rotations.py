@@ -0,0 +1,293 @@
+import numpy as np
+
+
+# Elementary rotation axes of Euler angle sequences
+AXES = {"x": 0, "y": 1, "z": 2}
+
+
+def axis_angle_to_matrix(axis_angle):
+    '''
+    Converts rotations in axis-angle representation (rotation vectors) to
+    rotation matrices with Rodrigues' formula, R = I + a K + b K^2, where K
+    is the skew-symmetric matrix of the rotation vector, a = sin(angle) / 
+    angle and b = (1 - cos(angle)) / angle^2 = 2 sin(angle / 2)^2 / angle^2
+    (Taylor series for small angles). The elements of R are computed 
+    directly, without building K.
+
+    Args:
+        axis_angle: array of shape ... x 3
+
+    Returns:
+        rotation_matrix: array of shape ... x 3 x 3
+    '''
+    axis_angle = np.asarray(axis_angle)
+    if not np.issubdtype(axis_angle.dtype, np.floating):
+        axis_angle = axis_angle.astype(np.float64)
+
+    x, y, z = axis_angle[..., 0], axis_angle[..., 1], axis_angle[..., 2]
+    xx, yy, zz = x * x, y * y, z * z
+    angle2 = xx + yy + zz
+
+    small = angle2 < 1e-6
+    angle = np.sqrt(np.where(small, 1, angle2))
+
+    a = np.where(small, 1 - angle2 / 6, np.sin(angle) / angle)
+    b = np.where(small, 0.5 - angle2 / 24, 0.5 * (np.sin(angle / 2) / (angle / 2)) ** 2)
+
+    # K^2 = v v^T - angle^2 I
+    bxy, bxz, byz = b * x * y, b * x * z, b * y * z
+    ax, ay, az = a * x, a * y, a * z
+
+    R = np.empty(axis_angle.shape + (3,), dtype=axis_angle.dtype)
+    R[..., 0, 0] = 1 - b * (yy + zz)
+    R[..., 0, 1] = bxy - az
+    R[..., 0, 2] = bxz + ay
+    R[..., 1, 0] = bxy + az
+    R[..., 1, 1] = 1 - b * (xx + zz)
+    R[..., 1, 2] = byz - ax
+    R[..., 2, 0] = bxz - ay
+    R[..., 2, 1] = byz + ax
+    R[..., 2, 2] = 1 - b * (xx + yy)
+
+    return R
+
+
+def matrix_to_quaternion(rotation_matrix):
+    '''
+    Converts rotation matrices to unit quaternions (x, y, z, w) with w >= 0.
+    Each quaternion is computed from the largest of its components, as in
+    scipy's Rotation.from_matrix, so the result is accurate for any angle.
+
+    Args:
+        rotation_matrix: array of shape ... x 3 x 3
+
+    Returns:
+        quaternion: array of shape ... x 4
+    '''
+    R = np.asarray(rotation_matrix)
+    shape = R.shape[:-2]
+    R = R.reshape(-1, 3, 3)
+
+    diagonal = np.diagonal(R, axis1=-2, axis2=-1)
+    trace = diagonal.sum(axis=-1)
+    choice = np.argmax(np.concatenate([diagonal, trace[:, np.newaxis]], axis=-1), axis=-1)
+
+    quaternion = np.empty((len(R), 4), dtype=R.dtype)
+
+    # Largest component is x, y or z
+    rows = np.flatnonzero(choice != 3)
+    i = choice[rows]
+    j = (i + 1) % 3
+    k = (j + 1) % 3
+
+    quaternion[rows, i] = 1 - trace[rows] + 2 * R[rows, i, i]
+    quaternion[rows, j] = R[rows, j, i] + R[rows, i, j]
+    quaternion[rows, k] = R[rows, k, i] + R[rows, i, k]
+    quaternion[rows, 3] = R[rows, k, j] - R[rows, j, k]
+
+    # Largest component is w
+    rows = np.flatnonzero(choice == 3)
+    quaternion[rows, 0] = R[rows, 2, 1] - R[rows, 1, 2]
+    quaternion[rows, 1] = R[rows, 0, 2] - R[rows, 2, 0]
+    quaternion[rows, 2] = R[rows, 1, 0] - R[rows, 0, 1]
+    quaternion[rows, 3] = 1 + trace[rows]
+
+    quaternion /= np.linalg.norm(quaternion, axis=-1, keepdims=True)
+    quaternion *= np.where(quaternion[:, 3:] < 0, -1, 1).astype(R.dtype)
+
+    return quaternion.reshape(shape + (4,))
+
+
+def axis_angle_to_quaternion(axis_angle):
+    '''
+    Converts rotation vectors to unit quaternions (x, y, z, w) with w >= 0.
+
+    Args:
+        axis_angle: array of shape ... x 3
+
+    Returns:
+        quaternion: array of shape ... x 4
+    '''
+    axis_angle = np.asarray(axis_angle)
+    if not np.issubdtype(axis_angle.dtype, np.floating):
+        axis_angle = axis_angle.astype(np.float64)
+
+    angle = np.linalg.norm(axis_angle, axis=-1, keepdims=True)
+
+    # sin(angle / 2) / angle, with its Taylor series for small angles
+    small = angle < 1e-3
+    safe_angle = np.where(small, 1, angle)
+    scale = np.where(small, 0.5 - angle ** 2 / 48, np.sin(safe_angle / 2) / safe_angle)
+
+    quaternion = np.concatenate([scale * axis_angle, np.cos(angle / 2)], axis=-1)
+    quaternion *= np.where(quaternion[..., 3:] < 0, -1, 1).astype(quaternion.dtype)
+
+    return quaternion
+
+
+def slerp(quaternion_a, quaternion_b, t):
+    '''
+    Spherical linear interpolation between unit quaternions, along the
+    shortest arc (from quaternion_a for t = 0 to quaternion_b for t = 1).
+
+    Args:
+        quaternion_a, quaternion_b: arrays of shape ... x 4
+        t: array broadcastable to the batch dimensions (...)
+
+    Returns:
+        quaternion: array of shape ... x 4
+    '''
+    quaternion_a, quaternion_b = np.asarray(quaternion_a), np.asarray(quaternion_b)
+    t = np.asarray(t, dtype=quaternion_a.dtype)[..., np.newaxis]
+
+    cos = (quaternion_a * quaternion_b).sum(axis=-1, keepdims=True)
+    quaternion_b = np.where(cos < 0, -quaternion_b, quaternion_b)
+    cos = np.abs(cos)
+
+    # Linear interpolation (normalized below) for almost equal rotations
+    angle = np.arccos(np.clip(cos, -1, 1))
+    sin = np.sin(angle)
+    small = sin < 1e-6
+    safe_sin = np.where(small, 1, sin)
+    weight_a = np.where(small, 1 - t, np.sin((1 - t) * angle) / safe_sin)
+    weight_b = np.where(small, t, np.sin(t * angle) / safe_sin)
+
+    quaternion = weight_a * quaternion_a + weight_b * quaternion_b
+
+    return quaternion / np.linalg.norm(quaternion, axis=-1, keepdims=True)
+
+
+def quaternion_to_axis_angle(quaternion):
+    '''
+    Converts unit quaternions (x, y, z, w) to rotation vectors with angles
+    in [0, pi].
+
+    Args:
+        quaternion: array of shape ... x 4
+
+    Returns:
+        axis_angle: array of shape ... x 3
+    '''
+    quaternion = np.asarray(quaternion)
+    quaternion = quaternion * np.where(quaternion[..., 3:] < 0, -1, 1).astype(quaternion.dtype)
+
+    sin_half = np.linalg.norm(quaternion[..., :3], axis=-1, keepdims=True)
+    angle = 2 * np.arctan2(sin_half, quaternion[..., 3:])
+
+    # angle / sin(angle / 2), with its Taylor series for small angles
+    small = angle < 1e-3
+    safe_sin_half = np.where(small, 1, sin_half)
+    scale = np.where(
+        small, 2 + angle ** 2 / 12 + 7 * angle ** 4 / 2880, angle / safe_sin_half
+    )
+
+    return scale * quaternion[..., :3]
+
+
+def matrix_to_axis_angle(rotation_matrix):
+    '''
+    Converts rotation matrices to rotation vectors (same result as scipy's
+    Rotation.from_matrix(...).as_rotvec())
+
+    Args:
+        rotation_matrix: array of shape ... x 3 x 3
+
+    Returns:
+        axis_angle: array of shape ... x 3
+    '''
+    return quaternion_to_axis_angle(matrix_to_quaternion(rotation_matrix))
+
+
+def elementary_rotation(angle, axis):
+    '''Rotation matrices of shape ... x 3 x 3 around axis (0, 1 or 2)'''
+    cos, sin = np.cos(angle), np.sin(angle)
+    i, j = (axis + 1) % 3, (axis + 2) % 3
+
+    R = np.zeros(np.shape(angle) + (3, 3), dtype=cos.dtype)
+    R[..., axis, axis] = 1
+    R[..., i, i], R[..., i, j] = cos, -sin
+    R[..., j, i], R[..., j, j] = sin, cos
+
+    return R
+
+
+def euler_to_matrix(angles, seq, degrees=False):
+    '''
+    Converts Euler angles to rotation matrices. As in scipy's Rotation, a
+    lowercase seq (e.g., "zxy") means extrinsic rotations (around the fixed
+    axes) and an uppercase seq (e.g., "ZXY") intrinsic rotations.
+
+    Args:
+        angles: array of shape ... x len(seq)
+        seq: sequence of 1 to 3 axes
+
+    Returns:
+        rotation_matrix: array of shape ... x 3 x 3
+    '''
+    angles = np.asarray(angles, dtype=np.float64)
+    if degrees:
+        angles = np.deg2rad(angles)
+
+    rotations = [
+        elementary_rotation(angles[..., i], AXES[axis.lower()])
+        for i, axis in enumerate(seq)
+    ]
+
+    # Extrinsic rotations are applied from the left
+    if seq.islower():
+        rotations = rotations[::-1]
+
+    R = rotations[0]
+    for rotation in rotations[1:]:
+        R = np.matmul(R, rotation)
+
+    return R
+
+
+def matrix_to_euler(rotation_matrix, seq, degrees=False):
+    '''
+    Converts rotation matrices to Euler angles of a sequence of 3 different
+    axes (same result as scipy's Rotation.from_matrix(...).as_euler(seq)
+    away from gimbal lock).
+
+    Args:
+        rotation_matrix: array of shape ... x 3 x 3
+        seq: sequence of 3 different axes (lowercase for extrinsic,
+            uppercase for intrinsic rotations)
+
+    Returns:
+        angles: array of shape ... x 3
+    '''
+    if seq.isupper():
+        return matrix_to_euler(rotation_matrix, seq.lower()[::-1], degrees)[..., ::-1]
+
+    R = np.asarray(rotation_matrix)
+    i, j, k = [AXES[axis] for axis in seq]
+
+    # +1 for cyclic sequences (xyz, yzx, zxy), -1 for the others
+    sign = 1 if (j - i) % 3 == 1 else -1
+
+    first = np.arctan2(sign * R[..., k, j], R[..., k, k])
+    middle = np.arctan2(-sign * R[..., k, i], np.hypot(R[..., k, j], R[..., k, k]))
+    last = np.arctan2(sign * R[..., j, i], R[..., i, i])
+
+    angles = np.stack([first, middle, last], axis=-1)
+
+    return np.rad2deg(angles) if degrees else angles
+
+
+def compose(rotation_a, rotation_b):
+    '''
+    Composes rotation matrices (rotation_b is applied first), broadcasting
+    over the batch dimensions (e.g., one rotation for all the frames).
+    '''
+    return np.matmul(rotation_a, rotation_b)
+
+
+def compose_axis_angle(rotation, axis_angle):
+    '''
+    Applies a rotation matrix (or a batch of them) to rotations in axis-angle
+    representation of shape ... x 3, and returns the result in axis-angle
+    representation.
+    '''
+    return matrix_to_axis_angle(compose(rotation, axis_angle_to_matrix(axis_angle)))
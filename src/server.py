@@ -0,0 +1,564 @@
+import concurrent.futures
+import copy
+import http.client
+import http.server
+import json
+import queue
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import tensorflow as tf
+
+from . import model
+from . import skinning
+from . import startup
+from . import streaming
+from . import tracing
+
+
+# Size of the frames sent to the server: pose (72) and translation (3), as
+# little-endian float32
+FRAME_SIZE = 72 + 3
+
+# Default maximum number of requests evaluated together, and maximum time
+# (in seconds) that the first request of a batch waits for other requests
+MAX_BATCH_SIZE = 16
+MAX_DELAY = 0.005
+
+# Sessions without requests for this long (in seconds) are removed, checked
+# at most every SWEEP_INTERVAL seconds by the batch loop
+SESSION_TIMEOUT = 600
+SWEEP_INTERVAL = 10
+
+# Content type of the binary payloads (raw little-endian float32 arrays)
+BINARY_CONTENT_TYPE = "application/octet-stream"
+
+
+class Session:
+    '''
+    State of a client sequence: the body shape, the hidden states of the
+    recurrent regressor and the history of the finite differences (as in
+    streaming.StreamingSession).
+    '''
+    def __init__(self, shape):
+        self.id = uuid.uuid4().hex
+        self.shape = np.asarray(shape, dtype=np.float32)
+        self.states = None
+        self.diffs = {}
+        self.num_frames = 0
+        self.last_request = time.time()
+
+
+class Request:
+    def __init__(self, session, pose, translation, return_body=False):
+        self.session = session
+        self.pose = pose
+        self.translation = translation
+        self.return_body = return_body
+        self.time = time.perf_counter()
+        self.future = concurrent.futures.Future()
+
+
+def stack_states(states):
+    '''Stacks the hidden states of several sequences (one row each)'''
+    return [
+        [np.concatenate(layer_states) for layer_states in zip(*layers)]
+        for layers in zip(*states)
+    ]
+
+
+def split_states(states, num_sequences):
+    '''Inverse of stack_states'''
+    return [
+        [[state[i:i + 1] for state in layer] for layer in states]
+        for i in range(num_sequences)
+    ]
+
+
+class InferenceServer:
+    '''
+    Keeps the model loaded and runs the frames sent by several client
+    sessions. Requests are queued and evaluated by a single thread in
+    micro-batches: the first request of a batch waits at most max_delay
+    seconds for requests of other sessions (up to max_batch_size), and all
+    of them go through the networks together.
+
+    The recurrent regressor is run with one row per request (requests with
+    the same number of frames are batched together), with the hidden
+    states of each session, so the output of each session matches the
+    output of run_model over its whole sequence.
+
+    gru is the Keras model of the recurrent regressor (by default, the one
+    in model_dict, which must be given if the model uses the TFLite runtime).
+    '''
+    def __init__(self, model_dict, gru=None, max_batch_size=MAX_BATCH_SIZE,
+                 max_delay=MAX_DELAY, memory_budget=model.DEFAULT_MEMORY_BUDGET):
+        self.model_dict = startup.LazyDict({
+            key: self.loader(model_dict, key) for key in model_dict
+        }, record_timings=False)
+        self.gru = gru if gru is not None else model_dict["garment/gru"]
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.memory_budget = memory_budget
+
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.last_sweep = time.time()
+        self.regressors = {}
+        self.queue = queue.Queue()
+        self.stats = {"batches": 0, "requests": 0, "frames": 0, "busy_seconds": 0.0}
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    @staticmethod
+    def loader(model_dict, key):
+        # Call Keras networks directly (see streaming.DirectPredictor)
+        def load():
+            network = model_dict[key]
+            if key in streaming.DIRECT_CALL_MODELS and isinstance(network, tf.keras.Model):
+                return streaming.DirectPredictor(network)
+            return network
+
+        return load
+
+
+    def regressor(self, batch_size):
+        '''Stateful copy of the regressor for batch_size sequences'''
+        if batch_size not in self.regressors:
+            self.regressors[batch_size] = streaming.StatefulRegressor(self.gru, batch_size)
+
+        return self.regressors[batch_size]
+
+
+    def warm_up(self, frames_per_request=1):
+        '''
+        Loads the networks and runs the sizes of the batches of up to
+        max_batch_size requests of frames_per_request frames: the
+        regressors of every batch size, and the skinning of every padded
+        number of frames (see skinning.batch_bucket), so that the first
+        batches of each size are not slower.
+        '''
+        max_frames = self.max_batch_size * frames_per_request
+        num_frames = sorted({skinning.batch_bucket(n) for n in range(1, max_frames + 1)})
+
+        session = self.create_session(np.zeros(10))
+        for n in num_frames:
+            self.submit(session.id, np.zeros((n, 72)), np.zeros((n, 3))).result()
+        self.close_session(session.id)
+
+        for batch_size in range(1, self.max_batch_size + 1):
+            self.regressor(batch_size)({
+                key: np.zeros((batch_size, frames_per_request, tensor.shape[-1]), dtype=np.float32)
+                for key, tensor in self.gru.input.items()
+            })
+
+
+    def sweep_sessions(self):
+        '''Removes the sessions without requests for SESSION_TIMEOUT seconds'''
+        now = time.time()
+        self.last_sweep = now
+
+        with self.sessions_lock:
+            for session_id, session in list(self.sessions.items()):
+                if now - session.last_request > SESSION_TIMEOUT:
+                    del self.sessions[session_id]
+
+
+    def create_session(self, shape):
+        self.sweep_sessions()
+
+        with self.sessions_lock:
+            session = Session(shape)
+            self.sessions[session.id] = session
+
+        return session
+
+
+    def close_session(self, session_id):
+        with self.sessions_lock:
+            return self.sessions.pop(session_id, None) is not None
+
+
+    def submit(self, session_id, pose, translation, return_body=False):
+        '''
+        Queues frames of a session.
+
+        Args:
+            pose: array of shape num_frames x 72
+            translation: array of shape num_frames x 3
+
+        Returns:
+            future: concurrent.futures.Future with v_garment (and v_body if
+                return_body is True)
+        '''
+        with self.sessions_lock:
+            session = self.sessions.get(session_id)
+
+        if session is None:
+            raise KeyError("Unknown session " + session_id)
+
+        session.last_request = time.time()
+        request = Request(
+            session, np.asarray(pose, dtype=np.float32).reshape(-1, 72),
+            np.asarray(translation, dtype=np.float32).reshape(-1, 3), return_body
+        )
+        self.queue.put(request)
+
+        return request.future
+
+
+    def next_batch(self, pending):
+        '''
+        Collects the requests of the next batch: the first one (waiting if
+        needed) and the ones that arrive before its deadline. Requests of a
+        session that is already in the batch are deferred to the next one,
+        so the frames of each session are processed in order.
+        '''
+        requests = pending[:] or [self.queue.get()]
+        del pending[:]
+
+        deadline = requests[0].time + self.max_delay
+        while len(requests) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                requests.append(self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        batch, sessions = [], set()
+        for request in requests:
+            if request.session.id in sessions or len(batch) == self.max_batch_size:
+                pending.append(request)
+                continue
+
+            sessions.add(request.session.id)
+            batch.append(request)
+
+        return batch
+
+
+    def run(self):
+        pending = []
+        while True:
+            self.run_batch(self.next_batch(pending))
+
+            if time.time() - self.last_sweep > SWEEP_INTERVAL:
+                self.sweep_sessions()
+
+
+    def run_batch(self, batch):
+        start = time.perf_counter()
+
+        try:
+            results = self.process(batch)
+        except Exception as e:
+            # process only updates the sessions if the whole batch succeeds,
+            # so its requests can run again one by one and only the ones 
+            # that fail on their own get the error
+            if len(batch) > 1:
+                for request in batch:
+                    self.run_batch([request])
+            else:
+                batch[0].future.set_exception(e)
+            return
+
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
+
+        self.stats["batches"] += 1
+        self.stats["requests"] += len(batch)
+        self.stats["frames"] += sum(len(request.pose) for request in batch)
+        self.stats["busy_seconds"] += time.perf_counter() - start
+
+
+    def process(self, requests):
+        '''
+        Runs the frames of a batch of requests (one per session). The
+        finite differences and hidden states of the sessions are updated
+        only if the whole batch succeeds.
+        '''
+        lengths = [len(request.pose) for request in requests]
+        offsets = np.cumsum([0] + lengths)
+        pose = np.concatenate([request.pose for request in requests])
+        translation = np.concatenate([request.translation for request in requests])
+        shape = np.concatenate([
+            np.tile(request.session.shape, (length, 1))
+            for request, length in zip(requests, lengths)
+        ])
+
+        with tracing.span("server_batch", requests=len(requests), frames=len(pose)):
+            pose_encoded = self.model_dict["body/pose_encoder"].predict(pose[:, 3:])
+
+            inputs, diffs = [], []
+            for i, request in enumerate(requests):
+                frames = slice(offsets[i], offsets[i + 1])
+                motion = {"pose": request.pose, "translation": request.translation}
+                diffs.append(copy.deepcopy(request.session.diffs))
+                features = model.compute_features(
+                    self.model_dict, motion, diffs[i], pose_encoded[frames]
+                )
+                inputs.append(model.regressor_inputs(request.session.shape, features))
+
+            # Recurrent regressor, one row per request of the same length
+            v_encoded = [None] * len(requests)
+            states = [None] * len(requests)
+            for length in sorted(set(lengths)):
+                group = [i for i, n in enumerate(lengths) if n == length]
+                regressor = self.regressor(len(group))
+
+                regressor.set_states(None)
+                zero_states = split_states(regressor.get_states(), 1)[0]
+                regressor.set_states(stack_states([
+                    requests[i].session.states or zero_states for i in group
+                ]))
+
+                outputs = regressor({
+                    key: np.concatenate([inputs[i][key] for i in group])
+                    for key in model.REGRESSOR_FEATURES + ["shape"]
+                })
+
+                for i, group_states, output in zip(group, split_states(regressor.get_states(), len(group)), outputs):
+                    states[i] = group_states
+                    v_encoded[i] = output
+
+            v_garment, v_body = model.run_body_and_garment(
+                self.model_dict, np.concatenate(v_encoded), shape, pose, translation,
+                self.memory_budget
+            )
+
+        results = []
+        for i, request in enumerate(requests):
+            frames = slice(offsets[i], offsets[i + 1])
+            request.session.diffs = diffs[i]
+            request.session.states = states[i]
+            request.session.num_frames += lengths[i]
+            results.append((v_garment[frames], v_body[frames]) if request.return_body else v_garment[frames])
+
+        return results
+
+
+    def status(self):
+        stats = dict(self.stats)
+        stats["sessions"] = len(self.sessions)
+        stats["queued"] = self.queue.qsize()
+        stats["mean_batch_size"] = stats["requests"] / max(stats["batches"], 1)
+
+        return stats
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    HTTP interface of InferenceServer:
+
+        POST /sessions                    {"shape": [10 values]} -> {"session": id, ...}
+        POST /sessions/<id>/frames[?body=1]
+            binary num_frames x 75 float32 (pose and translation)
+            -> binary num_frames x num_garment_vertices x 3 float32 (followed
+               by the body vertices with body=1)
+        DELETE /sessions/<id>
+        GET /status                       -> statistics of the batches
+    '''
+    protocol_version = "HTTP/1.1"
+    server_version = "GarmentServer/1.0"
+
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super(RequestHandler, self).log_message(format, *args)
+
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else "unix"
+
+
+    def send(self, code, body, content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/status":
+            return self.send(200, self.server.inference.status())
+
+        self.send(404, {"error": "Not found"})
+
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        inference = self.server.inference
+
+        if parts == ["sessions"]:
+            try:
+                shape = json.loads(self.read_body() or b"{}").get("shape", np.zeros(10).tolist())
+            except ValueError:
+                return self.send(400, {"error": "Invalid JSON"})
+
+            session = inference.create_session(shape)
+            return self.send(200, {"session": session.id})
+
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "frames":
+            body = self.read_body()
+            if len(body) % (4 * FRAME_SIZE):
+                return self.send(400, {"error": "Expected frames of %d float32 values" % FRAME_SIZE})
+
+            frames = np.frombuffer(body, dtype="<f4").reshape(-1, FRAME_SIZE)
+            return_body = parse_qs(url.query).get("body", ["0"])[0] == "1"
+
+            try:
+                result = inference.submit(parts[1], frames[:, :72], frames[:, 72:], return_body).result()
+            except KeyError as e:
+                return self.send(404, {"error": str(e)})
+            except Exception as e:
+                return self.send(500, {"error": repr(e)})
+
+            v_garment, v_body = result if return_body else (result, None)
+            headers = {"X-Frames": len(frames), "X-Garment-Vertices": v_garment.shape[1]}
+            payload = v_garment.astype("<f4").tobytes()
+            if v_body is not None:
+                headers["X-Body-Vertices"] = v_body.shape[1]
+                payload += v_body.astype("<f4").tobytes()
+
+            return self.send(200, payload, BINARY_CONTENT_TYPE, headers)
+
+        self.send(404, {"error": "Not found"})
+
+
+    def do_DELETE(self):
+        parts = urlparse(self.path).path.strip("/").split("/")
+
+        if len(parts) == 2 and parts[0] == "sessions" and self.server.inference.close_session(parts[1]):
+            return self.send(200, {"session": parts[1]})
+
+        self.send(404, {"error": "Unknown session"})
+
+
+class TCPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(inference, host="127.0.0.1", port=8000, socket_path=None, verbose=False):
+    '''HTTP server on a TCP port or on a Unix socket (if socket_path is given)'''
+    if socket_path:
+        server = UnixServer(socket_path, RequestHandler)
+    else:
+        server = TCPServer((host, port), RequestHandler)
+
+    server.inference = inference
+    server.verbose = verbose
+
+    return server
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super(UnixHTTPConnection, self).__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class Client:
+    '''
+    Client of a server session (one connection per client, kept alive).
+
+    Example:
+        client = Client(port=8000)
+        client.create_session(shape)
+        for pose, translation in frames:
+            v_garment = client.step(pose, translation)
+        client.close()
+    '''
+    def __init__(self, host="127.0.0.1", port=8000, socket_path=None, timeout=60):
+        if socket_path:
+            self.connection = UnixHTTPConnection(socket_path, timeout)
+        else:
+            self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+        self.session = None
+
+
+    def request(self, method, path, body=None, content_type="application/json"):
+        headers = {"Content-Type": content_type} if body is not None else {}
+        self.connection.request(method, path, body, headers)
+        response = self.connection.getresponse()
+        payload = response.read()
+
+        if response.status != 200:
+            raise RuntimeError("%s %s: %s" % (method, path, payload.decode("utf-8", "replace")))
+
+        return response, payload
+
+
+    def create_session(self, shape):
+        _, payload = self.request(
+            "POST", "/sessions", json.dumps({"shape": np.asarray(shape).tolist()})
+        )
+        self.session = json.loads(payload)["session"]
+
+        return self.session
+
+
+    def step(self, pose, translation, return_body=False):
+        '''
+        Sends frames (pose of shape 72 or num_frames x 72, translation of
+        shape 3 or num_frames x 3) and returns the garment vertices (and the
+        body vertices with return_body).
+        '''
+        pose = np.reshape(pose, (-1, 72))
+        frames = np.concatenate([pose, np.reshape(translation, (-1, 3))], axis=1)
+
+        path = "/sessions/%s/frames%s" % (self.session, "?body=1" if return_body else "")
+        response, payload = self.request(
+            "POST", path, frames.astype("<f4").tobytes(), BINARY_CONTENT_TYPE
+        )
+
+        num_frames = int(response.getheader("X-Frames"))
+        num_garment_vertices = int(response.getheader("X-Garment-Vertices"))
+        vertices = np.frombuffer(payload, dtype="<f4")
+
+        size = num_frames * num_garment_vertices * 3
+        v_garment = vertices[:size].reshape(num_frames, num_garment_vertices, 3)
+        if not return_body:
+            return v_garment
+
+        return v_garment, vertices[size:].reshape(num_frames, -1, 3)
+
+
+    def status(self):
+        _, payload = self.request("GET", "/status")
+        return json.loads(payload)
+
+
+    def close(self):
+        if self.session is not None:
+            self.request("DELETE", "/sessions/" + self.session)
+            self.session = None
+
+        self.connection.close()
@@ -1,6 +1,18 @@
+import numpy as np
 import tensorflow as tf
 import tensorflow.keras as keras
 
+from .skinning_numpy import kinematic_levels
+
+
+# LBS pads the batch (frames) to BUCKETS_PER_OCTAVE sizes per power of two
+# (see batch_bucket), so that XLA compiles the skinning functions for a few
+# batch sizes instead of once per number of frames (about 150ms per
+# compilation, against a few ms per call). With 4 sizes, at most 25% of
+# the frames are padding, and multiples of 32 frames up to 256 (the blocks
+# of model.frame_block_size) are not padded.
+BUCKETS_PER_OCTAVE = 4
+
 
 class PoseSkeleton(keras.layers.Layer):
     def __init__(self, **kwargs):
@@ -11,6 +23,11 @@ class PoseSkeleton(keras.layers.Layer):
         """
         Computes absolute joint locations given pose.
 
+        The joints are composed with their parents one level of the tree at
+        a time (i.e., all the joints at the same depth at once), so the 
+        number of operations depends on the depth of the tree instead of the
+        number of joints.
+
         Args:
             joint_rotations: batch_size x K x 3 x 3 rotation vector of K joints
             joint_positions: batch_size x K x 3, joint locations before posing
@@ -22,35 +39,35 @@ class PoseSkeleton(keras.layers.Layer):
         """
         batch_size = tf.shape(joint_rotations)[0]
         num_joints = len(parents)
-
-        def make_affine(rotation, translation, name=None):
-            '''
-            Args:
-                rotation: batch_size x 3 x 3
-                translation: batch_size x 3 x 1
-            '''
-            rotation_homo = tf.pad(rotation, [[0, 0], [0, 1], [0, 0]])
-            translation_homo = tf.concat([translation, tf.ones([batch_size, 1, 1])], 1)
-            affine_transform = tf.concat([rotation_homo, translation_homo], 2)
-            return affine_transform
-
-        joint_positions = tf.expand_dims(joint_positions, axis=-1)      
-        root_rotation = joint_rotations[:, 0, :, :]
-        root_transform = make_affine(root_rotation, joint_positions[:, 0])
-
-        # Traverse joints to compute global transformations
-        transforms = [root_transform]
-        for joint, parent in enumerate(parents[1:], start=1):
-            position = joint_positions[:, joint] - joint_positions[:, parent]
-            transform_local = make_affine(joint_rotations[:, joint], position)
-            transform_global = tf.matmul(transforms[parent], transform_local)
-            transforms.append(transform_global)
-        transforms = tf.stack(transforms, axis=1) 
+        levels, parent_slots = kinematic_levels(parents)
+
+        # Joint positions relative to their parents (absolute for the root)
+        parents = np.asarray(parents).astype(np.int64)
+        has_parent = (parents >= 0) & (parents < num_joints)
+        parent_positions = tf.gather(joint_positions, np.where(has_parent, parents, 0), axis=1)
+        positions = joint_positions - parent_positions * has_parent[:, np.newaxis].astype(np.float32)
+
+        # Local transforms of all the joints: batch_size x K x 4 x 4
+        rotation_homo = tf.pad(joint_rotations, [[0, 0], [0, 0], [0, 1], [0, 0]])
+        translation_homo = tf.concat([positions, tf.ones([batch_size, num_joints, 1])], 2)
+        transforms_local = tf.concat([rotation_homo, translation_homo[..., tf.newaxis]], 3)
+
+        # Traverse the tree by levels to compute global transformations
+        transforms = [tf.gather(transforms_local, levels[0], axis=1)]
+        for level, slots in zip(levels[1:], parent_slots[1:]):
+            transforms_parent = tf.gather(transforms[-1], slots, axis=1)
+            transforms.append(tf.matmul(
+                transforms_parent, tf.gather(transforms_local, level, axis=1)
+            ))
+
+        order = np.concatenate(levels)
+        transforms = tf.gather(tf.concat(transforms, axis=1), np.argsort(order), axis=1)
 
         # Extract joint positions
         joint_positions_posed = transforms[:, :, :3, 3]
 
         # Compute affine transforms relative to initial state (i.e., t-pose)
+        joint_positions = tf.expand_dims(joint_positions, axis=-1)
         zeros = tf.zeros([batch_size, num_joints, 1, 1])
         joint_rest_positions = tf.concat([joint_positions, zeros], axis=2)
         init_bone = tf.matmul(transforms, joint_rest_positions)
@@ -60,30 +77,173 @@ class PoseSkeleton(keras.layers.Layer):
         return joint_transforms, joint_positions_posed
 
 
+@tf.function(jit_compile=True)
+def top_k_weights(skinning_weights, top_k):
+    '''
+    Keeps the top_k largest skinning weights of each vertex. The joints are
+    selected with top_k passes of argmax, which is faster than tf.math.top_k 
+    for the few joints of a skeleton.
+
+    Returns:
+        weights: ... x num_vertices x top_k, renormalized to sum to 1
+        indices: ... x num_vertices x top_k, joint of each weight
+        kept: ... x num_vertices, sum of the weights before renormalization
+    '''
+    weights, indices = [], []
+    for _ in range(top_k):
+        index = tf.argmax(skinning_weights, axis=-1, output_type=tf.int32)
+        weights.append(tf.reduce_max(skinning_weights, axis=-1))
+        indices.append(index)
+
+        selected = tf.one_hot(index, skinning_weights.shape[-1], on_value=True, off_value=False)
+        skinning_weights = tf.where(selected, -1.0, skinning_weights)
+
+    weights = tf.stack(weights, axis=-1)
+    kept = tf.reduce_sum(weights, axis=-1)
+
+    return weights / kept[..., tf.newaxis], tf.stack(indices, axis=-1), kept
+
+
+def top_k_error_bound(vertices, joint_rotations, skinning_weights, top_k):
+    '''
+    Upper bound of the distance between each vertex skinned with the top_k
+    joints of largest weight (LBS(top_k)) and with all the joints.
+
+    Let s be the sum of the kept weights of a vertex and x_j the vertex
+    transformed by joint j. The difference between both results is 
+    (1 - s) times the difference between the weighted mean of x_j over the
+    kept joints and over the dropped joints, so it is at most (1 - s) times
+    the diameter of the points x_j of the joints with non-zero weight, 
+    which is at most twice their largest distance to the dense result.
+
+    Args:
+        vertices: batch_size x num_vertices x 3
+        joint_rotations: batch_size x K x 4 x 4 joint transforms
+        skinning_weights: num_vertices x K, or batch_size x num_vertices x K
+
+    Returns:
+        bound: batch_size x num_vertices
+    '''
+    skinning_weights = tf.convert_to_tensor(skinning_weights, vertices.dtype)
+    _, _, kept = top_k_weights(skinning_weights, top_k)
+
+    # Vertices transformed by each joint: batch_size x num_vertices x K x 3
+    x = tf.einsum("bkij,bvj->bvki", joint_rotations[:, :, :3, :3], vertices)
+    x += joint_rotations[:, tf.newaxis, :, :3, 3]
+
+    skinned = LBS()(vertices, joint_rotations, skinning_weights)
+    radius = tf.norm(x - skinned[:, :, tf.newaxis], axis=-1)
+    radius = tf.reduce_max(tf.where(skinning_weights > 0, radius, 0.0), axis=-1)
+
+    return 2.0 * (1.0 - kept) * radius
+
+
+@tf.function(jit_compile=True)
+def blend_transforms(joint_rotations, skinning_weights, joint_indices=None):
+    '''
+    Blends the affine part of the joint transforms per vertex, with all the
+    joints or (given joint_indices) with the joints in joint_indices.
+
+    Args:
+        joint_rotations: batch_size x K x 4 x 4 joint transforms
+        skinning_weights: [batch_size x] num_vertices x K, or 
+            [batch_size x] num_vertices x k with joint_indices
+        joint_indices: [batch_size x] num_vertices x k joint of each weight
+
+    Returns:
+        transforms: batch_size x num_vertices x 4 x 3, with the columns of 
+            the rotation and the translation of each vertex in the rows
+    '''
+    num_joints = joint_rotations.shape[1]
+    batched = len(skinning_weights.shape) == 3
+
+    A = tf.transpose(joint_rotations[:, :, :3, :], [0, 1, 3, 2])
+    A = tf.reshape(A, (-1, num_joints, 12))
+
+    if joint_indices is None:
+        if not batched:
+            shape = tf.concat([tf.shape(A)[:1], tf.shape(skinning_weights)], axis=0)
+            skinning_weights = tf.broadcast_to(skinning_weights, shape)
+
+        T = tf.matmul(skinning_weights, A)
+    else:
+        T = 0.0
+        for i in range(joint_indices.shape[-1]):
+            A_i = tf.gather(A, joint_indices[..., i], axis=1, batch_dims=int(batched))
+            T += skinning_weights[..., i:i + 1] * A_i
+
+    return tf.reshape(T, (tf.shape(A)[0], -1, 4, 3))
+
+
+@tf.function(jit_compile=True)
+def apply_transforms(vertices, transforms):
+    '''Applies the transforms of blend_transforms to the vertices'''
+    return tf.reduce_sum(transforms[:, :, :3] * vertices[..., tf.newaxis], axis=2) + transforms[:, :, 3]
+
+
+def batch_bucket(batch_size):
+    '''Padded batch size of LBS: the next m * 2^e with BUCKETS_PER_OCTAVE <= m < 2 * BUCKETS_PER_OCTAVE'''
+    exponent = max(0, int(batch_size).bit_length() - BUCKETS_PER_OCTAVE.bit_length())
+    return -(-batch_size >> exponent) << exponent
+
+
+def pad_batch(x, batch_size):
+    '''Pads the first dimension of x with zeros up to batch_size'''
+    padding = [[0, batch_size - x.shape[0]]] + [[0, 0]] * (len(x.shape) - 1)
+    return tf.pad(x, padding)
+
+
 class LBS(keras.layers.Layer):
-    def __init__(self, **kwargs):
+    '''
+    Linear blend skinning.
+
+    The 3 x 4 affine part of the joint transforms is blended per vertex and
+    applied directly to the vertices, without 4 x 4 matrices, homogeneous
+    coordinates or copies of the skinning weights per frame. Both steps 
+    are compiled with XLA, which fuses them into a few passes over memory.
+    The frames are padded to a few batch sizes (see batch_bucket), so that
+    new numbers of frames (e.g., the chunks of streaming sessions) do not
+    compile them again.
+
+    With top_k, only the top_k joints with the largest weights of each 
+    vertex are blended, with their weights renormalized to sum to 1. The
+    error with respect to all the joints is bounded by top_k_error_bound 
+    (see benchmarks/benchmark_skinning.py).
+    '''
+    def __init__(self, top_k=None, **kwargs):
         super(LBS, self).__init__(**kwargs)
+        self.top_k = top_k
 
 
     def call(self, vertices, joint_rotations, skinning_weights):
+        """
+        Args:
+            vertices: batch_size x num_vertices x 3
+            joint_rotations: batch_size x K x 4 x 4 joint transforms
+            skinning_weights: num_vertices x K (shared by the batch), or 
+                batch_size x num_vertices x K
+
+        Returns:
+            skinned_vertices: batch_size x num_vertices x 3
+        """
+        vertices = tf.convert_to_tensor(vertices, self.dtype)
+        joint_rotations = tf.convert_to_tensor(joint_rotations, self.dtype)
         skinning_weights = tf.convert_to_tensor(skinning_weights, self.dtype)
+        joint_indices = None
+
+        # The batch size is unknown when LBS is traced in a graph (e.g., 
+        # graph.GarmentModel), which is compiled as a whole
+        batch_size = vertices.shape[0]
+        if batch_size is not None and batch_bucket(batch_size) != batch_size:
+            padded_size = batch_bucket(batch_size)
+            vertices = pad_batch(vertices, padded_size)
+            joint_rotations = pad_batch(joint_rotations, padded_size)
+            if len(skinning_weights.shape) == 3:
+                skinning_weights = pad_batch(skinning_weights, padded_size)
+
+        if self.top_k is not None and self.top_k < skinning_weights.shape[-1]:
+            skinning_weights, joint_indices, _ = top_k_weights(skinning_weights, self.top_k)
+
+        transforms = blend_transforms(joint_rotations, skinning_weights, joint_indices)
 
-        batch_size = tf.shape(vertices)[0]
-        num_joints = skinning_weights.shape[-1]
-        num_vertices = vertices.shape[-2]
-   
-        W = skinning_weights
-        if len(skinning_weights.shape.as_list()) < len(vertices.shape.as_list()):
-            W = tf.tile(tf.convert_to_tensor(skinning_weights), [batch_size, 1])
-            W = tf.reshape(W, [batch_size, skinning_weights.shape[-2], num_joints])    
- 
-        A = tf.reshape(joint_rotations, (-1, num_joints, 16))
-        T = tf.matmul(W, A)
-        T = tf.reshape(T, (-1, num_vertices, 4, 4))
-
-        ones = tf.ones([batch_size, num_vertices, 1])
-        vertices_homo = tf.concat([vertices, ones], axis=2)
-        skinned_homo = tf.matmul(T, tf.expand_dims(vertices_homo, -1))
-        skinned_vertices = skinned_homo[:, :, :3, 0]
-
-        return skinned_vertices
+        return apply_transforms(vertices, transforms)[:batch_size]
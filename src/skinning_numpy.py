@@ -0,0 +1,127 @@
+import numpy as np
+
+
+def kinematic_levels(parents):
+    '''
+    Groups the joints of a kinematic tree by depth.
+
+    Args:
+        parents: vector of size K holding the parent id for each joint (the
+            root has an id out of range, e.g., -1)
+
+    Returns:
+        levels: list with the joints at each depth, starting with the root
+        parent_slots: list with the position of the parent of each joint of
+            a level in the previous level (None for the root)
+    '''
+    parents = np.asarray(parents).astype(np.int64)
+    num_joints = len(parents)
+
+    depth = np.zeros(num_joints, dtype=np.int64)
+    for joint, parent in enumerate(parents):
+        if 0 <= parent < num_joints:
+            depth[joint] = depth[parent] + 1
+
+    levels = [np.flatnonzero(depth == d) for d in range(depth.max() + 1)]
+
+    parent_slots = [None]
+    for previous, level in zip(levels[:-1], levels[1:]):
+        parent_slots.append(np.searchsorted(previous, parents[level]))
+
+    return levels, parent_slots
+
+
+def pose_skeleton(joint_rotations, joint_positions, parents):
+    """
+    NumPy version of skinning.PoseSkeleton.
+
+    Args:
+        joint_rotations: batch_size x K x 3 x 3 rotation matrices of K joints
+        joint_positions: batch_size x K x 3, joint locations before posing
+        parents: vector of size K holding the parent id for each joint
+
+    Returns
+        joint_transforms: batch_size x K x 4 x 4 relative joint transformations for LBS.
+        joint_positions_posed: batch_size x K x 3, joint locations after posing
+    """
+    joint_rotations = np.asarray(joint_rotations, dtype=np.float32)
+    joint_positions = np.asarray(joint_positions, dtype=np.float32)
+
+    batch_size, num_joints = joint_rotations.shape[:2]
+    levels, _ = kinematic_levels(parents)
+
+    # Joint positions relative to their parents (absolute for the root)
+    parents = np.asarray(parents).astype(np.int64)
+    has_parent = (parents >= 0) & (parents < num_joints)
+    parent_positions = joint_positions[:, np.where(has_parent, parents, 0)]
+    positions = joint_positions - parent_positions * has_parent[:, np.newaxis].astype(np.float32)
+
+    # Local transforms of all the joints: batch_size x K x 4 x 4
+    transforms_local = np.zeros((batch_size, num_joints, 4, 4), dtype=np.float32)
+    transforms_local[:, :, :3, :3] = joint_rotations
+    transforms_local[:, :, :3, 3] = positions
+    transforms_local[:, :, 3, 3] = 1.0
+
+    # Traverse the tree by levels to compute global transformations
+    transforms = transforms_local.copy()
+    for level in levels[1:]:
+        transforms[:, level] = np.matmul(
+            transforms[:, parents[level]], transforms_local[:, level]
+        )
+
+    # Extract joint positions
+    joint_positions_posed = transforms[:, :, :3, 3].copy()
+
+    # Compute affine transforms relative to initial state (i.e., t-pose)
+    init_bone = np.matmul(transforms[:, :, :3, :3], joint_positions[..., np.newaxis])
+    joint_transforms = transforms
+    joint_transforms[:, :, :3, 3] -= init_bone[..., 0]
+
+    return joint_transforms, joint_positions_posed
+
+
+def top_k_weights(skinning_weights, top_k):
+    '''NumPy version of skinning.top_k_weights'''
+    indices = np.argsort(-skinning_weights, axis=-1, kind="stable")[..., :top_k]
+    weights = np.take_along_axis(skinning_weights, indices, axis=-1)
+    kept = weights.sum(axis=-1)
+
+    return weights / kept[..., np.newaxis], indices.astype(np.int32), kept
+
+
+def lbs(vertices, joint_rotations, skinning_weights, top_k=None):
+    """
+    NumPy version of skinning.LBS.
+
+    Args:
+        vertices: batch_size x num_vertices x 3
+        joint_rotations: batch_size x K x 4 x 4 joint transforms
+        skinning_weights: num_vertices x K (shared by the batch), or 
+            batch_size x num_vertices x K
+        top_k: number of joints blended per vertex, None for all
+
+    Returns:
+        skinned_vertices: batch_size x num_vertices x 3
+    """
+    vertices = np.asarray(vertices, dtype=np.float32)
+    joint_rotations = np.asarray(joint_rotations, dtype=np.float32)
+    skinning_weights = np.asarray(skinning_weights, dtype=np.float32)
+
+    batch_size, num_joints = joint_rotations.shape[:2]
+
+    # Columns of the rotation and translation of each joint: batch_size x K x 12
+    A = joint_rotations[:, :, :3, :].transpose(0, 1, 3, 2).reshape(batch_size, num_joints, 12)
+
+    if top_k is None or top_k >= num_joints:
+        T = np.matmul(skinning_weights, A)
+    else:
+        weights, indices, _ = top_k_weights(skinning_weights, top_k)
+        batch = np.arange(batch_size)[:, np.newaxis]
+
+        T = 0.0
+        for i in range(top_k):
+            T = T + weights[..., i:i + 1] * A[batch, indices[..., i]]
+
+    T = T.reshape(batch_size, -1, 4, 3)
+
+    return np.einsum("bvij,bvi->bvj", T[:, :, :3], vertices) + T[:, :, 3]
@@ -1,19 +1,20 @@
-import pickle
-
 import numpy as np
 import tensorflow as tf
 import tensorflow.keras as keras
 
+from . import cache
+from . import io
 from . import math
 from . import skinning
+from .smpl_numpy import SHAPE_CACHE_SIZE
 
 
 class SMPL(keras.layers.Layer):
-    def __init__(self, model_path, name="smpl", **kwargs):
+    def __init__(self, model_path, name="smpl", shape_cache_size=SHAPE_CACHE_SIZE,
+                 top_k=None, **kwargs):
         super(SMPL, self).__init__(name=name, **kwargs)
 
-        with open(model_path, 'rb') as f:
-            dd = pickle.load(f, encoding='latin1')
+        dd = io.load_smpl_model(model_path)
 
         self.num_shapes = dd['shapedirs'].shape[-1]
         self.num_vertices = dd["v_template"].shape[-2]
@@ -51,15 +52,51 @@ class SMPL(keras.layers.Layer):
         )
 
         self.joint_regressor = tf.convert_to_tensor(
-            value=dd["J_regressor"].T.todense(),
+            value=dd["J_regressor"].T,
             dtype=self.dtype,
             name="joint_regressor"
         )
 
         self.kintree_table = dd['kintree_table'][0].astype(np.int32)
 
+        self.shape_cache = cache.LRUCache(shape_cache_size)
 
-    def call(self, shape=None, pose=None, translation=None):
+        # Joints blended per vertex (see skinning.LBS), None for all
+        self.top_k = top_k
+
+
+    def shaped(self, shape):
+        '''
+        Computes the quantities that only depend on the shape of the subject:
+        the shape blendshape, the shaped rest vertices and the rest joint
+        locations. They are cached by shape coefficients, so they are 
+        computed once per subject and reused across frames and sequences.
+
+        Args:
+            shape: array of shape 10
+
+        Returns:
+            shaped_dict: dictionary with the tensors "shape_blendshape" and 
+                "vertices_shaped" of shape 1 x num_vertices x 3 and 
+                "joint_locations_local" of shape 1 x num_joints x 3
+        '''
+        shape = np.asarray(shape, dtype=self.dtype).reshape(1, self.num_shapes)
+        key = shape.tobytes()
+
+        shaped_dict = self.shape_cache.get(key)
+        if shaped_dict is None:
+            shape_blendshape, vs, joint_locations_local = self.compute_shaped(shape)
+            shaped_dict = {
+                "shape_blendshape": shape_blendshape,
+                "vertices_shaped": vs,
+                "joint_locations_local": joint_locations_local
+            }
+            self.shape_cache.put(key, shaped_dict)
+
+        return shaped_dict
+
+
+    def compute_shaped(self, shape):
         # Add shape blenshape
         shape_blendshape = tf.reshape(
             tensor=tf.matmul(shape, self.shapedirs),
@@ -67,14 +104,9 @@ class SMPL(keras.layers.Layer):
             name="shape_blendshape"
         )
 
-        vs = self.template_vertices + shape_blendshape  
-
-        if pose is None:
-            return vs, tf.zeros((self.num_joints, 4, 4))
+        vs = self.template_vertices + shape_blendshape
 
-        # Compute local joint locations and rotations
-        pose = tf.reshape(pose, [-1, self.num_joints, 3])
-        joint_rotations_local = math.AxisAngleToMatrix()(pose)
+        # Compute local joint locations
         joint_locations_local = tf.stack(
             values=[
                 tf.matmul(vs[:, :, 0], self.joint_regressor),
@@ -85,6 +117,43 @@ class SMPL(keras.layers.Layer):
             name="joint_locations_local"
         )
 
+        return shape_blendshape, vs, joint_locations_local
+
+
+    def call(self, shape=None, pose=None, translation=None):
+        '''
+        Poses the body model.
+
+        A shape of shape 10 (i.e., the same subject in all the frames) uses
+        the cached shape-only quantities when running eagerly (see shaped),
+        and the shaped vertices and shape blendshape of the output have a 
+        batch size of 1. A shape of shape batch_size x 10 computes them for
+        every frame.
+        '''
+        single_subject = shape.shape.rank == 1
+
+        if single_subject and tf.executing_eagerly():
+            shaped_dict = self.shaped(shape)
+            shape_blendshape = shaped_dict["shape_blendshape"]
+            vs = shaped_dict["vertices_shaped"]
+            joint_locations_local = shaped_dict["joint_locations_local"]
+        else:
+            shape_blendshape, vs, joint_locations_local = self.compute_shaped(
+                tf.reshape(shape, [-1, self.num_shapes])
+            )
+
+        if single_subject and pose is not None:
+            joint_locations_local = tf.tile(
+                joint_locations_local, [tf.shape(pose)[0], 1, 1]
+            )
+
+        if pose is None:
+            return vs, tf.zeros((self.num_joints, 4, 4))
+
+        # Compute local joint rotations
+        pose = tf.reshape(pose, [-1, self.num_joints, 3])
+        joint_rotations_local = math.AxisAngleToMatrix()(pose)
+
         # Add pose blenshape
         pose_feature = tf.reshape(
             tensor=joint_rotations_local[:, 1:, :, :] - tf.eye(3),
@@ -107,7 +176,7 @@ class SMPL(keras.layers.Layer):
         )
 
         # Apply linear blend skinning
-        v = skinning.LBS()(vp, joint_transforms, self.skinning_weights)
+        v = skinning.LBS(self.top_k)(vp, joint_transforms, self.skinning_weights)
 
         # Apply translation
         if translation is not None:
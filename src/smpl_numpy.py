@@ -0,0 +1,130 @@
+import numpy as np
+
+from . import cache
+from . import io
+from . import rotations
+from . import skinning_numpy
+
+
+# Number of subjects whose shape-only quantities are kept in memory
+SHAPE_CACHE_SIZE = 64
+
+
+class SMPL:
+    '''
+    NumPy version of smpl.SMPL, with the same inputs and outputs (as NumPy
+    arrays). It does not import TensorFlow, so processes that only need the
+    body start faster and use less memory (see body.load_smpl).
+    '''
+    def __init__(self, model_path, shape_cache_size=SHAPE_CACHE_SIZE, top_k=None):
+        dd = io.load_smpl_model(model_path)
+
+        self.dtype = np.float32
+        self.num_shapes = dd['shapedirs'].shape[-1]
+        self.num_vertices = dd["v_template"].shape[-2]
+        self.num_faces = dd["f"].shape[-2]
+        self.num_joints = dd["J_regressor"].shape[0]
+
+        self.skinning_weights = np.asarray(dd["weights"], dtype=self.dtype)
+        self.template_vertices = np.asarray(dd["v_template"], dtype=self.dtype)
+        self.faces = np.asarray(dd["f"], dtype=np.int32)
+        self.shapedirs = np.asarray(dd["shapedirs"].reshape([-1, self.num_shapes]).T, dtype=self.dtype)
+        self.posedirs = np.asarray(dd["posedirs"].reshape([-1, dd['posedirs'].shape[-1]]).T, dtype=self.dtype)
+        self.joint_regressor = np.asarray(dd["J_regressor"].T, dtype=self.dtype)
+
+        self.kintree_table = dd['kintree_table'][0].astype(np.int32)
+
+        self.shape_cache = cache.LRUCache(shape_cache_size)
+
+        # Joints blended per vertex (see skinning.LBS), None for all
+        self.top_k = top_k
+
+
+    def shaped(self, shape):
+        '''Same as smpl.SMPL.shaped'''
+        shape = np.asarray(shape, dtype=self.dtype).reshape(1, self.num_shapes)
+        key = shape.tobytes()
+
+        shaped_dict = self.shape_cache.get(key)
+        if shaped_dict is None:
+            shape_blendshape, vs, joint_locations_local = self.compute_shaped(shape)
+            shaped_dict = {
+                "shape_blendshape": shape_blendshape,
+                "vertices_shaped": vs,
+                "joint_locations_local": joint_locations_local
+            }
+            self.shape_cache.put(key, shaped_dict)
+
+        return shaped_dict
+
+
+    def compute_shaped(self, shape):
+        # Add shape blenshape
+        shape_blendshape = np.matmul(shape, self.shapedirs).reshape(-1, self.num_vertices, 3)
+        vs = self.template_vertices + shape_blendshape
+
+        # Compute local joint locations
+        joint_locations_local = np.matmul(vs.transpose(0, 2, 1), self.joint_regressor)
+        joint_locations_local = joint_locations_local.transpose(0, 2, 1)
+
+        return shape_blendshape, vs, joint_locations_local
+
+
+    def __call__(self, shape=None, pose=None, translation=None):
+        '''Same as smpl.SMPL.call'''
+        shape = np.asarray(shape, dtype=self.dtype)
+
+        if shape.ndim == 1:
+            shaped_dict = self.shaped(shape)
+            shape_blendshape = shaped_dict["shape_blendshape"]
+            vs = shaped_dict["vertices_shaped"]
+            joint_locations_local = shaped_dict["joint_locations_local"]
+        else:
+            shape_blendshape, vs, joint_locations_local = self.compute_shaped(
+                shape.reshape(-1, self.num_shapes)
+            )
+
+        if pose is None:
+            return vs, np.zeros((self.num_joints, 4, 4), dtype=self.dtype)
+
+        # Compute local joint rotations
+        pose = np.asarray(pose, dtype=self.dtype).reshape(-1, self.num_joints, 3)
+        joint_rotations_local = rotations.axis_angle_to_matrix(pose)
+
+        if shape.ndim == 1:
+            joint_locations_local = np.repeat(joint_locations_local, len(pose), axis=0)
+
+        # Add pose blenshape
+        pose_feature = (joint_rotations_local[:, 1:, :, :] - np.eye(3, dtype=self.dtype))
+        pose_feature = pose_feature.reshape(-1, 9 * (self.num_joints - 1))
+
+        pose_blendshape = np.matmul(pose_feature, self.posedirs).reshape(-1, self.num_vertices, 3)
+
+        vp = vs + pose_blendshape
+
+        # Compute global joint transforms
+        joint_transforms, joint_locations = skinning_numpy.pose_skeleton(
+            joint_rotations_local,
+            joint_locations_local,
+            self.kintree_table
+        )
+
+        # Apply linear blend skinning
+        v = skinning_numpy.lbs(vp, joint_transforms, self.skinning_weights, self.top_k)
+
+        # Apply translation
+        if translation is not None:
+            v += np.asarray(translation, dtype=self.dtype)[:, np.newaxis, :]
+
+        tensor_dict = {
+            "shape_blendshape": shape_blendshape,
+            "pose_blendshape": pose_blendshape,
+            "pose_feature": pose_feature,
+            "joint_transforms": joint_transforms,
+            "joint_locations": joint_locations,
+            "joint_locations_local": joint_locations_local,
+            "vertices_shaped": vs,
+            "vertices_posed": vp
+        }
+
+        return v, tensor_dict
@@ -0,0 +1,98 @@
+import time
+from collections.abc import Mapping
+
+from . import tracing
+
+
+# Seconds spent importing or loading each component, in order
+timings = {}
+
+
+class timed:
+    '''
+    Context manager that records the time spent in a startup step (also as
+    a tracing span, if tracing is enabled)
+    '''
+    def __init__(self, name):
+        self.name = name
+
+
+    def __enter__(self):
+        self.span = tracing.span(self.name, category="startup")
+        self.span.__enter__()
+        self.start = time.perf_counter()
+
+
+    def __exit__(self, *args):
+        self.elapsed = time.perf_counter() - self.start
+        timings[self.name] = timings.get(self.name, 0.0) + self.elapsed
+        self.span.__exit__(*args)
+
+
+def report():
+    '''Returns a table with the startup timings'''
+    lines = ["%-40s %10s" % ("Component", "Time (s)")]
+    for name, seconds in timings.items():
+        lines.append("%-40s %10.3f" % (name, seconds))
+    lines.append("%-40s %10.3f" % ("Total", sum(timings.values())))
+
+    return "\n".join(lines)
+
+
+class LazyDict(Mapping):
+    '''
+    Read-only dictionary whose values are created by a loader function the
+    first time they are accessed (and timed as "load <key>", unless 
+    record_timings is False).
+
+    Example:
+        models = LazyDict({"decoder": lambda: load("decoder")})
+        models["decoder"]  # Loads the decoder
+    '''
+    def __init__(self, loaders, record_timings=True):
+        self.loaders = dict(loaders)
+        self.values = {}
+        self.record_timings = record_timings
+        self.links = {}
+
+
+    def __getitem__(self, key):
+        if key in self.links:
+            return self.links[key][key]
+
+        if key not in self.values:
+            loader = self.loaders[key]
+
+            if not self.record_timings:
+                self.values[key] = loader()
+                return self.values[key]
+
+            with timed("load " + key):
+                self.values[key] = loader()
+
+        return self.values[key]
+
+
+    def __iter__(self):
+        return iter(self.loaders)
+
+
+    def __len__(self):
+        return len(self.loaders)
+
+
+    def is_loaded(self, key):
+        if key in self.links:
+            return self.links[key].is_loaded(key)
+
+        return key in self.values
+
+
+    def link(self, other, keys):
+        '''
+        Takes the values of keys from another LazyDict, so they are loaded
+        (and timed) only once, by the first of them that accesses them.
+        '''
+        for key in keys:
+            self.loaders[key] = other.loaders[key]
+            self.links[key] = other
@@ -0,0 +1,157 @@
+import numpy as np
+import tensorflow as tf
+
+from . import model
+from . import startup
+
+
+# Networks evaluated with DirectPredictor in streaming sessions
+DIRECT_CALL_MODELS = [
+    "body/pose_encoder",
+    "body/skinning_weights",
+    "body/pose_blendshape",
+    "body/shape_blendshape",
+    "garment/decoder",
+]
+
+
+def make_stateful(keras_model, batch_size=1):
+    '''
+    Rebuilds a recurrent Keras model with stateful RNN layers, so that the
+    hidden state is kept between calls. The weights are shared by copy.
+    '''
+    config = keras_model.get_config()
+
+    for layer in config["layers"]:
+        layer_config = layer["config"]
+
+        if layer["class_name"] == "InputLayer":
+            input_shape = layer_config["batch_input_shape"]
+            layer_config["batch_input_shape"] = (batch_size,) + tuple(input_shape[1:])
+
+        elif "stateful" in layer_config:
+            layer_config["stateful"] = True
+
+    stateful_model = tf.keras.Model.from_config(config)
+    stateful_model.set_weights(keras_model.get_weights())
+
+    return stateful_model
+
+
+class DirectPredictor:
+    '''
+    Wraps a Keras model so that predict calls the model directly. This avoids
+    the per-call overhead of Model.predict, which dominates for the small
+    inputs of a streaming session.
+    '''
+    def __init__(self, keras_model):
+        self.model = keras_model
+        self.output_shape = keras_model.output_shape
+
+
+    def predict(self, inputs):
+        return self.model(inputs, training=False).numpy()
+
+
+class StatefulRegressor:
+    '''
+    Stateful copy of the recurrent regressor (garment/gru) with explicit
+    access to its hidden states, so that a single copy can be shared by
+    several sequences.
+    '''
+    def __init__(self, gru, batch_size=1):
+        self.batch_size = batch_size
+        self.model = make_stateful(gru, batch_size)
+        self.rnn_layers = [
+            layer for layer in self.model.layers
+            if getattr(layer, "stateful", False)
+        ]
+
+
+    def get_states(self):
+        return [
+            [state.numpy() for state in layer.states]
+            for layer in self.rnn_layers
+        ]
+
+
+    def set_states(self, states=None):
+        '''Sets the hidden states (None resets them to zero)'''
+        if states is None:
+            self.model.reset_states()
+            return
+
+        for layer, layer_states in zip(self.rnn_layers, states):
+            layer.reset_states(layer_states)
+
+
+    def __call__(self, inputs):
+        return self.model(inputs, training=False).numpy()
+
+
+class StreamingSession:
+    '''
+    Runs the model incrementally, one frame (or a small block of frames) at
+    a time. The session keeps the hidden states of the recurrent regressor
+    and the history required by the finite differences, so the output of
+    consecutive calls to step matches the output of run_model over the
+    whole sequence.
+
+    Example:
+        session = StreamingSession(model_dict, motion["shape"])
+        for pose, translation in frames:
+            v_garment, v_body = session.step(pose, translation)
+    '''
+    def __init__(self, model_dict, shape, regressor=None):
+        self.model_dict = startup.LazyDict({
+            key: self.loader(model_dict, key) for key in model_dict
+        }, record_timings=False)
+        self.shape = np.asarray(shape, dtype=np.float32)
+        self.regressor = regressor or StatefulRegressor(model_dict["garment/gru"])
+        self.reset()
+
+
+    @staticmethod
+    def loader(model_dict, key):
+        if key in DIRECT_CALL_MODELS:
+            return lambda: DirectPredictor(model_dict[key])
+
+        return lambda: model_dict[key]
+
+
+    def reset(self):
+        '''Starts a new sequence'''
+        self.states = None
+        self.diffs = {}
+        self.num_frames = 0
+
+
+    def step(self, pose, translation):
+        '''
+        Args:
+            pose: array of shape 72 (one frame) or num_frames x 72
+            translation: array of shape 3 (one frame) or num_frames x 3
+
+        Returns:
+            v_garment: array of shape num_frames x num_garment_vertices x 3
+            v_body: array of shape num_frames x num_body_vertices x 3
+        '''
+        motion = {
+            "pose": np.reshape(pose, (-1, 72)).astype(np.float32),
+            "translation": np.reshape(translation, (-1, 3)).astype(np.float32),
+        }
+
+        features = model.compute_features(self.model_dict, motion, self.diffs)
+
+        self.regressor.set_states(self.states)
+        v_encoded = self.regressor(model.regressor_inputs(self.shape, features))[0]
+        self.states = self.regressor.get_states()
+
+        v_garment, v_body = model.run_body_and_garment(
+            self.model_dict, v_encoded, self.shape, motion["pose"],
+            motion["translation"]
+        )
+
+        self.num_frames += len(motion["pose"])
+
+        return v_garment, v_body
@@ -0,0 +1,183 @@
+import os
+
+import numpy as np
+import tensorflow as tf
+
+try:
+    from ai_edge_litert.interpreter import Interpreter
+except ImportError:
+    Interpreter = tf.lite.Interpreter
+
+
+# Extension of the TFLite models, saved next to the SavedModel of each
+# network (e.g., trained_models/tshirt/decoder.tflite)
+EXTENSION = ".tflite"
+
+# Precisions of the converted models: float16 stores the weights as float16
+# and int8 quantizes them (dynamic range quantization). TFLite does not
+# support bfloat16.
+PRECISIONS = ["float32", "float16", "int8"]
+
+# Name of the output of the converted models
+OUTPUT_NAME = "output"
+
+
+def model_path(path, precision="float32"):
+    '''Path of the TFLite model of the network saved in path'''
+    if precision not in PRECISIONS:
+        raise ValueError("Precision '%s' is not supported by TFLite (supported: %s)" % (
+            precision, ", ".join(PRECISIONS)
+        ))
+
+    path = os.path.normpath(path)
+    if precision == "float32":
+        return path + EXTENSION
+
+    return path + "." + precision + EXTENSION
+
+
+def input_name(i):
+    return "input_%d" % i
+
+
+def is_recurrent(network):
+    return any(isinstance(layer, tf.keras.layers.RNN) for layer in network.layers)
+
+
+def signature(network):
+    '''
+    Concrete function of a Keras network with named inputs: the names of the
+    inputs for networks with a dictionary of inputs (the recurrent
+    regressor), and input_<i> for the others. Recurrent networks are
+    converted for one sequence at a time (TFLite requires static shapes for
+    the state of the RNN layers), the others for any batch size.
+    '''
+    batch_size = 1 if is_recurrent(network) else None
+
+    def spec(tensor, name):
+        return tf.TensorSpec((batch_size,) + tuple(tensor.shape[1:]), tensor.dtype, name=name)
+
+    if isinstance(network.input, dict):
+        specs = {name: spec(tensor, name) for name, tensor in network.input.items()}
+
+        @tf.function(input_signature=[specs])
+        def function(inputs):
+            return {OUTPUT_NAME: network(inputs, training=False)}
+
+        return function.get_concrete_function()
+
+    inputs = tf.nest.flatten(network.input)
+    specs = [spec(tensor, input_name(i)) for i, tensor in enumerate(inputs)]
+
+    @tf.function(input_signature=specs)
+    def function(*args):
+        return {OUTPUT_NAME: network(list(args) if len(args) > 1 else args[0], training=False)}
+
+    return function.get_concrete_function()
+
+
+def convert_network(network, output_path, precision="float32"):
+    '''Converts a Keras network to a TFLite model (see model_path)'''
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([signature(network)], network)
+
+    if precision == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+
+    elif precision == "int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    elif precision != "float32":
+        raise ValueError("Precision '%s' is not supported by TFLite (supported: %s)" % (
+            precision, ", ".join(PRECISIONS)
+        ))
+
+    with open(output_path, "wb") as fp:
+        fp.write(converter.convert())
+
+    return output_path
+
+
+def convert_model(garment_model_path, diffused_body_path=None, precision="float32", verbose=True):
+    '''
+    Converts the networks of a garment and of the diffused body to TFLite
+    models, saved next to their SavedModels. With precision, the networks
+    converted by precision.NETWORKS (decoder and diffused body) are also
+    saved with that precision.
+
+    Returns:
+        paths: list with the paths of the TFLite models
+    '''
+    from . import model
+    from . import precision as precisions
+
+    diffused_body_path = diffused_body_path or model.DIFFUSED_BODY_PATH
+    paths = []
+
+    for key, path in model.network_paths(garment_model_path, diffused_body_path).items():
+        network = model.load_network(path)
+
+        network_precisions = ["float32"]
+        if precision != "float32" and key in precisions.NETWORKS:
+            network_precisions.append(precision)
+
+        for network_precision in network_precisions:
+            output_path = convert_network(network, model_path(path, network_precision), network_precision)
+            paths.append(output_path)
+
+            if verbose:
+                print("[INFO] Saved:", output_path)
+
+    return paths
+
+
+class TFLiteNetwork:
+    '''
+    Runs a converted network with the TFLite interpreter, with the predict
+    interface of Keras models (inputs are an array, a list of arrays or a
+    dictionary for the recurrent regressor). The whole input is evaluated
+    in a single call, without the per-batch overhead of Model.predict.
+
+    The interpreter uses the XNNPACK delegate for the float operations (the
+    default delegate of TFLite on CPU), with num_threads threads.
+    '''
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self.runner = self.interpreter.get_signature_runner()
+
+        # Recurrent networks are converted with a batch size of 1
+        input_details = self.interpreter.get_input_details()
+        self.batch_size = None if input_details[0]["shape_signature"][0] == -1 else 1
+
+        # Same as keras.Model.output_shape (None for the dynamic dimensions)
+        output_details = self.runner.get_output_details()[OUTPUT_NAME]
+        self.output_shape = tuple(
+            None if size == -1 else int(size) for size in output_details["shape_signature"]
+        )
+
+
+    def predict(self, inputs):
+        if isinstance(inputs, dict):
+            inputs = {key: np.asarray(value, dtype=np.float32) for key, value in inputs.items()}
+        else:
+            inputs = inputs if isinstance(inputs, (list, tuple)) else [inputs]
+            inputs = {input_name(i): np.asarray(x, dtype=np.float32) for i, x in enumerate(inputs)}
+
+        if self.batch_size is None:
+            return self.runner(**inputs)[OUTPUT_NAME]
+
+        num_sequences = len(next(iter(inputs.values())))
+        return np.concatenate([
+            self.runner(**{key: value[i:i + 1] for key, value in inputs.items()})[OUTPUT_NAME]
+            for i in range(num_sequences)
+        ])
+
+
+def load_network(path, num_threads=None):
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            "No TFLite model %s (convert the networks with convert_tflite.py)" % path
+        )
+
+    return TFLiteNetwork(path, num_threads)
@@ -0,0 +1,326 @@
+import atexit
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+
+# Tracing is enabled at import if this variable is set to the path of the
+# trace, which is saved when the process exits ("{pid}" is replaced by the
+# process id, e.g., for worker processes). Paths ending in .json are saved
+# in the Chrome trace format, any other path as JSON lines.
+TRACE_ENV_VAR = "GARMENT_TRACE"
+
+# Set to 0 to trace without measuring memory
+TRACE_MEMORY_ENV_VAR = "GARMENT_TRACE_MEMORY"
+
+# Seconds between samples of the resident memory of the process
+MEMORY_SAMPLE_INTERVAL = 0.005
+
+enabled = False
+
+# Whether spans measure the peak increase of resident memory of the process
+# (sampled by a background thread, so it includes the buffers of TensorFlow
+# but not memory reused by the allocators)
+trace_memory = False
+
+# Finished spans, in order of completion
+events = []
+
+origin = time.perf_counter()
+
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_local = threading.local()
+
+# Spans of all the threads that are running, to update their peak memory
+_open_spans = set()
+_sampler = None
+
+
+def resident_memory():
+    '''Resident memory of the process in bytes (None if /proc is not available)'''
+    try:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class MemorySampler(threading.Thread):
+    '''Thread that records the peak resident memory of the open spans'''
+    def __init__(self, interval=MEMORY_SAMPLE_INTERVAL):
+        super().__init__(name="tracing-memory", daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            update_peak_memory()
+
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def enable(memory=True):
+    '''Starts recording spans (and their peak memory if memory is True)'''
+    global enabled, trace_memory, _sampler
+
+    trace_memory = memory and resident_memory() is not None
+    if trace_memory and _sampler is None:
+        _sampler = MemorySampler()
+        _sampler.start()
+
+    enabled = True
+
+
+def disable():
+    global enabled, trace_memory, _sampler
+
+    if _sampler is not None:
+        _sampler.stop()
+        _sampler = None
+
+    enabled = False
+    trace_memory = False
+
+
+def reset():
+    '''Removes the recorded spans'''
+    with _lock:
+        del events[:]
+
+
+def tensor_info(x):
+    '''Shape, dtype and size in bytes of a NumPy array or a TensorFlow tensor'''
+    shape = [None if d is None else int(d) for d in x.shape]
+    dtype = getattr(x.dtype, "name", str(x.dtype))
+    itemsize = getattr(x.dtype, "itemsize", None) or getattr(x.dtype, "size", 0)
+
+    num_elements = 1
+    for d in shape:
+        num_elements *= d or 0
+
+    return {"shape": shape, "dtype": dtype, "bytes": num_elements * itemsize}
+
+
+def update_peak_memory():
+    '''Records the current resident memory in the open spans'''
+    memory = resident_memory()
+
+    with _lock:
+        for span in _open_spans:
+            span.max_memory = max(span.max_memory, memory)
+
+
+class Span:
+    '''
+    Named interval of the pipeline that records its wall time, the CPU time
+    of the process (including TensorFlow's threads), the peak increase of
+    resident memory during the span and optional attributes (e.g., sizes of
+    the tensors it produces). Spans opened inside another span of the same
+    thread are its children.
+    '''
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.tensors = {}
+
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+    def add_tensor(self, name, x):
+        '''Records the shape, dtype and size of a tensor (or array)'''
+        self.tensors[name] = tensor_info(x)
+
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+
+        self.id = next(_ids)
+        self.parent = stack[-1].id if stack else None
+        self.memory = trace_memory
+        stack.append(self)
+
+        if self.memory:
+            self.start_memory = self.max_memory = resident_memory()
+            with _lock:
+                _open_spans.add(self)
+
+        self.start_cpu = time.process_time()
+        self.start = time.perf_counter()
+
+        return self
+
+
+    def __exit__(self, exc_type, *args):
+        end = time.perf_counter()
+        end_cpu = time.process_time()
+
+        _local.stack.pop()
+
+        event = {
+            "name": self.name,
+            "id": self.id,
+            "parent": self.parent,
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "tid": threading.get_ident(),
+            "start": self.start - origin,
+            "wall": end - self.start,
+            "cpu": end_cpu - self.start_cpu,
+            "peak_memory": None,
+        }
+
+        if exc_type is not None:
+            event["error"] = exc_type.__name__
+
+        if self.attributes:
+            event["attributes"] = self.attributes
+
+        if self.tensors:
+            event["tensors"] = self.tensors
+
+        if self.memory:
+            update_peak_memory()
+
+        with _lock:
+            if self.memory:
+                _open_spans.discard(self)
+                event["peak_memory"] = self.max_memory - self.start_memory
+
+            events.append(event)
+
+
+class NullSpan:
+    '''Span returned while tracing is disabled, which does nothing'''
+    def set(self, **attributes):
+        pass
+
+
+    def add_tensor(self, name, x):
+        pass
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+def span(name, **attributes):
+    '''
+    Returns a context manager that records a span if tracing is enabled.
+
+    Example:
+        with tracing.span("decoder", frames=len(v_encoded)) as s:
+            v_canonical = decoder.predict(v_encoded)
+            s.add_tensor("v_canonical", v_canonical)
+    '''
+    if not enabled:
+        return NULL_SPAN
+
+    return Span(name, attributes)
+
+
+def traced(name=None):
+    '''Decorator that records each call of a function as a span'''
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+
+            with Span(span_name, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def save_jsonl(path):
+    '''Saves the recorded spans as JSON lines, one span per line'''
+    with open(path, "w") as fp:
+        for event in list(events):
+            fp.write(json.dumps(event) + "\n")
+
+
+def save_chrome_trace(path):
+    '''
+    Saves the recorded spans in the Chrome trace format (open it in
+    chrome://tracing or https://ui.perfetto.dev).
+    '''
+    trace_events = []
+    for event in list(events):
+        args = {"cpu_ms": 1000 * event["cpu"]}
+        if event["peak_memory"] is not None:
+            args["peak_memory_mb"] = event["peak_memory"] / 1024 ** 2
+        args.update(event.get("attributes", {}))
+        args.update(event.get("tensors", {}))
+
+        trace_events.append({
+            "name": event["name"],
+            "ph": "X",
+            "ts": 1e6 * event["start"],
+            "dur": 1e6 * event["wall"],
+            "pid": event["pid"],
+            "tid": event["tid"],
+            "args": args,
+        })
+
+    with open(path, "w") as fp:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, fp)
+
+
+def save(path):
+    '''Saves the recorded spans, in the Chrome trace format if path ends in .json'''
+    path = path.replace("{pid}", str(os.getpid()))
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if os.path.splitext(path)[1] == ".json":
+        save_chrome_trace(path)
+    else:
+        save_jsonl(path)
+
+    return path
+
+
+def summary():
+    '''Returns a table with the count, total wall and CPU time and peak memory of each span'''
+    totals = {}
+    for event in list(events):
+        count, wall, cpu, peak = totals.get(event["name"], (0, 0.0, 0.0, None))
+        if event["peak_memory"] is not None:
+            peak = max(peak or 0, event["peak_memory"])
+        totals[event["name"]] = (count + 1, wall + event["wall"], cpu + event["cpu"], peak)
+
+    lines = ["%-32s %8s %12s %12s %12s" % ("Span", "Count", "Wall (s)", "CPU (s)", "Memory (MB)")]
+    for name, (count, wall, cpu, peak) in totals.items():
+        memory = "-" if peak is None else "%.1f" % (peak / 1024 ** 2)
+        lines.append("%-32s %8d %12.3f %12.3f %12s" % (name, count, wall, cpu, memory))
+
+    return "\n".join(lines)
+
+
+if os.environ.get(TRACE_ENV_VAR):
+    enable(memory=os.environ.get(TRACE_MEMORY_ENV_VAR, "1") != "0")
+    atexit.register(save, os.environ[TRACE_ENV_VAR])